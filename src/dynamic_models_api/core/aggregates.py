@@ -0,0 +1,113 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Union
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Aggregate
+from django.db.models import Avg
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import Q
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from core.filters import DynamicRowsFilter
+from core.search import DynamicSearchService
+
+
+class DynamicRowsAggregation:
+    """
+    Translates query parameters into a single aggregation query on the
+    rows of a dynamic model, optionally grouped by fields.
+
+    Aggregates are given with the `aggregate` query parameter as a comma
+    separated list of `count` (number of rows) and `<function>:<field>`
+    items, and are returned as `count` and `<field>__<function>`. The
+    rows are filtered like the rows endpoint filters them.
+    """
+    RESERVED_PARAMS = DynamicRowsFilter.RESERVED_PARAMS | {'group_by', 'aggregate'}
+    NUMBER_FUNCTIONS = {
+        'sum': Sum,
+        'avg': Avg,
+        'min': Min,
+        'max': Max,
+    }
+    BOOLEAN_FUNCTIONS = ['true', 'false']
+    DATE_FUNCTIONS = {
+        'min': Min,
+        'max': Max,
+    }
+    NUMBER_FIELDS = (models.FloatField, models.IntegerField, models.DecimalField)
+
+    def __init__(self, rows_filter: DynamicRowsFilter):
+        self.rows_filter = rows_filter
+        self.model_fields = rows_filter.model_fields
+
+    def get_field(self, param: str, name: str) -> models.Field:
+        field = self.model_fields.get(name)
+        if field is None:
+            raise ValidationError({param: f'Unknown field "{name}".'})
+        return field
+
+    def get_group_by(self, query_params: Mapping[str, Any]) -> List[str]:
+        """Return the field names given with the `group_by` query parameter."""
+        group_by = [name for name in query_params.get('group_by', '').split(',') if name]
+        for name in group_by:
+            self.get_field('group_by', name)
+        return group_by
+
+    def get_aggregates(self, query_params: Mapping[str, Any]) -> Dict[str, Aggregate]:
+        """Return the aggregates given with the `aggregate` query parameter by their names in the result."""
+        aggregates: Dict[str, Aggregate] = {}
+        for item in filter(None, query_params.get('aggregate', 'count').split(',')):
+            function, _, name = item.partition(':')
+            if function == 'count' and not name:
+                aggregates['count'] = Count('pk')
+                continue
+
+            field = self.get_field('aggregate', name)
+            if function == 'count':
+                aggregates[f'{name}__count'] = Count(name)
+            elif isinstance(field, self.NUMBER_FIELDS) and function in self.NUMBER_FUNCTIONS:
+                aggregates[f'{name}__{function}'] = self.NUMBER_FUNCTIONS[function](name)
+            elif isinstance(field, models.DateField) and function in self.DATE_FUNCTIONS:
+                aggregates[f'{name}__{function}'] = self.DATE_FUNCTIONS[function](name)
+            elif isinstance(field, models.BooleanField) and function in self.BOOLEAN_FUNCTIONS:
+                aggregates[f'{name}__{function}'] = Count('pk', filter=Q(**{name: function == 'true'}))
+            else:
+                raise ValidationError({'aggregate': f'Unsupported aggregate "{function}" for field "{name}".'})
+        return aggregates
+
+    def get_ordering(self, query_params: Mapping[str, Any], columns: List[str]) -> List[str]:
+        """Return the ordering of the groups, by default the grouped fields."""
+        ordering = [item for item in query_params.get('ordering', '').split(',') if item]
+        for item in ordering:
+            if item.lstrip('-') not in columns:
+                raise ValidationError({'ordering': f'Unknown group field or aggregate "{item.lstrip("-")}".'})
+        return ordering or [name for name in columns if name in self.model_fields]
+
+    def aggregate(self, query_params: Mapping[str, Any]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Return the aggregates of the filtered rows, or the aggregates of
+        every group when the rows are grouped.
+        """
+        group_by = self.get_group_by(query_params)
+        aggregates = self.get_aggregates(query_params)
+        queryset = self.rows_filter.model_class.objects.filter(
+            self.rows_filter.build_q(query_params, ignore=self.RESERVED_PARAMS)
+        )
+        if query_params.get('search'):
+            queryset = DynamicSearchService.search(queryset, query_params['search'])
+        if not group_by:
+            return queryset.aggregate(**aggregates)
+
+        ordering = self.get_ordering(query_params, group_by + list(aggregates))
+        max_groups = getattr(settings, 'DYNAMIC_MODELS_AGGREGATE_MAX_GROUPS', 10000)
+        groups = list(queryset.values(*group_by).annotate(**aggregates).order_by(*ordering)[:max_groups + 1])
+        if len(groups) > max_groups:
+            raise ValidationError({'group_by': f'More than {max_groups} groups, narrow down the rows with filters.'})
+        return groups
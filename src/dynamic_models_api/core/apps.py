@@ -1,6 +1,5 @@
 from django.apps import AppConfig
-from django.db import connection
-from django.db.migrations.executor import MigrationExecutor
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
@@ -10,12 +9,8 @@ class CoreConfig(AppConfig):
     def ready(self):
         from core.services import DynamicModelService
 
-        # Generating the migration plan for Core application
-        executor = MigrationExecutor(connection)
-        targets = executor.loader.graph.leaf_nodes(CoreConfig.name)
-        migrations_to_apply = executor.migration_plan(targets)
-
-        # This check helps prevent any issues that may arise
-        # when applying real migrations to the database.
-        if not migrations_to_apply:
-            DynamicModelService.prepare_existing_models_on_ready()
+        # Dynamic model classes are created on first access, only the
+        # hot models listed in the settings are prepared on start.
+        preload = getattr(settings, 'DYNAMIC_MODELS_PRELOAD', [])
+        if preload:
+            DynamicModelService.prepare_existing_models_on_ready(preload)
@@ -0,0 +1,169 @@
+"""
+Async versions of the row endpoints of `DynamicModelViewSet`, for servers
+running the project with ASGI. They read rows with the async ORM, so a
+request waiting for the database does not hold a thread, and respond with
+the same JSON as the compact JSON responses of the viewset. Requests are
+authenticated and checked against the permissions of the viewset in a
+thread. Rows are created in a thread, in a transaction with their
+rollups and version.
+"""
+import json
+from functools import wraps
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.db import router
+from django.http import Http404
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.http import HttpResponseNotAllowed
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from .cache import DynamicModelCacheEntry
+from .conditional import DynamicDataVersionService
+from .conditional import DynamicRowsResponseCache
+from .filters import DynamicRowsFilter
+from .pagination import DynamicRowsPagination
+from .rollups import DynamicRollupService
+from .routing import DynamicDatabaseService
+from .streaming import DynamicRowsStream
+from .views import DynamicModelViewSet
+
+
+def get_cache_entry(request: HttpRequest, pk: int, action: str) -> DynamicModelCacheEntry:
+    """
+    Return the generated classes of the dynamic model, only querying its
+    metadata when they are not cached yet, after authenticating the request
+    and checking the permissions of the viewset on the dynamic model like
+    its action. Queries the database, so it runs in a thread.
+    """
+    view = DynamicModelViewSet(action_map={request.method.lower(): action}, args=(), kwargs={'pk': pk})
+    view.request = view.initialize_request(request)
+    try:
+        view.initial(view.request)
+        return view.get_cache_entry()
+    except (AuthenticationFailed, NotAuthenticated) as error:
+        # Like the viewset, challenge with the first authentication scheme, or forbid without any
+        error.auth_header = view.get_authenticate_header(view.request)
+        if not error.auth_header:
+            error.status_code = status.HTTP_403_FORBIDDEN
+        raise
+
+
+def async_view(*methods):
+    """
+    Turn the coroutine into a view accepting the given methods, which renders
+    errors like the viewset. The view decorators of Django 4.2 do not support
+    coroutines.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            try:
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return JsonResponse({'detail': 'Not found.'}, status=404)
+            except ValidationError as error:
+                return JsonResponse(error.detail, status=400, safe=False)
+            except APIException as error:
+                response = JsonResponse({'detail': error.detail}, status=error.status_code)
+                if getattr(error, 'auth_header', None):
+                    response['WWW-Authenticate'] = error.auth_header
+                return response
+
+        # Like the viewset, requests are not authenticated with the session
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def create_row(cache_entry: DynamicModelCacheEntry, data: Dict[str, Any]):
+    """Create a row and add it to the rollups and the row count of the table in one transaction."""
+    model_class = cache_entry.model_class
+    with DynamicDataVersionService.atomic(router.db_for_write(model_class)):
+        instance = model_class.objects.create(**data)
+        DynamicRollupService.add_rows(model_class, [instance])
+        DynamicDataVersionService.bump(cache_entry.model_instance.pk, rows=1)
+    return instance
+
+
+@async_view('POST')
+async def row(request, pk):
+    cache_entry = await sync_to_async(get_cache_entry)(request, pk, 'row')
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError as error:
+            raise ValidationError({'detail': f'JSON parse error - {error}'})
+    else:
+        data = request.POST
+
+    serializer = cache_entry.serializer_class(data=data)
+    # Validators of unique constraints query the table
+    if serializer.validators:
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+    else:
+        serializer.is_valid(raise_exception=True)
+    # The async ORM has no transactions, the row is created with its rollups and version in a thread
+    instance = await sync_to_async(create_row)(cache_entry, serializer.validated_data)
+    data = cache_entry.serializer_class(instance=instance).data
+    return HttpResponse(cache_entry.row_encoder.dumps(data), content_type='application/json')
+
+
+@async_view('GET')
+async def rows(request, pk):
+    cache_entry = await sync_to_async(get_cache_entry)(request, pk, 'rows')
+    version = await DynamicDataVersionService.aget(pk)
+    if version is None:
+        raise Http404
+    not_modified_response = DynamicDataVersionService.get_not_modified_response(request, version)
+    if not_modified_response is not None:
+        return not_modified_response
+
+    cacheable = 'stream' not in request.GET
+    if cacheable:
+        body = await DynamicRowsResponseCache.aget(pk, version, request)
+        if body is not None:
+            return DynamicDataVersionService.set_headers(HttpResponse(body, content_type='application/json'), version)
+
+    using = DynamicDatabaseService.get_read_database(cache_entry.model_instance, version)
+    response = await list_rows(request, cache_entry, using)
+    if cacheable:
+        await DynamicRowsResponseCache.aset(pk, version, request, response.content)
+    return DynamicDataVersionService.set_headers(response, version)
+
+
+async def list_rows(request, cache_entry: DynamicModelCacheEntry, using: Optional[str] = None) -> HttpResponse:
+    rows_filter = DynamicRowsFilter(cache_entry.model_class, using=using)
+    projection = rows_filter.get_projection(request.GET)
+
+    stream_format = request.GET.get('stream')
+    if stream_format is not None:
+        if stream_format not in DynamicRowsStream.get_formats():
+            raise ValidationError({'stream': f'Supported formats: {", ".join(DynamicRowsStream.get_formats())}.'})
+        objects = rows_filter.get_queryset(request.GET, named=False)
+        return DynamicRowsStream.create_response(
+            cache_entry.row_encoder, objects, projection, stream_format, asynchronous=True
+        )
+
+    paginator = DynamicRowsPagination()
+    paginator.ordering = rows_filter.get_ordering(request.GET)
+    page = await paginator.apaginate_queryset(rows_filter.get_queryset(request.GET), Request(request))
+    if page is not None:
+        body = cache_entry.row_encoder.encode_page(
+            page, projection, paginator.get_next_link(), paginator.get_previous_link()
+        )
+        return HttpResponse(body, content_type='application/json')
+
+    objects = [values async for values in rows_filter.get_queryset(request.GET, named=False)]
+    return HttpResponse(cache_entry.row_encoder.encode_rows(objects, projection), content_type='application/json')
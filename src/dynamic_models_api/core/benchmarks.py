@@ -0,0 +1,264 @@
+import contextlib
+import copy
+import datetime
+import decimal
+import platform
+import statistics
+import time
+import uuid
+import warnings
+from collections import defaultdict
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+import django
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from core.models import DynamicModel
+from core.routing import DynamicDatabaseService
+from core.runtime_generated import registry
+from core.services import DynamicModelService
+from core.services import dynamic_model_cache
+
+
+class DynamicModelBenchmark:
+    """
+    Measures the hot paths of the dynamic model lifecycle at a given scale:
+    creating and updating tables, building serializer classes, preparing
+    classes on start, inserting single rows and listing rows.
+
+    The benchmark creates its own dynamic models in the current database
+    and removes them afterwards. Their names start with `NAME_PREFIX`, so
+    it should be run on a dedicated database.
+    """
+    OPERATIONS = [
+        'create_table',
+        'create_serializer_class',
+        'prepare_on_ready',
+        'row_insert',
+        'rows_list',
+        'rows_page',
+        'update_table_add',
+        'update_table_alter',
+        'update_table_remove',
+    ]
+    NAME_PREFIX = 'Benchmark'
+    PAGE_SIZE = 100
+    FIELD_OPTIONS = {
+        'varchar': {'length': 100},
+        'decimal': {'precision': 12, 'scale': 2},
+    }
+
+    def __init__(self, fields: int = 10, models: int = 5, rows: int = 1000, inserts: int = 100, repeat: int = 5):
+        self.scale = {'fields': fields, 'models': models, 'rows': rows, 'inserts': inserts, 'repeat': repeat}
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.model_instances: List[DynamicModel] = []
+        self.request_factory = APIRequestFactory()
+
+    @contextlib.contextmanager
+    def measure(self, operation: str) -> Iterator[None]:
+        start = time.perf_counter()
+        yield
+        self.timings[operation].append(time.perf_counter() - start)
+
+    def get_fields(self) -> List[Dict[str, str]]:
+        """Return field definitions cycling through the field types."""
+        choices = DynamicModelService.get_choices()
+        return [
+            {'name': f'field_{i}', 'type': choices[i % len(choices)], **self.FIELD_OPTIONS.get(choices[i % len(choices)], {})}
+            for i in range(self.scale['fields'])
+        ]
+
+    def get_row(self, model_instance: DynamicModel, index: int) -> Dict[str, Any]:
+        values = {
+            'string': f'value {index}',
+            'number': index * 1.5,
+            'boolean': index % 2 == 0,
+            'integer': index,
+            'bigint': index * 1000003,
+            'smallint': index % 1000,
+            'decimal': decimal.Decimal(index) / 4,
+            'varchar': f'value {index}',
+            'date': datetime.date(2026, 1, 1) + datetime.timedelta(days=index % 365),
+            'timestamp': timezone.now(),
+            'uuid': uuid.UUID(int=index),
+        }
+        return {field['name']: values[field['type']] for field in model_instance.fields}
+
+    def create_tables(self) -> None:
+        for index in range(self.scale['models']):
+            model_instance = DynamicModel.objects.create(name=f'{self.NAME_PREFIX}{index}', fields=self.get_fields())
+            try:
+                with self.measure('create_table'):
+                    DynamicModelService.create_table_for_model(model_instance)
+            except Exception:
+                model_instance.delete()
+                raise
+            self.model_instances.append(model_instance)
+
+    def create_serializer_classes(self) -> None:
+        for model_instance in self.model_instances:
+            model_class = DynamicModelService.get_model_class(model_instance)
+            for _ in range(self.scale['repeat']):
+                with self.measure('create_serializer_class'):
+                    DynamicModelService.create_serializer_class(model_instance, model_class)
+
+    def prepare_on_ready(self) -> None:
+        """Prepare the classes of all models like a freshly started process does."""
+        names = [model_instance.name for model_instance in self.model_instances]
+        for _ in range(self.scale['repeat']):
+            dynamic_model_cache.clear()
+            for name in names:
+                registry.unregister(name)
+            with self.measure('prepare_on_ready'):
+                DynamicModelService.prepare_existing_models_on_ready(names)
+
+    def load_rows(self) -> None:
+        """Fill the tables with rows, which is not measured."""
+        for model_instance in self.model_instances:
+            model_class = DynamicModelService.get_model_class(model_instance)
+            model_class.objects.bulk_create(
+                [model_class(**self.get_row(model_instance, index)) for index in range(self.scale['rows'])],
+                batch_size=1000,
+            )
+
+    def insert_rows(self) -> None:
+        from core.views import DynamicModelViewSet
+
+        view = DynamicModelViewSet.as_view({'post': 'row'}, **DynamicModelViewSet.row.kwargs)
+        for model_instance in self.model_instances:
+            for index in range(self.scale['inserts']):
+                request = self.request_factory.post('/', self.get_row(model_instance, index), format='json')
+                with self.measure('row_insert'):
+                    response = view(request, pk=model_instance.pk)
+                if response.status_code != 200:
+                    raise RuntimeError(f'Inserting a row failed: {response.data}')
+
+    def list_rows(self) -> None:
+        from core.views import DynamicModelViewSet
+
+        view = DynamicModelViewSet.as_view({'get': 'rows'}, **DynamicModelViewSet.rows.kwargs)
+        for model_instance in self.model_instances:
+            for operation, params in [('rows_list', {}), ('rows_page', {'page_size': self.PAGE_SIZE})]:
+                for _ in range(self.scale['repeat']):
+                    request = self.request_factory.get('/', params)
+                    with self.measure(operation):
+                        response = view(request, pk=model_instance.pk)
+                        if hasattr(response, 'render'):
+                            response.render()
+                    if response.status_code != 200:
+                        raise RuntimeError(f'Listing rows failed with status {response.status_code}')
+
+    def update_table(self, operation: str, model_instance: DynamicModel, fields: List[Dict[str, str]]) -> None:
+        previous_instance = copy.deepcopy(model_instance)
+        model_instance.fields = fields
+        with transaction.atomic():
+            model_instance.save(update_fields=['fields'])
+            with self.measure(operation):
+                DynamicModelService.update_table_for_model(model_instance, previous_instance)
+
+    def add_fields(self) -> None:
+        """Add a field to every table, while they are empty as fields are required."""
+        for model_instance in self.model_instances:
+            fields = model_instance.fields + [{'name': 'extra', 'type': 'string'}]
+            self.update_table('update_table_add', model_instance, fields)
+
+    def update_tables(self) -> None:
+        """Convert the number fields and remove the added field of every filled table."""
+        for model_instance in self.model_instances:
+            # Converting a column rewrites the whole table
+            self.update_table('update_table_alter', model_instance, [
+                {**field, 'type': 'string'} if field['type'] == 'number' else field
+                for field in model_instance.fields
+            ])
+            self.update_table('update_table_remove', model_instance, [
+                field for field in model_instance.fields if field['name'] != 'extra'
+            ])
+
+    def cleanup(self) -> None:
+        """Drop the tables and remove the dynamic models created by the benchmark."""
+        for model_instance in self.model_instances:
+            model_class = DynamicModelService.get_model_class(model_instance)
+            with connections[DynamicDatabaseService.get_database(model_instance)].schema_editor() as schema_editor:
+                schema_editor.delete_model(model_class)
+            registry.unregister(model_instance.name)
+            dynamic_model_cache.invalidate(model_instance.pk)
+            model_instance.delete()
+        self.model_instances = []
+
+    def run(self) -> Dict[str, Any]:
+        """Run every operation and return the results."""
+        self.timings.clear()
+        try:
+            with warnings.catch_warnings():
+                # Classes of the benchmark models are registered repeatedly
+                warnings.filterwarnings('ignore', message='Model .* was already registered', category=RuntimeWarning)
+                self.create_tables()
+                self.create_serializer_classes()
+                self.prepare_on_ready()
+                self.add_fields()
+                self.load_rows()
+                self.insert_rows()
+                self.list_rows()
+                self.update_tables()
+        finally:
+            self.cleanup()
+        return self.get_results()
+
+    @staticmethod
+    def summarize(timings: List[float]) -> Dict[str, float]:
+        """Summarize the durations of an operation in milliseconds."""
+        timings = sorted(timing * 1000 for timing in timings)
+        return {
+            'count': len(timings),
+            'total_ms': sum(timings),
+            'mean_ms': statistics.mean(timings),
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'min_ms': timings[0],
+            'max_ms': timings[-1],
+        }
+
+    def get_results(self) -> Dict[str, Any]:
+        return {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'database_version': '.'.join(str(part) for part in connection.get_database_version()),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'scale': self.scale,
+            },
+            'results': {
+                operation: self.summarize(self.timings[operation])
+                for operation in self.OPERATIONS if self.timings[operation]
+            },
+        }
+
+    @staticmethod
+    def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> List[Dict[str, Any]]:
+        """
+        Compare the median durations of the operations measured in both
+        results. An operation regressed when its median grew by more than
+        the threshold, a fraction of the baseline median.
+        """
+        comparison = []
+        for operation, result in current['results'].items():
+            baseline_result = baseline['results'].get(operation)
+            if baseline_result is None:
+                continue
+            change = result['median_ms'] / baseline_result['median_ms'] - 1 if baseline_result['median_ms'] else 0.0
+            comparison.append({
+                'operation': operation,
+                'baseline_ms': baseline_result['median_ms'],
+                'current_ms': result['median_ms'],
+                'change': change,
+                'regressed': change > threshold,
+            })
+        return comparison
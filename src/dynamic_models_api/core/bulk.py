@@ -0,0 +1,282 @@
+import io
+from itertools import islice
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db import connections
+from django.db import router
+from django.db.models import Max
+from django.db.models import QuerySet
+from rest_framework import serializers
+
+from core.cache import DynamicModelCacheEntry
+from core.conditional import DynamicDataVersionService
+from core.filters import DynamicRowsFilter
+from core.rollups import DynamicRollupService
+from core.search import DynamicSearchService
+
+
+class DynamicRowsBulkService:
+    """
+    Validates and inserts large amounts of dynamic model rows in batches.
+
+    Invalid records are reported with their index in the input and do not
+    prevent the valid records from being inserted.
+    """
+    METHODS = ['auto', 'insert', 'copy']
+
+    @staticmethod
+    def iterate_batches(records: Iterable[Any], batch_size: int) -> Iterator[List[Tuple[int, Any]]]:
+        """Yield the enumerated records in lists of at most `batch_size` items."""
+        enumerated = enumerate(records)
+        while batch := list(islice(enumerated, batch_size)):
+            yield batch
+
+    @staticmethod
+    def validate_batch(
+            serializer: serializers.Serializer,
+            batch: List[Tuple[int, Any]]
+    ) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """
+        Validate the records of the batch, returning the validated data
+        and the errors of the invalid records.
+        """
+        validated, errors = [], []
+        for index, record in batch:
+            try:
+                validated.append((index, serializer.run_validation(record)))
+            except serializers.ValidationError as error:
+                errors.append({'index': index, 'errors': error.detail})
+        return validated, errors
+
+    @staticmethod
+    def insert_batch(
+            cache_entry: DynamicModelCacheEntry,
+            validated: List[Tuple[int, Dict[str, Any]]],
+            using: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert the validated records with `bulk_create`. If the batch is
+        rejected by the database, the records are inserted one by one to
+        find the rejected ones.
+        """
+        model_class = cache_entry.model_class
+        try:
+            with DynamicDataVersionService.atomic(using):
+                instances = model_class.objects.using(using).bulk_create([model_class(**data) for _, data in validated])
+                DynamicRollupService.add_rows(model_class, instances, using)
+                DynamicDataVersionService.bump(cache_entry.model_instance.pk, rows=len(instances))
+            return []
+        except DatabaseError:
+            pass
+
+        errors = []
+        for index, data in validated:
+            try:
+                with DynamicDataVersionService.atomic(using):
+                    instance = model_class.objects.using(using).create(**data)
+                    DynamicRollupService.add_rows(model_class, [instance], using)
+                    DynamicDataVersionService.bump(cache_entry.model_instance.pk, rows=1)
+            except DatabaseError as error:
+                errors.append({'index': index, 'errors': {'non_field_errors': [str(error).strip()]}})
+        return errors
+
+    @staticmethod
+    def format_copy_value(value: Any) -> str:
+        """Format a value for the text format of PostgreSQL COPY."""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        return (
+            str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+        )
+
+    @staticmethod
+    def copy_batch(
+            cache_entry: DynamicModelCacheEntry,
+            validated: List[Tuple[int, Dict[str, Any]]],
+            using: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert the validated records with PostgreSQL `COPY FROM STDIN`,
+        falling back to `insert_batch` if the batch is rejected.
+        """
+        model_class = cache_entry.model_class
+        connection = connections[using]
+        fields = [field for field in model_class._meta.concrete_fields if not field.primary_key]
+        instances, lines = [], []
+        for _, data in validated:
+            instance = model_class(**data)
+            instances.append(instance)
+            values = [field.get_db_prep_save(field.pre_save(instance, True), connection) for field in fields]
+            lines.append('\t'.join(DynamicRowsBulkService.format_copy_value(value) for value in values))
+        payload = '\n'.join(lines) + '\n'
+
+        quote_name = connection.ops.quote_name
+        sql = 'COPY {table} ({columns}) FROM STDIN'.format(
+            table=quote_name(model_class._meta.db_table),
+            columns=', '.join(quote_name(field.column) for field in fields),
+        )
+        try:
+            with DynamicDataVersionService.atomic(using), connection.cursor() as cursor:
+                if hasattr(cursor.cursor, 'copy_expert'):
+                    cursor.cursor.copy_expert(sql, io.StringIO(payload))
+                else:
+                    with cursor.cursor.copy(sql) as copy:
+                        copy.write(payload)
+                DynamicRollupService.add_rows(model_class, instances, using)
+                DynamicDataVersionService.bump(cache_entry.model_instance.pk, rows=len(instances))
+            return []
+        except DatabaseError:
+            return DynamicRowsBulkService.insert_batch(cache_entry, validated, using)
+
+    @staticmethod
+    def ingest(
+            cache_entry: DynamicModelCacheEntry,
+            records: Iterable[Any],
+            batch_size: int,
+            method: str = 'auto'
+    ) -> Dict[str, Any]:
+        """
+        Validate and insert the records in batches of `batch_size` using
+        `bulk_create` (`insert`), PostgreSQL COPY (`copy`), or COPY for
+        batches of at least `DYNAMIC_MODELS_BULK_COPY_THRESHOLD` records
+        on PostgreSQL (`auto`).
+        """
+        model_class = cache_entry.model_class
+        using = router.db_for_write(model_class)
+        is_postgresql = connections[using].vendor == 'postgresql'
+        if method == 'copy' and not is_postgresql:
+            raise serializers.ValidationError({'method': 'COPY is only supported on PostgreSQL.'})
+        copy_threshold = getattr(settings, 'DYNAMIC_MODELS_BULK_COPY_THRESHOLD', 5000)
+        max_errors = getattr(settings, 'DYNAMIC_MODELS_BULK_MAX_ERRORS', 1000)
+
+        serializer = cache_entry.serializer_class()
+        created, errors, error_count = 0, [], 0
+        for batch in DynamicRowsBulkService.iterate_batches(records, batch_size):
+            validated, batch_errors = DynamicRowsBulkService.validate_batch(serializer, batch)
+            if validated:
+                use_copy = method == 'copy' or (method == 'auto' and is_postgresql and len(validated) >= copy_threshold)
+                insert = DynamicRowsBulkService.copy_batch if use_copy else DynamicRowsBulkService.insert_batch
+                insert_errors = insert(cache_entry, validated, using)
+                created += len(validated) - len(insert_errors)
+                batch_errors = sorted(batch_errors + insert_errors, key=lambda error: error['index'])
+            error_count += len(batch_errors)
+            errors += batch_errors[:max(max_errors - len(errors), 0)]
+
+        return {'created': created, 'error_count': error_count, 'errors': errors}
+
+
+class DynamicRowsBulkWriteService:
+    """
+    Updates and deletes the rows of a dynamic model matching a filter with
+    set-based statements, without loading the rows.
+
+    The matching rows are written in batches of consecutive ids, each with
+    a single `UPDATE ... WHERE` or `DELETE ... WHERE` statement in its own
+    transaction, so even writes to huge tables only hold their locks
+    briefly. The rollups, the data version and the row count of the table
+    are updated in the transaction of every batch.
+    """
+    RESERVED_PARAMS = DynamicRowsFilter.RESERVED_PARAMS | {'batch_size', 'all'}
+
+    @staticmethod
+    def get_queryset(rows_filter: DynamicRowsFilter, query_params: Mapping[str, Any], all_rows: bool = False) -> QuerySet:
+        """
+        Return the rows matching the filters and the search given in the
+        query parameters. Writing every row has to be requested explicitly
+        with `all_rows`.
+        """
+        q = rows_filter.build_q(query_params, ignore=DynamicRowsBulkWriteService.RESERVED_PARAMS)
+        if not q and not query_params.get('search') and not all_rows:
+            raise serializers.ValidationError({
+                'non_field_errors': ['Filter the rows to write, or write every row with all=true.']
+            })
+        queryset = rows_filter.model_class.objects.filter(q)
+        if query_params.get('search'):
+            queryset = DynamicSearchService.search(queryset, query_params['search'])
+        return queryset
+
+    @staticmethod
+    def iterate_batches(queryset: QuerySet, batch_size: int) -> Iterator[QuerySet]:
+        """
+        Yield querysets of the rows of the queryset with at most
+        `batch_size` rows each, delimited by the ids of the last rows of
+        the previous batch and of the batch. The id of the last row is read
+        with a keyset scan of the ids after the previous batch.
+        """
+        last_id = None
+        while True:
+            remaining = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+            bound = remaining.order_by('pk').values('pk')[:batch_size].aggregate(last_id=Max('pk'))['last_id']
+            if bound is None:
+                return
+            yield remaining.filter(pk__lte=bound)
+            last_id = bound
+
+    @staticmethod
+    def write(
+            cache_entry: DynamicModelCacheEntry,
+            queryset: QuerySet,
+            batch_size: int,
+            write_batch: Callable[[QuerySet], int],
+            result_key: str,
+            row_delta: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Write the rows of the queryset in batches with `write_batch`, which
+        returns the number of written rows. Every written row changes the
+        row count of the table by `row_delta`. Writing stops at a batch
+        rejected by the database, whose error is reported together with
+        the number of rows written before it.
+        """
+        using = router.db_for_write(queryset.model)
+        result: Dict[str, Any] = {result_key: 0}
+        for batch in DynamicRowsBulkWriteService.iterate_batches(queryset, batch_size):
+            try:
+                with DynamicDataVersionService.atomic(using):
+                    count = write_batch(batch)
+                    if count:
+                        DynamicDataVersionService.bump(cache_entry.model_instance.pk, rows=count * row_delta)
+            except DatabaseError as error:
+                result['non_field_errors'] = [f'The rows could not be written: {str(error).strip()}']
+                break
+            result[result_key] += count
+        return result
+
+    @staticmethod
+    def update(
+            cache_entry: DynamicModelCacheEntry,
+            queryset: QuerySet,
+            values: Dict[str, Any],
+            batch_size: int
+    ) -> Dict[str, Any]:
+        """Set the validated values on the rows of the queryset."""
+        return DynamicRowsBulkWriteService.write(
+            cache_entry, queryset, batch_size,
+            lambda batch: DynamicRollupService.write_rows(batch, lambda rows: rows.update(**values), values),
+            'updated'
+        )
+
+    @staticmethod
+    def delete(cache_entry: DynamicModelCacheEntry, queryset: QuerySet, batch_size: int) -> Dict[str, Any]:
+        """Delete the rows of the queryset."""
+        # Rows of dynamic models have no relations or signals, so they are deleted without being collected
+        return DynamicRowsBulkWriteService.write(
+            cache_entry, queryset, batch_size,
+            lambda batch: DynamicRollupService.write_rows(batch, lambda rows: rows.delete()[0]),
+            'deleted', row_delta=-1
+        )
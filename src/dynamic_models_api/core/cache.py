@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+
+from core.models import DynamicModel
+
+
+class DynamicModelCacheEntry(NamedTuple):
+    model_instance: DynamicModel
+    fingerprint: str
+    model_class: Any
+    serializer_class: Any
+    row_encoder: Any = None
+
+
+class DynamicModelCache:
+    """
+    Process-wide LRU cache of the classes generated for dynamic models.
+
+    Entries are stored per dynamic model pk together with the schema
+    fingerprint they were built from, so a lookup with a different
+    fingerprint is treated as a miss.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[int, DynamicModelCacheEntry]' = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, pk: int, fingerprint: Optional[str] = None) -> Optional[DynamicModelCacheEntry]:
+        """
+        Return the cached entry for the pk, or None when it is missing
+        or was built from a different schema fingerprint.
+        """
+        with self.lock:
+            entry = self._entries.get(pk)
+            if entry is None:
+                return None
+            if fingerprint is not None and entry.fingerprint != fingerprint:
+                return None
+            self._entries.move_to_end(pk)
+            return entry
+
+    def set(self, entry: DynamicModelCacheEntry) -> None:
+        """
+        Store the entry, evicting the least recently used ones
+        when the cache is full.
+        """
+        with self.lock:
+            self._entries[entry.model_instance.pk] = entry
+            self._entries.move_to_end(entry.model_instance.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, pk: int) -> None:
+        """Drop the entry of a single dynamic model."""
+        with self.lock:
+            self._entries.pop(pk, None)
+
+    def versions(self) -> Dict[int, int]:
+        """Return the schema versions of the cached dynamic models by pk."""
+        with self.lock:
+            return {pk: entry.model_instance.schema_version for pk, entry in self._entries.items()}
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self.lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
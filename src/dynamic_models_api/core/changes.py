@@ -0,0 +1,166 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from django.db import connections
+from django.db import models
+from django.db.models import Q
+
+from core.encoders import DynamicRowsEncoder
+from core.models import DynamicModel
+
+
+class DynamicChangeSeqField(models.BigIntegerField):
+    """
+    Change sequence of a row, set by a trigger on every write and
+    returned by the INSERT statements of the ORM.
+    """
+    db_returning = True
+
+    def __init__(self, *args, **kwargs):
+        kwargs['editable'] = False
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['editable']
+        return name, path, args, kwargs
+
+
+class DynamicChangeService:
+    """
+    Tracks the changes of the rows of dynamic models with `change_tracking`,
+    so consumers can pull the rows written and deleted since they last
+    synced instead of the whole table.
+
+    Every write sets the `change_seq` column of the row to the 64-bit id
+    of the writing transaction, and every delete leaves a tombstone with
+    the id of the deleting transaction. Changes are read in the order of
+    `(change_seq, id)`, and only up to the oldest transaction still running,
+    so a transaction committing after a later one is never skipped by a
+    consumer that already read past it.
+
+    Change tracking requires PostgreSQL 13 or later.
+    """
+    CHANGE_SEQ = 'change_seq'
+    TOMBSTONES_SUFFIX = 'deleted'
+    CURSOR_PATTERN = r'^\d+\.\d+$'
+
+    @staticmethod
+    def is_tracked(model_instance: DynamicModel) -> bool:
+        return bool(getattr(model_instance, 'change_tracking', False))
+
+    @staticmethod
+    def prepare_change_seq_field() -> models.Field:
+        return DynamicChangeSeqField()
+
+    @staticmethod
+    def get_names(schema_editor, model_class) -> Dict[str, str]:
+        """Return the quoted names of the table and of the objects tracking its changes."""
+        table = model_class._meta.db_table
+        quote_name = schema_editor.quote_name
+        return {
+            'table': quote_name(table),
+            'tombstones': quote_name(DynamicChangeService.get_tombstones_table(model_class)),
+            'index': quote_name(f'{table[:40]}_change_seq'),
+            'track': quote_name(f'{table[:40]}_track_changes'),
+            'tombstone': quote_name(f'{table[:40]}_add_tombstone'),
+            'change_seq': quote_name(DynamicChangeService.CHANGE_SEQ),
+        }
+
+    @staticmethod
+    def get_tombstones_table(model_class) -> str:
+        return f'{model_class._meta.db_table}_{DynamicChangeService.TOMBSTONES_SUFFIX}'
+
+    @staticmethod
+    def create_tracking(schema_editor, model_class, partitioned: bool = False) -> None:
+        """
+        Create the index of the change sequence, the tombstones table and
+        the triggers maintaining both. Rows moved between partitions are
+        deleted and inserted again, so inserts into a partitioned table
+        remove the tombstone of the row.
+        """
+        names = DynamicChangeService.get_names(schema_editor, model_class)
+        remove_tombstone = 'DELETE FROM {tombstones} WHERE id = NEW.id; '.format(**names) if partitioned else ''
+        for statement in [
+            'CREATE INDEX {index} ON {table} ({change_seq}, id)',
+            'CREATE TABLE {tombstones} (id bigint PRIMARY KEY, {change_seq} bigint NOT NULL)',
+            'CREATE INDEX ON {tombstones} ({change_seq}, id)',
+            'CREATE FUNCTION {track}() RETURNS trigger AS $$ '
+            'BEGIN NEW.{change_seq} := pg_current_xact_id()::text::bigint; '
+            + remove_tombstone
+            + 'RETURN NEW; END $$ LANGUAGE plpgsql',
+            'CREATE TRIGGER {track} BEFORE INSERT OR UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION {track}()',
+            'CREATE FUNCTION {tombstone}() RETURNS trigger AS $$ '
+            'BEGIN INSERT INTO {tombstones} (id, {change_seq}) VALUES (OLD.id, pg_current_xact_id()::text::bigint) '
+            'ON CONFLICT (id) DO UPDATE SET {change_seq} = EXCLUDED.{change_seq}; '
+            'RETURN OLD; END $$ LANGUAGE plpgsql',
+            'CREATE TRIGGER {tombstone} BEFORE DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION {tombstone}()',
+        ]:
+            schema_editor.execute(statement.format(**names), params=None)
+
+    @staticmethod
+    def parse_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+        """Return the change sequence and the id of the last change read, `(0, 0)` without a cursor."""
+        if not cursor:
+            return 0, 0
+        change_seq, last_id = cursor.split('.')
+        return int(change_seq), int(last_id)
+
+    @staticmethod
+    def get_changes(
+            model_class,
+            row_encoder: DynamicRowsEncoder,
+            columns: List[str],
+            cursor: Optional[str],
+            page_size: int,
+            using: str
+    ) -> Dict[str, Any]:
+        """
+        Return a page of the rows written and the ids of the rows deleted
+        after the cursor, with the cursor of the last returned change and
+        whether more changes follow. A read replica returns the changes
+        committed before its own oldest running transaction, so switching
+        between databases never skips a change.
+        """
+        change_seq, last_id = DynamicChangeService.parse_cursor(cursor)
+        connection = connections[using]
+        with connection.cursor() as db_cursor:
+            # Transactions older than the oldest running one are all finished
+            db_cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+            horizon = db_cursor.fetchone()[0]
+
+            after = Q(change_seq__gt=change_seq) | Q(id__gt=last_id)
+            rows = list(
+                model_class.objects.using(connection.alias)
+                .filter(after, change_seq__gte=change_seq, change_seq__lt=horizon)
+                .order_by(DynamicChangeService.CHANGE_SEQ, 'id')
+                .values_list(DynamicChangeService.CHANGE_SEQ, 'id', *columns)[:page_size + 1]
+            )
+            db_cursor.execute(
+                'SELECT {change_seq}, id FROM {tombstones} '
+                'WHERE ({change_seq}, id) > (%s, %s) AND {change_seq} < %s '
+                'ORDER BY {change_seq}, id LIMIT %s'.format(
+                    change_seq=connection.ops.quote_name(DynamicChangeService.CHANGE_SEQ),
+                    tombstones=connection.ops.quote_name(DynamicChangeService.get_tombstones_table(model_class)),
+                ),
+                [change_seq, last_id, horizon, page_size + 1],
+            )
+            tombstones = db_cursor.fetchall()
+
+        changes = sorted(
+            [(row[0], row[1], row[2:]) for row in rows] + [(seq, pk, None) for seq, pk in tombstones],
+            key=lambda change: change[:2],
+        )
+        page = changes[:page_size]
+        if page:
+            change_seq, last_id = page[-1][:2]
+        written = [values for _, _, values in page if values is not None]
+        return {
+            'cursor': f'{change_seq}.{last_id}',
+            'more': len(changes) > page_size,
+            'rows': list(row_encoder.to_dicts(written, columns)),
+            'deleted': [pk for _, pk, values in page if values is None],
+        }
@@ -0,0 +1,255 @@
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import NamedTuple
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import BaseCache
+from django.core.cache import caches
+from django.db import connections
+from django.db import router
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import QuerySet
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Greatest
+from django.db.models.functions import Now
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from core.models import DynamicDataDelta
+from core.models import DynamicModel
+
+
+class DynamicDataVersion(NamedTuple):
+    schema_version: int
+    data_version: int
+    data_modified_at: datetime
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self.schema_version}.{self.data_version}"'
+
+    @property
+    def last_modified(self) -> int:
+        return int(self.data_modified_at.timestamp())
+
+
+class DynamicDataVersionService:
+    """
+    Tracks a version of the rows of every dynamic model, which is bumped
+    by every write to the rows and every change of the table.
+
+    A write to the rows appends a delta, with the number of inserted or
+    deleted rows, in the transaction of the write. Writers therefore never
+    wait on each other, nor on the dynamic model row. The deltas are folded
+    into the data version and row count of the dynamic model periodically,
+    in short transactions of their own, and the current version is read
+    with the deltas not folded yet. A response built from rows read after
+    reading the version is therefore never older than the version.
+    """
+
+    @staticmethod
+    def annotate_current(queryset: QuerySet) -> QuerySet:
+        """
+        Annotate the dynamic models with their `current_data_version`,
+        `current_data_modified_at` and `current_row_count`, which include
+        their deltas not folded yet.
+        """
+        return queryset.annotate(
+            current_data_version=F('data_version') + Count('data_deltas'),
+            # NULL arguments are ignored by GREATEST in PostgreSQL
+            current_data_modified_at=Greatest('data_modified_at', Max('data_deltas__created_at')),
+            # An unknown row count stays unknown
+            current_row_count=F('row_count') + Coalesce(Sum('data_deltas__rows'), 0),
+        )
+
+    @staticmethod
+    def get_queryset(pk: int) -> QuerySet:
+        return DynamicDataVersionService.annotate_current(DynamicModel.objects.filter(pk=pk)).values_list(
+            'schema_version', 'current_data_version', 'current_data_modified_at',
+        )
+
+    @staticmethod
+    def get(pk: int) -> Optional[DynamicDataVersion]:
+        """Return the current version of the rows of the dynamic model."""
+        values = DynamicDataVersionService.get_queryset(pk).first()
+        return DynamicDataVersion(*values) if values else None
+
+    @staticmethod
+    async def aget(pk: int) -> Optional[DynamicDataVersion]:
+        values = await DynamicDataVersionService.get_queryset(pk).afirst()
+        return DynamicDataVersion(*values) if values else None
+
+    @staticmethod
+    def refresh(model_instance: DynamicModel) -> None:
+        """
+        Read the data version, modification time and row count of the
+        model instance again, with the deltas not folded yet.
+        """
+        values = DynamicDataVersionService.annotate_current(DynamicModel.objects.filter(pk=model_instance.pk)).values(
+            'current_data_version', 'current_data_modified_at', 'current_row_count',
+        ).first()
+        for name, value in (values or {}).items():
+            setattr(model_instance, name[len('current_'):], value)
+
+    @staticmethod
+    def get_fold_size() -> int:
+        return getattr(settings, 'DYNAMIC_MODELS_DATA_FOLD_SIZE', 100)
+
+    @staticmethod
+    @contextmanager
+    def atomic(using: str) -> Iterator[None]:
+        """
+        Open a transaction writing rows to the database `using` and bumping
+        their version. When the dynamic models are stored in another
+        database, the transaction of the version is committed right after
+        the transaction of the rows.
+        """
+        with transaction.atomic(using=router.db_for_write(DynamicModel)):
+            with transaction.atomic(using=using, savepoint=False):
+                yield
+
+    @staticmethod
+    def bump(pk: int, rows: int = 0) -> None:
+        """
+        Bump the version of the rows of the dynamic model, in the
+        transaction writing them, and add the number of inserted rows,
+        negative for deleted rows, to its row count. Every
+        `DYNAMIC_MODELS_DATA_FOLD_SIZE` deltas, the deltas are folded once
+        the transaction is committed.
+        """
+        using = router.db_for_write(DynamicModel)
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            # The deferred foreign key of the delta would only lock the dynamic model on commit, after the rows
+            # of another database are committed. A count backfilling the row count waits for this lock, which
+            # does not conflict with other writers nor with the folds.
+            table = connection.ops.quote_name(DynamicModel._meta.db_table)
+            cursor.execute(f'SELECT 1 FROM {table} WHERE id = %s FOR KEY SHARE', [pk])
+        delta = DynamicDataDelta.objects.using(using).create(dynamic_model_id=pk, rows=rows, created_at=Now())
+        if delta.pk % DynamicDataVersionService.get_fold_size() == 0:
+            transaction.on_commit(DynamicDataVersionService.fold, using=using)
+
+    @staticmethod
+    def fold(limit: Optional[int] = None) -> int:
+        """
+        Fold the oldest deltas, at most twice the fold size by default,
+        into the data version and row count of their dynamic models, in a
+        transaction of its own. Deltas locked by another fold are skipped.
+        Return the number of folded deltas.
+        """
+        using = router.db_for_write(DynamicModel)
+        limit = limit or 2 * DynamicDataVersionService.get_fold_size()
+        with transaction.atomic(using=using):
+            deltas = list(
+                DynamicDataDelta.objects.using(using).select_for_update(skip_locked=True).order_by('pk').values_list(
+                    'pk', 'dynamic_model_id', 'rows', 'created_at',
+                )[:limit]
+            )
+            totals: Dict[int, Dict[str, Any]] = {}
+            for _, dynamic_model_id, rows, created_at in deltas:
+                total = totals.setdefault(dynamic_model_id, {'versions': 0, 'rows': 0, 'modified_at': created_at})
+                total['versions'] += 1
+                total['rows'] += rows
+                total['modified_at'] = max(total['modified_at'], created_at)
+            # Dynamic models are locked in the same order by concurrent folds
+            for dynamic_model_id in sorted(totals):
+                total = totals[dynamic_model_id]
+                DynamicModel.objects.using(using).filter(pk=dynamic_model_id).update(
+                    data_version=F('data_version') + total['versions'],
+                    data_modified_at=Greatest('data_modified_at', Value(total['modified_at'])),
+                    row_count=F('row_count') + total['rows'],
+                )
+            DynamicDataDelta.objects.using(using).filter(pk__in=[delta[0] for delta in deltas]).delete()
+        return len(deltas)
+
+    @staticmethod
+    def get_not_modified_response(request, version: DynamicDataVersion) -> Optional[HttpResponse]:
+        """
+        Return the `304 Not Modified` response of a conditional request
+        for rows of the version, or None when the rows have to be sent.
+        """
+        response = get_conditional_response(request, etag=version.etag, last_modified=version.last_modified)
+        if response is not None:
+            DynamicDataVersionService.set_headers(response, version)
+        return response
+
+    @staticmethod
+    def set_headers(response: HttpResponse, version: DynamicDataVersion) -> HttpResponse:
+        """Set the validators of a response with rows of the version, which clients revalidate on every use."""
+        response.headers['ETag'] = version.etag
+        response.headers['Last-Modified'] = http_date(version.last_modified)
+        patch_cache_control(response, no_cache=True)
+        # The browsable API and the JSON response of the rows share the version
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class DynamicRowsResponseCache:
+    """
+    Stores the rendered JSON responses of the rows endpoint in the Django
+    cache configured with `DYNAMIC_MODELS_ROWS_CACHE`.
+
+    Responses are keyed by the dynamic model, the version of its rows and
+    the requested URL, so writes invalidate them without deleting keys.
+    Outdated responses expire with the cache timeout.
+    """
+
+    @staticmethod
+    def get_cache() -> Optional[BaseCache]:
+        alias = getattr(settings, 'DYNAMIC_MODELS_ROWS_CACHE', None)
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def get_key(pk: int, version: DynamicDataVersion, request) -> str:
+        # Links to the other pages are absolute, so the host is part of the key
+        url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        return f'dynamic_models:rows:{pk}:{version.schema_version}.{version.data_version}:{url}'
+
+    @staticmethod
+    def get(pk: int, version: DynamicDataVersion, request) -> Optional[bytes]:
+        """Return the cached body of the response, or None."""
+        cache = DynamicRowsResponseCache.get_cache()
+        if cache is None:
+            return None
+        return cache.get(DynamicRowsResponseCache.get_key(pk, version, request))
+
+    @staticmethod
+    async def aget(pk: int, version: DynamicDataVersion, request) -> Optional[bytes]:
+        cache = DynamicRowsResponseCache.get_cache()
+        if cache is None:
+            return None
+        return await cache.aget(DynamicRowsResponseCache.get_key(pk, version, request))
+
+    @staticmethod
+    def is_cacheable(body: bytes) -> bool:
+        return len(body) <= getattr(settings, 'DYNAMIC_MODELS_ROWS_CACHE_MAX_SIZE', 1024 * 1024)
+
+    @staticmethod
+    def set(pk: int, version: DynamicDataVersion, request, body: bytes) -> None:
+        """Store the body of the response, unless it is too large."""
+        cache = DynamicRowsResponseCache.get_cache()
+        if cache is None or not DynamicRowsResponseCache.is_cacheable(body):
+            return
+        timeout = getattr(settings, 'DYNAMIC_MODELS_ROWS_CACHE_TIMEOUT', 300)
+        cache.set(DynamicRowsResponseCache.get_key(pk, version, request), body, timeout)
+
+    @staticmethod
+    async def aset(pk: int, version: DynamicDataVersion, request, body: bytes) -> None:
+        cache = DynamicRowsResponseCache.get_cache()
+        if cache is None or not DynamicRowsResponseCache.is_cacheable(body):
+            return
+        timeout = getattr(settings, 'DYNAMIC_MODELS_ROWS_CACHE_TIMEOUT', 300)
+        await cache.aset(DynamicRowsResponseCache.get_key(pk, version, request), body, timeout)
@@ -0,0 +1,107 @@
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from django.db import connections
+from django.db import router
+from django.db import transaction
+from django.db.models import Sum
+
+from core.conditional import DynamicDataVersionService
+from core.models import DynamicDataDelta
+from core.models import DynamicModel
+from core.routing import DynamicDatabaseService
+
+
+class DynamicCountService:
+    """
+    Counts the rows of the table of a dynamic model in one of three modes:
+
+    -   `exact` counts the rows with `COUNT(*)`, which scans the table.
+    -   `estimate` reads the number of rows estimated by the PostgreSQL
+        planner, as of the last `ANALYZE` or `VACUUM` of the table.
+    -   `cached` reads the row count kept with the dynamic model, with the
+        row deltas appended by the writes bumping the data version.
+
+    Modes which have no answer fall back to the next one: an estimate of a
+    table never analyzed to the cached count, and an unknown cached count
+    to an exact count, which is then cached.
+    """
+    MODES = ['exact', 'estimate', 'cached']
+
+    @staticmethod
+    def count_exact(model_class, using: str) -> int:
+        return model_class.objects.using(using).count()
+
+    @staticmethod
+    def count_estimate(model_class, using: str) -> Optional[int]:
+        """
+        Return the planner estimate of the number of rows, summed over the
+        partitions of a partitioned table, or None when it is unknown.
+        """
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            # Tables never analyzed have -1 tuples, partitioned tables none of their own
+            cursor.execute(
+                'SELECT sum(reltuples)::bigint, bool_or(reltuples < 0) FROM pg_class '
+                'WHERE relkind <> %s AND (oid = %s::regclass OR oid IN ('
+                'SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass))',
+                ['p', *[connection.ops.quote_name(model_class._meta.db_table)] * 2],
+            )
+            rows, unknown = cursor.fetchone()
+        return None if rows is None or unknown else rows
+
+    @staticmethod
+    def get_cached(pk: int) -> Optional[int]:
+        return DynamicDataVersionService.annotate_current(
+            DynamicModel.objects.filter(pk=pk)
+        ).values_list('current_row_count', flat=True).first()
+
+    @staticmethod
+    def count_cached(model_instance: DynamicModel, model_class) -> int:
+        """
+        Return the cached row count. When it is unknown, the rows are
+        counted on the database the table is placed on, not on a replica
+        which may lag behind.
+        """
+        rows = DynamicCountService.get_cached(model_instance.pk)
+        if rows is None:
+            rows = DynamicCountService.backfill(model_instance, model_class)
+        return rows
+
+    @staticmethod
+    def backfill(model_instance: DynamicModel, model_class) -> int:
+        """
+        Count the rows and cache the count, while holding the lock of the
+        dynamic model row. The lock waits for the writes whose deltas are
+        not committed yet and keeps new ones waiting until the count is
+        cached, so the count is exactly the committed rows minus the
+        committed deltas, and no write is lost.
+        """
+        using = router.db_for_write(DynamicModel)
+        with transaction.atomic(using=using):
+            # Aggregates cannot be read with FOR UPDATE
+            list(DynamicModel.objects.using(using).select_for_update().filter(pk=model_instance.pk).values_list('pk'))
+            rows = DynamicCountService.get_cached(model_instance.pk)
+            if rows is not None:
+                return rows
+            rows = DynamicCountService.count_exact(model_class, DynamicDatabaseService.get_database(model_instance))
+            pending = DynamicDataDelta.objects.using(using).filter(
+                dynamic_model=model_instance.pk
+            ).aggregate(rows=Sum('rows'))['rows']
+            DynamicModel.objects.using(using).filter(pk=model_instance.pk).update(row_count=rows - (pending or 0))
+        return rows
+
+    @staticmethod
+    def count(model_instance: DynamicModel, model_class, mode: str, using: str) -> Dict[str, Any]:
+        """Return the number of rows and the mode it was counted with."""
+        if mode == 'estimate':
+            rows = DynamicCountService.count_estimate(model_class, using)
+            if rows is not None:
+                return {'count': rows, 'mode': mode}
+            mode = 'cached'
+        if mode == 'cached':
+            return {'count': DynamicCountService.count_cached(model_instance, model_class), 'mode': mode}
+        return {'count': DynamicCountService.count_exact(model_class, using), 'mode': mode}
@@ -0,0 +1,113 @@
+import json
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Type
+
+from django.conf import settings
+from django.db import models
+from rest_framework import serializers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class DynamicRowsEncoder:
+    """
+    Encodes rows of a dynamic model, read as tuples with `values_list()`,
+    straight to JSON bytes.
+
+    The output matches the rendering of the rows by the generated
+    `ModelSerializer` and DRF `JSONRenderer`, without creating model
+    instances or running serializer fields. With the `orjson` backend the
+    output is equivalent JSON, which may format numbers differently and
+    renders NaN as null.
+    """
+    # Conversions done by the serializer fields of the model fields, on top
+    # of the values returned by the database driver
+    FIELD_CONVERTERS: Dict[Type[models.Field], Callable[[Any], Any]] = {
+        models.FloatField: float,
+        models.DateTimeField: serializers.DateTimeField().to_representation,
+        models.DateField: serializers.DateField().to_representation,
+        models.UUIDField: str,
+    }
+    MAX_PREPARED_COLUMNS = 64
+
+    def __init__(self, model_class, backend: Optional[str] = None):
+        self.model_fields: Dict[str, models.Field] = {
+            field.name: field for field in model_class._meta.concrete_fields
+        }
+        backend = backend or getattr(settings, 'DYNAMIC_MODELS_JSON_BACKEND', 'json')
+        if backend == 'orjson' and orjson is None:
+            raise ImportError('The orjson JSON backend requires the orjson package.')
+        self.backend = backend
+        self._prepared_columns: Dict[Tuple[str, ...], List[Tuple[str, Optional[Callable[[Any], Any]]]]] = {}
+
+    def get_converter(self, field: models.Field) -> Optional[Callable[[Any], Any]]:
+        if isinstance(field, models.DecimalField):
+            # Decimals are rendered as strings with the scale of the field
+            return serializers.DecimalField(field.max_digits, field.decimal_places).to_representation
+        for field_class, converter in self.FIELD_CONVERTERS.items():
+            if isinstance(field, field_class):
+                return converter
+        return None
+
+    def prepare_columns(self, columns: Sequence[str]) -> List[Tuple[str, Optional[Callable[[Any], Any]]]]:
+        """Return the column names with the converters of their values, computed once per column order."""
+        key = tuple(columns)
+        prepared = self._prepared_columns.get(key)
+        if prepared is None:
+            if len(self._prepared_columns) >= self.MAX_PREPARED_COLUMNS:
+                self._prepared_columns.clear()
+            prepared = [(name, self.get_converter(self.model_fields[name])) for name in key]
+            self._prepared_columns[key] = prepared
+        return prepared
+
+    def to_dicts(self, rows: Iterable[Sequence[Any]], columns: Sequence[str]) -> Iterable[Dict[str, Any]]:
+        """Convert the row tuples to the dictionaries the serializer would produce."""
+        prepared = self.prepare_columns(columns)
+        if not any(converter for _, converter in prepared):
+            return (dict(zip(columns, row)) for row in rows)
+        return (
+            {
+                name: value if converter is None or value is None else converter(value)
+                for (name, converter), value in zip(prepared, row)
+            }
+            for row in rows
+        )
+
+    def dumps(self, data: Any) -> bytes:
+        """Encode the data like the DRF `JSONRenderer` does."""
+        if self.backend == 'orjson':
+            encoded = orjson.dumps(data)
+            return encoded.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        encoded = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+        return encoded.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+    def encode_rows(self, rows: Iterable[Sequence[Any]], columns: Sequence[str]) -> bytes:
+        """Encode the rows as a JSON array of objects."""
+        return self.dumps(list(self.to_dicts(rows, columns)))
+
+    def encode_page(
+            self,
+            rows: Iterable[Mapping[str, Any]],
+            columns: Sequence[str],
+            next_link: Optional[str],
+            previous_link: Optional[str]
+    ) -> bytes:
+        """Encode a page of named rows like the response of the cursor pagination."""
+        results = self.encode_rows(([row[name] for name in columns] for row in rows), columns)
+        return b'{"next":%s,"previous":%s,"results":%s}' % (self.dumps(next_link), self.dumps(previous_link), results)
+
+    def iterate_encoded_rows(self, rows: Iterable[Sequence[Any]], columns: Sequence[str]) -> Iterable[bytes]:
+        """Yield every row encoded as a JSON object."""
+        for row in self.to_dicts(rows, columns):
+            yield self.dumps(row)
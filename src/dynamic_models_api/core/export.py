@@ -0,0 +1,154 @@
+import csv
+import io
+import queue
+import threading
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Sequence
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.db.models import QuerySet
+from django.db.models.functions import JSONObject
+from django.http import StreamingHttpResponse
+
+from core.encoders import DynamicRowsEncoder
+from core.streaming import DynamicRowsStream
+
+
+class DynamicRowsExport:
+    """
+    Exports the rows of a dynamic model as CSV or NDJSON.
+
+    On PostgreSQL the rows are streamed straight from `COPY (SELECT ...) TO
+    STDOUT`, so the rows are neither converted to Python objects nor held in
+    memory. On other backends they are read from a server-side cursor in
+    chunks and encoded in Python.
+    """
+    CONTENT_TYPES = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+    # COPY escapes backslashes in its text format, JSON lines are written in
+    # the CSV format with quote and delimiter characters JSON always escapes
+    JSON_COPY_OPTIONS = "FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02'"
+    # Chunks buffered between the COPY and the response with psycopg2
+    QUEUE_SIZE = 16
+
+    @staticmethod
+    def get_formats() -> Iterable[str]:
+        """Return the supported export formats."""
+        return DynamicRowsExport.CONTENT_TYPES.keys()
+
+    @staticmethod
+    def get_copy_sql(queryset: QuerySet, columns: Sequence[str], export_format: str) -> str:
+        """Return the COPY statement writing the rows of the queryset, read as tuples of the columns."""
+        if export_format == 'ndjson':
+            queryset = queryset.values_list(JSONObject(**{name: F(name) for name in columns}))
+        sql, params = queryset.query.sql_with_params()
+        # COPY does not accept query parameters
+        select = connections[queryset.db].ops.compose_sql(sql, params)
+        if export_format == 'ndjson':
+            return f'COPY ({select}) TO STDOUT WITH ({DynamicRowsExport.JSON_COPY_OPTIONS})'
+        return f'COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)'
+
+    @staticmethod
+    def iterate_copy(using: str, sql: str) -> Iterator[bytes]:
+        """Yield the output of the COPY statement as it is received."""
+        with connections[using].cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy_expert'):
+                yield from DynamicRowsExport.iterate_copy_expert(cursor.cursor, sql)
+            else:
+                with cursor.cursor.copy(sql) as copy:
+                    for data in copy:
+                        yield bytes(data)
+
+    @staticmethod
+    def iterate_copy_expert(cursor, sql: str) -> Iterator[bytes]:
+        """
+        Yield the output of the COPY statement with psycopg2, whose
+        `copy_expert` only writes to a file. The COPY runs in a thread
+        writing to a bounded queue, and is cancelled when the response is
+        closed early.
+        """
+        chunks: queue.Queue = queue.Queue(maxsize=DynamicRowsExport.QUEUE_SIZE)
+        cancelled = threading.Event()
+
+        class QueueWriter:
+            def write(self, data):
+                if not cancelled.is_set():
+                    chunks.put(data.encode() if isinstance(data, str) else bytes(data))
+
+        def copy():
+            try:
+                cursor.copy_expert(sql, QueueWriter())
+            except Exception as error:
+                chunks.put(error)
+            finally:
+                chunks.put(None)
+
+        thread = threading.Thread(target=copy, name='dynamic-models-export', daemon=True)
+        thread.start()
+        try:
+            while (chunk := chunks.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            if thread.is_alive():
+                cancelled.set()
+                cursor.connection.cancel()
+                # Unblock the writer and wait for the COPY to end
+                while chunks.get() is not None:
+                    pass
+                thread.join()
+
+    @staticmethod
+    def format_csv_value(value: Any) -> Any:
+        """Format a value like PostgreSQL formats it in CSV."""
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+            return int(value)
+        return value
+
+    @staticmethod
+    def iterate_csv(queryset: QuerySet, columns: Sequence[str]) -> Iterator[bytes]:
+        """Yield the rows of the queryset, read as tuples of the columns, as CSV with a header."""
+        chunk_size = getattr(settings, 'DYNAMIC_MODELS_ROWS_CHUNK_SIZE', 2000)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        for index, row in enumerate(queryset.iterator(chunk_size=chunk_size), start=1):
+            writer.writerow([DynamicRowsExport.format_csv_value(value) for value in row])
+            if index % chunk_size == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    @staticmethod
+    def create_response(
+            encoder: DynamicRowsEncoder,
+            queryset: QuerySet,
+            columns: Sequence[str],
+            export_format: str,
+            filename: str
+    ) -> StreamingHttpResponse:
+        """
+        Create a streaming response with the rows of the queryset, read as
+        tuples of the columns, in the given format, either `csv` or `ndjson`.
+        """
+        if connections[queryset.db].vendor == 'postgresql':
+            sql = DynamicRowsExport.get_copy_sql(queryset, columns, export_format)
+            content = DynamicRowsExport.iterate_copy(queryset.db, sql)
+        elif export_format == 'ndjson':
+            content = DynamicRowsStream.iterate_ndjson(encoder, queryset, columns)
+        else:
+            content = DynamicRowsExport.iterate_csv(queryset, columns)
+
+        response = StreamingHttpResponse(content, content_type=DynamicRowsExport.CONTENT_TYPES[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+        return response
@@ -0,0 +1,352 @@
+import logging
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db import IntegrityError
+from django.db import OperationalError
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+from rest_framework import serializers
+
+from core.models import DynamicFieldMigration
+from core.models import DynamicModel
+from core.rollups import DynamicRollupService
+from core.routing import DynamicDatabaseService
+from core.services import DynamicModelService
+from core.services import dynamic_model_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicFieldMigrationService:
+    """
+    Changes the type of dynamic model fields without locking the table for
+    the duration of the conversion.
+
+    Instead of altering the column in place, a shadow column of the new type
+    is added and kept in sync with the original column by a trigger. The
+    existing rows are converted in bounded batches, each in its own short
+    transaction, and the columns are swapped once every row is converted.
+    Until the swap the field keeps its previous type in the definition of
+    the dynamic model. Rows whose value cannot be converted are reported,
+    and fail the migration without changing the original column.
+    """
+    # Key of the advisory locks making sure a migration is run by one runner at a time
+    LOCK_NAMESPACE = 7411
+    MAX_ERRORS = 100
+    LOCK_TIMEOUT = '5s'
+    SWAP_ATTEMPTS = 3
+
+    @staticmethod
+    def get_db_type(field: Dict[str, Any], using: str) -> str:
+        return DynamicModelService.prepare_field(field).db_parameters(connections[using])['type']
+
+    @staticmethod
+    def get_fields(migration: DynamicFieldMigration) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Return the definitions of the migrated field before and after the migration."""
+        return (
+            migration.from_field or {'name': migration.field_name, 'type': migration.from_type},
+            migration.to_field or {'name': migration.field_name, 'type': migration.to_type},
+        )
+
+    @staticmethod
+    def get_database(migration: DynamicFieldMigration) -> str:
+        """Return the database holding the table of the migrated field."""
+        return DynamicDatabaseService.get_database(migration.dynamic_model)
+
+    @staticmethod
+    def get_names(migration: DynamicFieldMigration) -> Dict[str, str]:
+        """Return the quoted names of the table and of the objects created for the migration."""
+        table_name = DynamicModelService.prepare_table_name(migration.dynamic_model)
+        using = DynamicFieldMigrationService.get_database(migration)
+        quote_name = connections[using].ops.quote_name
+        from_field, to_field = DynamicFieldMigrationService.get_fields(migration)
+        return {
+            'table': quote_name(table_name),
+            'column': quote_name(migration.field_name),
+            'shadow': quote_name(f'__shadow_{migration.pk}'),
+            'cast': quote_name(f'{table_name[:40]}_cast_{migration.pk}'),
+            'sync': quote_name(f'{table_name[:40]}_sync_{migration.pk}'),
+            'check': quote_name(f'{table_name[:40]}_shadow_{migration.pk}'),
+            'from_type': DynamicFieldMigrationService.get_db_type(from_field, using),
+            'to_type': DynamicFieldMigrationService.get_db_type(to_field, using),
+        }
+
+    @staticmethod
+    def defer_type_changes(model_instance: DynamicModel, previous_instance: DynamicModel) -> List[DynamicFieldMigration]:
+        """
+        Revert the type changes of the model instance which would rewrite the
+        table, and return the unsaved migrations applying them online instead.
+        """
+        previous_fields = {field['name']: field for field in previous_instance.fields}
+        using = DynamicDatabaseService.get_database(model_instance)
+        field_migrations = []
+        for position, field in enumerate(model_instance.fields):
+            previous_field = previous_fields.get(field['name'])
+            if previous_field is None or (
+                DynamicFieldMigrationService.get_db_type(previous_field, using)
+                == DynamicFieldMigrationService.get_db_type(field, using)
+            ):
+                continue
+            if any(definition.get(option) for definition in (previous_field, field) for option in ('search', 'trigram')):
+                # The search column and the trigram index depend on the column swapped out
+                raise serializers.ValidationError({
+                    'online': f'The type of the searchable field "{field["name"]}" can not be changed online.'
+                })
+            if any(field['name'] in DynamicRollupService.get_field_names(rollup) for rollup in model_instance.rollups):
+                # The rollup tables hold values of the type of the column swapped out
+                raise serializers.ValidationError({
+                    'online': f'The type of the field "{field["name"]}" of a rollup can not be changed online.'
+                })
+            field_migrations.append(DynamicFieldMigration(
+                dynamic_model=model_instance,
+                field_name=field['name'],
+                from_type=previous_field['type'],
+                to_type=field['type'],
+                from_field=previous_field,
+                to_field=field,
+            ))
+            # The options of the field change with its type once the columns are swapped
+            model_instance.fields[position] = previous_field
+
+        if field_migrations:
+            if connections[using].vendor != 'postgresql':
+                raise serializers.ValidationError({'online': 'Online migrations are only supported on PostgreSQL.'})
+            model_instance.save(update_fields=['fields'])
+        return field_migrations
+
+    @staticmethod
+    def start(field_migrations: List[DynamicFieldMigration]) -> None:
+        """
+        Create the shadow columns of the migrations and the triggers keeping
+        them in sync. The migrations are run once the transaction commits.
+        """
+        for migration in field_migrations:
+            migration.save()
+            names = DynamicFieldMigrationService.get_names(migration)
+            with connections[DynamicFieldMigrationService.get_database(migration)].cursor() as cursor:
+                cursor.execute('ALTER TABLE {table} ADD COLUMN {shadow} {to_type} NULL'.format(**names))
+                # Values that cannot be converted are left NULL and reported by the backfill
+                cursor.execute(
+                    'CREATE FUNCTION {cast}(value {from_type}) RETURNS {to_type} AS $$ '
+                    'BEGIN RETURN CAST(value AS {to_type}); '
+                    'EXCEPTION WHEN others THEN RETURN NULL; END $$ LANGUAGE plpgsql STABLE'.format(**names)
+                )
+                cursor.execute(
+                    'CREATE FUNCTION {sync}() RETURNS trigger AS $$ '
+                    'BEGIN NEW.{shadow} := {cast}(NEW.{column}); RETURN NEW; END $$ LANGUAGE plpgsql'.format(**names)
+                )
+                cursor.execute(
+                    'CREATE TRIGGER {sync} BEFORE INSERT OR UPDATE OF {column} ON {table} '
+                    'FOR EACH ROW EXECUTE FUNCTION {sync}()'.format(**names)
+                )
+        if field_migrations:
+            transaction.on_commit(DynamicFieldMigrationService.start_runner)
+
+    @staticmethod
+    def start_runner() -> None:
+        """Run the active migrations in a background thread, unless they are run by a separate worker."""
+        if getattr(settings, 'DYNAMIC_MODELS_FIELD_MIGRATION_RUNNER', 'thread') != 'thread':
+            return
+        threading.Thread(
+            target=DynamicFieldMigrationService.run_active,
+            name='dynamic-models-field-migrations',
+            daemon=True
+        ).start()
+
+    @staticmethod
+    def run_active() -> None:
+        """Run all pending and interrupted migrations."""
+        try:
+            for migration in DynamicFieldMigration.objects.filter(status__in=DynamicFieldMigration.ACTIVE_STATUSES):
+                try:
+                    DynamicFieldMigrationService.run(migration)
+                except Exception:
+                    logger.exception('Field migration %s failed, it will be resumed by the next run', migration.pk)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def run(migration: DynamicFieldMigration) -> None:
+        """
+        Backfill the shadow column and swap the columns. A migration already
+        run by another process is skipped, an interrupted one is resumed
+        after the last converted row.
+        """
+        # The locks are taken in the default database storing the migrations
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [DynamicFieldMigrationService.LOCK_NAMESPACE, migration.pk])
+            if not cursor.fetchone()[0]:
+                return
+        try:
+            migration.refresh_from_db()
+            if migration.status not in DynamicFieldMigration.ACTIVE_STATUSES:
+                return
+            if migration.status == DynamicFieldMigration.STATUS_PENDING:
+                names = DynamicFieldMigrationService.get_names(migration)
+                with connections[DynamicFieldMigrationService.get_database(migration)].cursor() as cursor:
+                    cursor.execute('SELECT count(*) FROM {table}'.format(**names))
+                    migration.total_rows = cursor.fetchone()[0]
+                migration.status = DynamicFieldMigration.STATUS_RUNNING
+                migration.save(update_fields=['status', 'total_rows', 'updated_at'])
+
+            batch_size = getattr(settings, 'DYNAMIC_MODELS_FIELD_MIGRATION_BATCH_SIZE', 5000)
+            while DynamicFieldMigrationService.backfill_batch(migration, batch_size):
+                pass
+            if migration.error_count:
+                DynamicFieldMigrationService.fail(migration)
+                return
+            DynamicFieldMigrationService.swap(migration)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [DynamicFieldMigrationService.LOCK_NAMESPACE, migration.pk])
+
+    @staticmethod
+    def backfill_batch(migration: DynamicFieldMigration, batch_size: int) -> bool:
+        """
+        Convert the next batch of rows, return whether there were rows left.
+        The progress is committed after the batch, so a batch is converted
+        again rather than skipped when the table is in another database.
+        """
+        names = DynamicFieldMigrationService.get_names(migration)
+        using = DynamicFieldMigrationService.get_database(migration)
+        with transaction.atomic(), transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(
+                'WITH batch AS (SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s), '
+                'converted AS ('
+                'UPDATE {table} SET {shadow} = {cast}({column}) FROM batch WHERE {table}.id = batch.id '
+                'RETURNING {table}.id, {column} AS value, {shadow} IS NULL AND {column} IS NOT NULL AS failed'
+                ') '
+                'SELECT count(*), max(id), json_agg(json_build_object(\'id\', id, \'value\', value) ORDER BY id) '
+                'FILTER (WHERE failed) FROM converted'.format(**names),
+                [migration.last_id, batch_size]
+            )
+            count, last_id, failed_rows = cursor.fetchone()
+            if not count:
+                return False
+            DynamicFieldMigrationService.add_errors(migration, failed_rows or [])
+            migration.last_id = last_id
+            migration.processed_rows += count
+            migration.save(update_fields=['last_id', 'processed_rows', 'error_count', 'errors', 'updated_at'])
+        return True
+
+    @staticmethod
+    def add_errors(migration: DynamicFieldMigration, failed_rows: List[Dict[str, Any]]) -> None:
+        migration.error_count += len(failed_rows)
+        for row in failed_rows[:max(DynamicFieldMigrationService.MAX_ERRORS - len(migration.errors), 0)]:
+            migration.errors.append({
+                'id': row['id'],
+                'errors': [f'Value {row["value"]!r} cannot be converted to {migration.to_type}.'],
+            })
+
+    @staticmethod
+    def collect_failed_rows(migration: DynamicFieldMigration) -> List[Dict[str, Any]]:
+        """Return the rows written during the migration whose value could not be converted."""
+        names = DynamicFieldMigrationService.get_names(migration)
+        with connections[DynamicFieldMigrationService.get_database(migration)].cursor() as cursor:
+            cursor.execute(
+                'SELECT id, {column} FROM {table} WHERE {shadow} IS NULL AND {column} IS NOT NULL '
+                'ORDER BY id LIMIT %s'.format(**names),
+                [DynamicFieldMigrationService.MAX_ERRORS]
+            )
+            return [{'id': pk, 'value': value} for pk, value in cursor.fetchall()]
+
+    @staticmethod
+    def swap(migration: DynamicFieldMigration) -> None:
+        """
+        Replace the original column with the converted one. The NOT NULL
+        constraint is proven by a CHECK constraint validated beforehand, so
+        the swap only changes the catalog while the table is locked. For a
+        nullable field the constraint only proves that every value was
+        converted.
+        """
+        names = DynamicFieldMigrationService.get_names(migration)
+        nullable = bool(DynamicFieldMigrationService.get_fields(migration)[1].get('null'))
+        using = DynamicFieldMigrationService.get_database(migration)
+        with connections[using].cursor() as cursor:
+            try:
+                with transaction.atomic(using=using):
+                    # Rows written from now on must be convertible, or the write fails
+                    condition = '{shadow} IS NOT NULL OR {column} IS NULL' if nullable else '{shadow} IS NOT NULL'
+                    cursor.execute(
+                        ('ALTER TABLE {table} ADD CONSTRAINT {check} CHECK (' + condition + ') NOT VALID').format(**names)
+                    )
+                with transaction.atomic(using=using):
+                    cursor.execute('ALTER TABLE {table} VALIDATE CONSTRAINT {check}'.format(**names))
+            except IntegrityError:
+                DynamicFieldMigrationService.add_errors(migration, DynamicFieldMigrationService.collect_failed_rows(migration))
+                DynamicFieldMigrationService.fail(migration)
+                return
+
+        for attempt in range(DynamicFieldMigrationService.SWAP_ATTEMPTS):
+            try:
+                with transaction.atomic(), transaction.atomic(using=using), connections[using].cursor() as cursor:
+                    # The definition is read once schema updates of other fields are committed, and locked
+                    # before the table like they do
+                    model_instance = DynamicModel.objects.select_for_update().get(pk=migration.dynamic_model_id)
+                    # Do not queue behind long transactions while blocking every other query of the table
+                    cursor.execute(f"SET LOCAL lock_timeout = '{DynamicFieldMigrationService.LOCK_TIMEOUT}'")
+                    cursor.execute('LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE'.format(**names))
+                    cursor.execute('DROP TRIGGER {sync} ON {table}'.format(**names))
+                    if not nullable:
+                        cursor.execute('ALTER TABLE {table} ALTER COLUMN {shadow} SET NOT NULL'.format(**names))
+                    cursor.execute('ALTER TABLE {table} DROP CONSTRAINT {check}, DROP COLUMN {column}'.format(**names))
+                    cursor.execute('ALTER TABLE {table} RENAME COLUMN {shadow} TO {column}'.format(**names))
+                    cursor.execute('DROP FUNCTION {sync}(), {cast}({from_type})'.format(**names))
+                    DynamicFieldMigrationService.complete(migration, model_instance)
+                break
+            except OperationalError:
+                if attempt + 1 == DynamicFieldMigrationService.SWAP_ATTEMPTS:
+                    raise
+                time.sleep(1)
+
+    @staticmethod
+    def complete(migration: DynamicFieldMigration, model_instance: DynamicModel) -> None:
+        """
+        Change the type and the options of the field in the definition of
+        the locked model instance, once the columns are swapped.
+        """
+        to_field = DynamicFieldMigrationService.get_fields(migration)[1]
+        model_instance.fields = [
+            to_field if field['name'] == migration.field_name else field for field in model_instance.fields
+        ]
+        model_instance.save(update_fields=['fields'])
+        migration.status = DynamicFieldMigration.STATUS_COMPLETED
+        migration.save(update_fields=['status', 'updated_at'])
+
+        model_class = DynamicModelService.create_model_class(model_instance)
+        dynamic_model_cache.invalidate(model_instance.pk)
+        DynamicModelService.bump_schema_version(model_instance)
+
+        # The indexes of the field were dropped with the original column
+        indexes = [
+            index for definition, index in zip(model_instance.indexes, DynamicModelService.prepare_indexes(model_instance))
+            if migration.field_name in definition['fields']
+            or migration.field_name in [param.partition('__')[0] for param in definition.get('condition') or {}]
+        ]
+        if indexes:
+            using = DynamicFieldMigrationService.get_database(migration)
+            transaction.on_commit(lambda: DynamicModelService.create_indexes(model_instance, model_class, indexes), using=using)
+
+    @staticmethod
+    def fail(migration: DynamicFieldMigration) -> None:
+        """Drop the shadow column and the trigger, leaving the original column as it was."""
+        names = DynamicFieldMigrationService.get_names(migration)
+        using = DynamicFieldMigrationService.get_database(migration)
+        try:
+            with transaction.atomic(using=using), connections[using].cursor() as cursor:
+                cursor.execute('DROP TRIGGER IF EXISTS {sync} ON {table}'.format(**names))
+                cursor.execute('ALTER TABLE {table} DROP COLUMN IF EXISTS {shadow}'.format(**names))
+                cursor.execute('DROP FUNCTION IF EXISTS {sync}(), {cast}({from_type})'.format(**names))
+        except DatabaseError:
+            logger.exception('Could not clean up field migration %s', migration.pk)
+        migration.status = DynamicFieldMigration.STATUS_FAILED
+        migration.save(update_fields=['status', 'error_count', 'errors', 'updated_at'])
@@ -0,0 +1,194 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models import F
+from django.db.models import Lookup
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.search import DynamicSearchService
+
+
+class DynamicContainsLookup(Lookup):
+    """Case-insensitive substring match with ILIKE, which a trigram index of the column can serve."""
+    lookup_name = 'icontains'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        operator = 'ILIKE' if connection.vendor == 'postgresql' else 'LIKE'
+        return f'{lhs} {operator} {rhs}', [*lhs_params, *rhs_params]
+
+
+class DynamicRowsFilter:
+    """
+    Translates query parameters into filters, ordering and column
+    projection on the rows of a dynamic model.
+
+    Filters are written as `<field>=<value>` or `<field>__<lookup>=<value>`.
+    Values are converted with the model field, so the comparison happens
+    in the database with the type of the column.
+    """
+    RESERVED_PARAMS = {'cursor', 'page_size', 'stream', 'fields', 'ordering', 'format', 'search'}
+    COMMON_LOOKUPS = ['exact', 'in']
+    RANGE_LOOKUPS = ['gt', 'gte', 'lt', 'lte']
+    STRING_LOOKUPS = ['startswith', 'contains', 'icontains']
+    NULL_LOOKUPS = ['isnull']
+
+    def __init__(
+            self,
+            model_class,
+            model_fields: Optional[Dict[str, models.Field]] = None,
+            using: Optional[str] = None
+    ):
+        self.model_class = model_class
+        # Database the rows are read from, by default the one the router picks
+        self.using = using
+        if model_fields is None:
+            model_fields = {field.name: field for field in model_class._meta.concrete_fields}
+        self.model_fields = model_fields
+
+    @classmethod
+    def for_fields(cls, model_fields: Dict[str, models.Field]) -> 'DynamicRowsFilter':
+        """
+        Create a filter that only builds Q objects for the given fields,
+        before the model class exists.
+        """
+        return cls(None, model_fields)
+
+    @staticmethod
+    def get_lookups(field: models.Field) -> List[str]:
+        """Return the lookups supported by the field."""
+        lookups = DynamicRowsFilter.COMMON_LOOKUPS + (DynamicRowsFilter.NULL_LOOKUPS if field.null else [])
+        if isinstance(field, models.BooleanField):
+            return lookups
+        if isinstance(field, (models.CharField, models.TextField)):
+            return lookups + DynamicRowsFilter.RANGE_LOOKUPS + DynamicRowsFilter.STRING_LOOKUPS
+        return lookups + DynamicRowsFilter.RANGE_LOOKUPS
+
+    @staticmethod
+    def convert_value(field: models.Field, param: str, value: Any) -> Any:
+        """Convert the value to the Python type of the field."""
+        try:
+            value = field.to_python(value)
+        except DjangoValidationError as error:
+            raise ValidationError({param: error.messages})
+        if isinstance(field, models.DateTimeField) and value is not None and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def build_q(self, conditions: Mapping[str, Any], ignore: Any = ()) -> Q:
+        """
+        Build a Q object from the conditions, a mapping of `<field>` or
+        `<field>__<lookup>` to the compared values.
+        """
+        q = Q()
+        for param, value in conditions.items():
+            if param in ignore:
+                continue
+            name, _, lookup = param.partition('__')
+            lookup = lookup or 'exact'
+            field = self.model_fields.get(name)
+            if field is None:
+                raise ValidationError({param: f'Unknown field "{name}".'})
+            if lookup not in self.get_lookups(field):
+                raise ValidationError({param: f'Unsupported lookup "{lookup}" for field "{name}".'})
+
+            if lookup == 'in':
+                values = value.split(',') if isinstance(value, str) else value
+                if not isinstance(values, (list, tuple)):
+                    raise ValidationError({param: 'Expected a list of values.'})
+                value = [self.convert_value(field, param, item) for item in values]
+            elif lookup == 'icontains':
+                pattern = str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                q &= Q(DynamicContainsLookup(F(name), f'%{pattern}%'))
+                continue
+            elif lookup in DynamicRowsFilter.STRING_LOOKUPS:
+                value = str(value)
+            elif lookup == 'isnull':
+                value = self.convert_value(models.BooleanField(), param, value)
+            else:
+                value = self.convert_value(field, param, value)
+            q &= Q(**{f'{name}__{lookup}': value})
+        return q
+
+    def filter_queryset(self, queryset: QuerySet, query_params: Mapping[str, Any]) -> QuerySet:
+        """
+        Apply the filters given in the query parameters to the queryset,
+        and the full-text search given with the `search` query parameter.
+        """
+        queryset = queryset.filter(self.build_q(query_params, ignore=self.RESERVED_PARAMS))
+        if query_params.get('search'):
+            ordering = [item.lstrip('-') for item in self.get_ordering(query_params)]
+            queryset = DynamicSearchService.search(
+                queryset, query_params['search'], rank=DynamicSearchService.SEARCH_RANK in ordering
+            )
+        return queryset
+
+    def get_ordering(self, query_params: Mapping[str, Any]) -> List[str]:
+        """
+        Return the ordering given with the `ordering` query parameter, a comma
+        separated list of field names prefixed with `-` for the descending
+        order. The primary key is always used as the last ordering column.
+        Searched rows can be ordered by their `search_rank`, and are by
+        default ordered from the best match.
+        """
+        searching = bool(query_params.get('search'))
+        ordering = []
+        for item in filter(None, query_params.get('ordering', '').split(',')):
+            name = item.lstrip('-')
+            if name not in self.model_fields and not (searching and name == DynamicSearchService.SEARCH_RANK):
+                raise ValidationError({'ordering': f'Unknown field "{name}".'})
+            ordering.append(item)
+        if searching and not ordering:
+            ordering.append(f'-{DynamicSearchService.SEARCH_RANK}')
+        if not any(item.lstrip('-') == 'id' for item in ordering):
+            ordering.append('id')
+        return ordering
+
+    def get_order_by(self, ordering: List[str]) -> List[Any]:
+        """Return the ordering of the query, with NULLs of nullable fields last in both directions."""
+        order_by = []
+        for item in ordering:
+            field = self.model_fields.get(item.lstrip('-'))
+            if field is None or not field.null:
+                order_by.append(item)
+            elif item.startswith('-'):
+                order_by.append(F(item[1:]).desc(nulls_last=True))
+            else:
+                order_by.append(F(item).asc(nulls_last=True))
+        return order_by
+
+    def get_projection(self, query_params: Mapping[str, Any]) -> List[str]:
+        """
+        Return the field names given with the `fields` query parameter,
+        or all field names of the model.
+        """
+        fields = [name for name in query_params.get('fields', '').split(',') if name]
+        if not fields:
+            return list(self.model_fields)
+        unknown_fields = [name for name in fields if name not in self.model_fields]
+        if unknown_fields:
+            raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown_fields)}.'})
+        return fields
+
+    def get_queryset(self, query_params: Mapping[str, Any], named: bool = True) -> QuerySet:
+        """
+        Return the filtered and ordered rows. Named rows are dictionaries
+        holding the projected fields and the ordering fields, other rows
+        are tuples of the projected fields only.
+        """
+        ordering = self.get_ordering(query_params)
+        projection = self.get_projection(query_params)
+        queryset = self.filter_queryset(self.model_class.objects.using(self.using), query_params).order_by(*self.get_order_by(ordering))
+        if not named:
+            return queryset.values_list(*projection)
+        return queryset.values(*dict.fromkeys(projection + [item.lstrip('-') for item in ordering]))
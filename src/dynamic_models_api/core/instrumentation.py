@@ -0,0 +1,208 @@
+import bisect
+import contextlib
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+
+class DynamicRequestMetrics:
+    """
+    Durations of the phases of one request, the number of queries it ran
+    and the number of rows it returned. Phases run repeatedly are summed,
+    and the `sql` phase overlaps the phases that ran the queries.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.table = ''
+        self.queries = 0
+        self.rows = 0
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Database execute wrapper timing every query of the request."""
+        self.queries += 1
+        with self.phase('sql'):
+            return execute(sql, params, many, context)
+
+    def get_total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def get_server_timing(self, total: float) -> str:
+        """Return the value of the `Server-Timing` header, with durations in milliseconds."""
+        metrics = []
+        for name, duration in self.phases.items():
+            metric = f'{name};dur={duration * 1000:.3f}'
+            if name == 'sql':
+                metric += f';desc="{self.queries} queries"'
+            metrics.append(metric)
+        metrics.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(metrics)
+
+
+class DynamicMetricsRegistry:
+    """
+    Process-wide histograms and counters of the instrumented requests,
+    rendered in the Prometheus text exposition format.
+    """
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    HISTOGRAMS = {
+        'dynamic_models_request_duration_seconds': 'Duration of the requests of dynamic model endpoints.',
+        'dynamic_models_phase_duration_seconds': 'Duration of the phases of the requests of dynamic model endpoints.',
+    }
+    COUNTERS = {
+        'dynamic_models_queries_total': 'Database queries run by the requests of dynamic model endpoints.',
+        'dynamic_models_rows_returned_total': 'Rows returned by the requests of dynamic model endpoints.',
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Bucket counts, with the +Inf bucket, followed by the sum and the count of the observations
+        self.histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], List[float]]] = {
+            name: {} for name in self.HISTOGRAMS
+        }
+        self.counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {name: {} for name in self.COUNTERS}
+
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            values = self.histograms[name].setdefault(key, [0] * (len(self.BUCKETS) + 3))
+            values[bisect.bisect_left(self.BUCKETS, value)] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def inc(self, name: str, labels: Dict[str, str], amount: float = 1) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.counters[name][key] = self.counters[name].get(key, 0) + amount
+
+    def record(self, metrics: DynamicRequestMetrics, endpoint: str, total: float) -> None:
+        """Add the metrics of a finished request."""
+        labels = {'table': metrics.table, 'endpoint': endpoint}
+        self.observe('dynamic_models_request_duration_seconds', labels, total)
+        for phase, duration in metrics.phases.items():
+            self.observe('dynamic_models_phase_duration_seconds', {'table': metrics.table, 'phase': phase}, duration)
+        self.inc('dynamic_models_queries_total', labels, metrics.queries)
+        if metrics.rows:
+            self.inc('dynamic_models_rows_returned_total', labels, metrics.rows)
+
+    @staticmethod
+    def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+        escaped = (
+            (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in labels
+        )
+        return ','.join(f'{name}="{value}"' for name, value in escaped)
+
+    @staticmethod
+    def format_value(value: float) -> str:
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, description in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for key, values in sorted(self.histograms[name].items()):
+                    labels = self.format_labels(key)
+                    cumulative = 0
+                    for bound, count in zip(self.BUCKETS + ('+Inf',), values):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {self.format_value(values[-2])}')
+                    lines.append(f'{name}_count{{{labels}}} {values[-1]}')
+            for name, description in self.COUNTERS.items():
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+                for key, value in sorted(self.counters[name].items()):
+                    lines.append(f'{name}{{{self.format_labels(key)}}} {self.format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        with self.lock:
+            for values in self.histograms.values():
+                values.clear()
+            for values in self.counters.values():
+                values.clear()
+
+
+current_request_metrics: ContextVar[Optional[DynamicRequestMetrics]] = ContextVar(
+    'dynamic_models_request_metrics', default=None
+)
+metrics_registry = DynamicMetricsRegistry()
+
+
+class DynamicInstrumentation:
+    """
+    Hooks timing the phases of requests of the dynamic model endpoints,
+    enabled with `DYNAMIC_MODELS_INSTRUMENTATION`.
+
+    The metrics of the current request are kept in a context variable, so
+    the hooks in services need no reference to the request. Outside an
+    instrumented request a hook costs a single context variable lookup.
+    """
+    NULL_PHASE = contextlib.nullcontext()
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return getattr(settings, 'DYNAMIC_MODELS_INSTRUMENTATION', False)
+
+    @staticmethod
+    def phase(name: str):
+        """Return a context manager timing a phase of the current request."""
+        metrics = current_request_metrics.get()
+        if metrics is None:
+            return DynamicInstrumentation.NULL_PHASE
+        return metrics.phase(name)
+
+    @staticmethod
+    def set_table(table: str) -> None:
+        """Set the table the current request reads or writes."""
+        metrics = current_request_metrics.get()
+        if metrics is not None:
+            metrics.table = table
+
+    @staticmethod
+    def add_rows(count: int) -> None:
+        """Count rows returned by the current request."""
+        metrics = current_request_metrics.get()
+        if metrics is not None:
+            metrics.rows += count
+
+    @staticmethod
+    @contextlib.contextmanager
+    def instrument_request() -> Iterator[DynamicRequestMetrics]:
+        """Collect the metrics of the request handled in the block."""
+        metrics = DynamicRequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            # Dynamic tables may be placed in other databases than the default one
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all(initialized_only=False):
+                    stack.enter_context(connection.execute_wrapper(metrics.execute_wrapper))
+                yield metrics
+        finally:
+            current_request_metrics.reset(token)
+
+    @staticmethod
+    def finish_request(metrics: DynamicRequestMetrics, response: HttpResponse, endpoint: str) -> None:
+        """Add the `Server-Timing` header to the response and record the metrics of the request."""
+        total = metrics.get_total()
+        response.headers['Server-Timing'] = metrics.get_server_timing(total)
+        metrics_registry.record(metrics, endpoint, total)
@@ -0,0 +1,98 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.benchmarks import DynamicModelBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the dynamic model lifecycle (table creation and updates, serializer classes, '
+        'preparation on start, row inserts and listings) in a separate test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fields', type=int, default=10, help='Number of fields per dynamic model.')
+        parser.add_argument('--models', type=int, default=5, help='Number of dynamic models.')
+        parser.add_argument('--rows', type=int, default=1000, help='Number of rows loaded into every table.')
+        parser.add_argument('--inserts', type=int, default=100, help='Number of single rows inserted into every table.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of repetitions of the repeatable operations.')
+        parser.add_argument('--output', metavar='FILE', help='Write the results as JSON to the file.')
+        parser.add_argument('--input', metavar='FILE', help='Read the results from the file instead of running.')
+        parser.add_argument('--compare', metavar='BASELINE', help='Compare the results with the results in the file.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Relative growth of a median duration reported as a regression (default 0.1).'
+        )
+
+    def handle(self, *args, **options):
+        if options['input']:
+            results = self.load(options['input'])
+        else:
+            results = self.run(options)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+        if not options['compare']:
+            self.write_results(results)
+            return
+
+        baseline = self.load(options['compare'])
+        if baseline['meta']['scale'] != results['meta']['scale']:
+            self.stderr.write(self.style.WARNING('The results were measured at different scales.'))
+        comparison = DynamicModelBenchmark.compare(baseline, results, options['threshold'])
+        self.write_comparison(comparison)
+        regressions = [item['operation'] for item in comparison if item['regressed']]
+        if regressions:
+            raise CommandError(
+                f'{len(regressions)} operations regressed by more than {options["threshold"]:.0%}: {", ".join(regressions)}'
+            )
+
+    def load(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Could not read the results from {path}: {error}')
+
+    def run(self, options):
+        benchmark = DynamicModelBenchmark(
+            fields=options['fields'],
+            models=options['models'],
+            rows=options['rows'],
+            inserts=options['inserts'],
+            repeat=options['repeat'],
+        )
+        # The benchmark creates and drops tables, it never touches the configured database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # A single process needs no schema sync, whose connection would keep the database open.
+            # Requests are built for the host of test requests, and tables are only created in the test database.
+            with override_settings(
+                DYNAMIC_MODELS_SCHEMA_SYNC='off',
+                ALLOWED_HOSTS=['testserver'],
+                DYNAMIC_MODELS_DATABASES=[DEFAULT_DB_ALIAS],
+                DYNAMIC_MODELS_READ_REPLICAS={},
+            ):
+                return benchmark.run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def write_results(self, results):
+        self.stdout.write(f'{"operation":<24}{"count":>8}{"median ms":>12}{"p95 ms":>12}{"max ms":>12}')
+        for operation, result in results['results'].items():
+            self.stdout.write(
+                f'{operation:<24}{result["count"]:>8}{result["median_ms"]:>12.3f}'
+                f'{result["p95_ms"]:>12.3f}{result["max_ms"]:>12.3f}'
+            )
+
+    def write_comparison(self, comparison):
+        self.stdout.write(f'{"operation":<24}{"baseline ms":>12}{"current ms":>12}{"change":>10}')
+        for item in comparison:
+            line = f'{item["operation"]:<24}{item["baseline_ms"]:>12.3f}{item["current_ms"]:>12.3f}{item["change"]:>+10.1%}'
+            self.stdout.write(self.style.ERROR(line) if item['regressed'] else line)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import DynamicModel
+from core.partitions import DynamicPartitionService
+from core.services import DynamicModelService
+
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming partitions, move rows out of default partitions and drop expired '
+        'partitions of range partitioned dynamic tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', type=float, metavar='SECONDS',
+            help='Keep running, maintaining the partitions at the given interval.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for model_instance in DynamicModel.objects.filter(partitioning__type='range'):
+                model_class = DynamicModelService.get_model_class(model_instance)
+                result = DynamicPartitionService.maintain(model_instance, model_class)
+                for name in result['created']:
+                    self.stdout.write(f'{model_instance}: created partition {name}')
+                for name in result['dropped']:
+                    self.stdout.write(f'{model_instance}: dropped partition {name}')
+            if options['watch'] is None:
+                break
+            time.sleep(options['watch'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core.conditional import DynamicDataVersionService
+from core.models import DynamicModel
+from core.rollups import DynamicRollupService
+from core.routing import DynamicDatabaseService
+from core.services import DynamicModelService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the rollup tables of dynamic models from the rows of their tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='MODEL', help='Names of the dynamic models, by default all.')
+        parser.add_argument('--rollup', action='append', metavar='NAME', help='Only rebuild the named rollups.')
+
+    def handle(self, *args, **options):
+        model_instances = DynamicModel.objects.exclude(rollups=[]).order_by('name')
+        if options['names']:
+            model_instances = model_instances.filter(name__in=options['names'])
+            unknown = set(options['names']) - {model_instance.name for model_instance in model_instances}
+            if unknown:
+                raise CommandError(f'No dynamic models with rollups named: {", ".join(sorted(unknown))}.')
+
+        for model_instance in model_instances:
+            model_class = DynamicModelService.get_model_class(model_instance)
+            using = DynamicDatabaseService.get_database(model_instance)
+            for name, rollup_class in DynamicRollupService.get_rollup_classes(model_class).items():
+                if options['rollup'] and name not in options['rollup']:
+                    continue
+                DynamicRollupService.rebuild(model_class, rollup_class, using)
+                self.stdout.write(f'{model_instance}: rebuilt rollup {name}')
+            DynamicDataVersionService.bump(model_instance.pk)
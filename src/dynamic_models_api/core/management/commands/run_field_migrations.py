@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.field_migrations import DynamicFieldMigrationService
+from core.models import DynamicFieldMigration
+
+
+class Command(BaseCommand):
+    help = 'Run the pending and interrupted online field type migrations of dynamic models.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', type=float, metavar='SECONDS',
+            help='Keep running, checking for new migrations at the given interval.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for migration in DynamicFieldMigration.objects.filter(status__in=DynamicFieldMigration.ACTIVE_STATUSES):
+                self.stdout.write(f'Running migration of {migration}')
+                DynamicFieldMigrationService.run(migration)
+                migration.refresh_from_db()
+                self.stdout.write(
+                    f'{migration.status}: {migration.processed_rows}/{migration.total_rows} rows, '
+                    f'{migration.error_count} errors'
+                )
+            if options['watch'] is None:
+                break
+            time.sleep(options['watch'])
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_rename_title_dynamicmodel_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='schema_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_dynamicmodel_schema_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='indexes',
+            field=models.JSONField(default=list),
+        ),
+    ]
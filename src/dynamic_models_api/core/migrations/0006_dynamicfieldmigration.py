@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_dynamicmodel_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DynamicFieldMigration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field_name', models.CharField(max_length=255)),
+                ('from_type', models.CharField(max_length=50)),
+                ('to_type', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('total_rows', models.PositiveBigIntegerField(default=0)),
+                ('processed_rows', models.PositiveBigIntegerField(default=0)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dynamic_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='field_migrations', to='core.dynamicmodel')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_dynamicmodel_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='partitioning',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_dynamicmodel_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='database',
+            field=models.CharField(default='default', max_length=100),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_dynamicmodel_database'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='change_tracking',
+            field=models.BooleanField(default=False),
+        ),
+    ]
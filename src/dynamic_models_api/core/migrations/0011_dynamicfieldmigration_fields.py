@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_dynamicmodel_change_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicfieldmigration',
+            name='from_field',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='dynamicfieldmigration',
+            name='to_field',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_dynamicfieldmigration_fields'),
+    ]
+
+    operations = [
+        # Rows of existing tables are counted on the first request of their cached count
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='row_count',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dynamicmodel',
+            name='row_count',
+            field=models.BigIntegerField(blank=True, default=0, null=True),
+        ),
+    ]
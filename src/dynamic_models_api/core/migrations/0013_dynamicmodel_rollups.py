@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_dynamicmodel_row_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='rollups',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_dynamicmodel_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicmodel',
+            name='index_errors',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
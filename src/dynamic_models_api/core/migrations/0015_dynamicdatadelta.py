@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_dynamicmodel_index_errors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DynamicDataDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rows', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('dynamic_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='data_deltas', to='core.dynamicmodel')),
+            ],
+        ),
+    ]
@@ -1,9 +1,61 @@
 from django.db import models
+from django.utils import timezone
 
 
 class DynamicModel(models.Model):
     name = models.CharField(max_length=255, unique=True, blank=False, null=False)
     fields = models.JSONField(default=list)
+    indexes = models.JSONField(default=list)
+    # Errors of the declared indexes whose build failed, by index name
+    index_errors = models.JSONField(default=dict, blank=True)
+    partitioning = models.JSONField(null=True, blank=True, default=None)
+    database = models.CharField(max_length=100, default='default')
+    change_tracking = models.BooleanField(default=False)
+    rollups = models.JSONField(default=list)
+    schema_version = models.PositiveIntegerField(default=1)
+    data_version = models.PositiveBigIntegerField(default=1)
+    data_modified_at = models.DateTimeField(default=timezone.now)
+    # Kept up to date by the row writes, null when it has to be counted again
+    row_count = models.BigIntegerField(null=True, blank=True, default=0)
 
     def __str__(self):
         return self.name
+
+
+class DynamicDataDelta(models.Model):
+    """A write to the rows of a dynamic model not yet folded into its data version and row count."""
+    dynamic_model = models.ForeignKey(DynamicModel, on_delete=models.CASCADE, related_name='data_deltas')
+    rows = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+class DynamicFieldMigration(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    dynamic_model = models.ForeignKey(DynamicModel, on_delete=models.CASCADE, related_name='field_migrations')
+    field_name = models.CharField(max_length=255)
+    from_type = models.CharField(max_length=50)
+    to_type = models.CharField(max_length=50)
+    from_field = models.JSONField(default=dict)
+    to_field = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.PositiveBigIntegerField(default=0)
+    processed_rows = models.PositiveBigIntegerField(default=0)
+    last_id = models.BigIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.dynamic_model.name}.{self.field_name}: {self.from_type} -> {self.to_type}'
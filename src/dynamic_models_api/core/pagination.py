@@ -0,0 +1,230 @@
+import json
+from typing import Any
+from typing import List
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models import Expression
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.pagination import CursorPagination
+from rest_framework.pagination import _reverse_ordering
+
+
+class DynamicRowComparison(Expression):
+    """
+    Comparison of a row of columns with a row of values, like
+    `(price, id) > (10, 42)`, which an index on the columns serves with a
+    single range scan.
+    """
+
+    def __init__(self, columns: List[Any], values: List[Any], operator: str):
+        super().__init__(output_field=models.BooleanField())
+        self.columns = list(columns)
+        self.values = list(values)
+        self.operator = operator
+
+    def get_source_expressions(self):
+        return self.columns + self.values
+
+    def set_source_expressions(self, exprs):
+        self.columns, self.values = exprs[:len(self.columns)], exprs[len(self.columns):]
+
+    def as_sql(self, compiler, connection):
+        sql_params = [compiler.compile(expression) for expression in self.get_source_expressions()]
+        columns_sql = ', '.join(sql for sql, _ in sql_params[:len(self.columns)])
+        values_sql = ', '.join(sql for sql, _ in sql_params[len(self.columns):])
+        params = [param for _, expression_params in sql_params for param in expression_params]
+        return f'({columns_sql}) {self.operator} ({values_sql})', params
+
+
+class DynamicRowsPagination(CursorPagination):
+    """
+    Keyset pagination of dynamic model rows on their ordering.
+
+    Rows are only paginated when the request contains the cursor or the
+    page size query parameter, otherwise the whole table is returned.
+
+    The ordering always ends with the primary key, so the values of all
+    ordering fields of a row identify its position. A cursor holds the
+    values of the last row of a page, or of the first one for the
+    previous page, and the following page is queried with the rows after
+    that position, without any offset. NULLs of nullable fields are
+    ordered after the other values in both directions.
+
+    The pagination of `CursorPagination` is split around the query of the
+    page, so the page can also be fetched with the async ORM.
+    """
+    ordering = 'id'
+    page_size = getattr(settings, 'DYNAMIC_MODELS_ROWS_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'DYNAMIC_MODELS_ROWS_MAX_PAGE_SIZE', 1000)
+
+    def get_page_size(self, request):
+        query_params = request.query_params
+        if self.cursor_query_param not in query_params and self.page_size_query_param not in query_params:
+            return None
+        return super().get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page([row async for row in page_queryset])
+
+    def get_ordering_fields(self, queryset: QuerySet) -> List[models.Field]:
+        """Return the fields of the ordering, model fields or annotations of the queryset."""
+        ordering_fields = []
+        for item in self.ordering:
+            name = item.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            ordering_fields.append(
+                annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+            )
+        return ordering_fields
+
+    def get_page_queryset(self, queryset: QuerySet, request, view=None) -> Optional[QuerySet]:
+        """
+        Return the query of the rows of the requested page, with one more
+        row telling whether a page follows, or None when the rows are not
+        paginated.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.ordering_fields = self.get_ordering_fields(queryset)
+
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor is not None and self.cursor.reverse
+        self.current_position = None if self.cursor is None else self.cursor.position
+
+        # Rows before the position are queried in the reversed ordering
+        queryset = queryset.order_by(*self.get_order_by(self.reverse))
+        if self.current_position is not None:
+            values = self.parse_position(self.current_position)
+            queryset = queryset.filter(self.get_keyset_condition(values, self.reverse))
+
+        return queryset[:self.page_size + 1]
+
+    def get_order_by(self, reverse: bool) -> List[Any]:
+        """
+        Return the ordering of the query. NULLs of nullable fields come
+        after the other values in both directions, so before them in the
+        reversed ordering.
+        """
+        if not reverse:
+            order_by = list(self.ordering)
+        else:
+            order_by = list(_reverse_ordering(self.ordering))
+        for index, field in enumerate(self.ordering_fields):
+            if field.null:
+                expression = F(order_by[index].lstrip('-'))
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+                order_by[index] = expression.desc(**nulls) if order_by[index].startswith('-') else expression.asc(**nulls)
+        return order_by
+
+    def get_keyset_condition(self, values: List[Any], reverse: bool) -> Q:
+        """Return the condition matching the rows after the position, in the ordering of the query."""
+        names = [item.lstrip('-') for item in self.ordering]
+        descending = [item.startswith('-') != reverse for item in self.ordering]
+        nullable = any(field.null for field in self.ordering_fields)
+        if len(set(descending)) == 1 and not nullable:
+            values = [Value(value, output_field=field) for value, field in zip(values, self.ordering_fields)]
+            return Q(DynamicRowComparison([F(name) for name in names], values, '<' if descending[0] else '>'))
+
+        # Columns ordered in both directions or holding NULLs are compared
+        # one by one: (a > x) OR (a = x AND b < y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = Q()
+        for name, value, is_descending in zip(names, values, descending):
+            after = self.get_after_condition(name, value, is_descending, reverse)
+            if after is not None:
+                condition |= equal & after
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def get_after_condition(name: str, value: Any, descending: bool, reverse: bool) -> Optional[Q]:
+        """
+        Return the condition matching the values of a column after the
+        value, or None when none follows it. NULLs follow the other values,
+        or precede them in the reversed ordering.
+        """
+        if value is None:
+            return Q(**{f'{name}__isnull': False}) if reverse else None
+        after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+        if not reverse:
+            after |= Q(**{f'{name}__isnull': True})
+        return after
+
+    def get_position(self, row: Any) -> str:
+        """Return the position of a row, the JSON encoded values of its ordering fields."""
+        values = []
+        for item in self.ordering:
+            name = item.lstrip('-')
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            if not isinstance(value, (type(None), bool, int, float, str, list, dict)):
+                value = str(value)
+            values.append(value)
+        return json.dumps(values)
+
+    def parse_position(self, position: str) -> List[Any]:
+        """Return the values of the ordering fields of a position, converted by their fields."""
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering_fields):
+                raise ValueError(position)
+            return [field.to_python(value) for value, field in zip(values, self.ordering_fields)]
+        except (ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def set_page(self, results: List[Any]) -> List[Any]:
+        """Set the page and whether pages precede and follow it from the fetched rows."""
+        self.page = list(results[:self.page_size])
+        has_more = len(results) > len(self.page)
+
+        if self.reverse:
+            # The rows were queried in the reversed ordering
+            self.page = list(reversed(self.page))
+            self.has_next = self.current_position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.current_position is not None
+
+        # Display page controls in the browsable API if there is more
+        # than one page.
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # Without rows before the position the next page is the first one
+        position = self.get_position(self.page[-1]) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        # Without rows after the position the previous page is the last one
+        position = self.get_position(self.page[0]) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
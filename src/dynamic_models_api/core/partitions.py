@@ -0,0 +1,346 @@
+import datetime
+import re
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.db import models
+from django.db import router
+from django.db import transaction
+from django.utils import timezone
+
+from core.conditional import DynamicDataVersionService
+from core.models import DynamicModel
+from core.rollups import DynamicRollupService
+
+
+class DynamicPartitionService:
+    """
+    Creates and maintains PostgreSQL declarative partitions of dynamic
+    tables, as declared by the `partitioning` of the dynamic model:
+
+    * `{"type": "hash", "field": ..., "partitions": n}` spreads the rows
+      over n partitions created with the table.
+    * `{"type": "range", "field": "created_at", "interval": ...}` partitions
+      by the built-in creation timestamp. Partitions are created ahead of
+      time, and partitions older than `retention` intervals are dropped.
+    * `{"type": "range", "field": ..., "size": s}` partitions a number
+      field in ranges of the given size, created for the stored values.
+
+    Range partitioned tables have a default partition, so rows without a
+    matching partition are never rejected. Maintenance moves them into
+    their own partitions.
+    """
+    TYPES = ['range', 'hash']
+    INTERVALS = ['day', 'week', 'month', 'year']
+    CREATED_AT = 'created_at'
+    DEFAULT_SUFFIX = 'default'
+    # Namespace of the advisory locks serializing maintenance per dynamic model
+    LOCK_NAMESPACE = 7412
+
+    @staticmethod
+    def get_partitioning(model_instance: DynamicModel) -> Optional[Dict[str, Any]]:
+        return getattr(model_instance, 'partitioning', None) or None
+
+    @staticmethod
+    def uses_created_at(model_instance: DynamicModel) -> bool:
+        """Return whether the table has the built-in creation timestamp it is partitioned by."""
+        partitioning = DynamicPartitionService.get_partitioning(model_instance)
+        return partitioning is not None and partitioning['field'] == DynamicPartitionService.CREATED_AT
+
+    @staticmethod
+    def prepare_created_at_field() -> models.Field:
+        return models.DateTimeField(default=timezone.now, editable=False)
+
+    @staticmethod
+    def validate(partitioning: Mapping[str, Any], model_fields: Mapping[str, models.Field], indexes: List[Dict[str, Any]]) -> None:
+        """Raise a ValueError describing why the partitioning is invalid for the fields and indexes."""
+        name = partitioning['field']
+        field = model_fields.get(name)
+        if field is None:
+            raise ValueError(f'Unknown field "{name}".')
+        options = {key for key in ['interval', 'size', 'partitions', 'retention'] if partitioning.get(key) is not None}
+
+        if partitioning['type'] == 'hash':
+            expected = {'partitions'}
+        elif name == DynamicPartitionService.CREATED_AT:
+            expected = {'interval', 'retention'}
+            if 'interval' not in options:
+                raise ValueError(f'Range partitioning by "{name}" requires an interval.')
+        elif isinstance(field, models.FloatField):
+            expected = {'size'}
+            if 'size' not in options:
+                raise ValueError(f'Range partitioning by "{name}" requires a size.')
+        else:
+            raise ValueError(f'Range partitioning is only supported by "{DynamicPartitionService.CREATED_AT}" and number fields.')
+        if partitioning['type'] == 'hash' and 'partitions' not in options:
+            raise ValueError('Hash partitioning requires a number of partitions.')
+        if options - expected:
+            raise ValueError(f'Unsupported options: {", ".join(sorted(options - expected))}.')
+
+        for index in indexes:
+            if index.get('unique') and name not in index['fields']:
+                raise ValueError(f'Unique indexes of a table partitioned by "{name}" must include it.')
+
+    @staticmethod
+    def get_parent_sql(schema_editor, model_class, partitioning: Mapping[str, Any]) -> str:
+        """
+        Return the CREATE TABLE statement of the partitioned table. Its
+        primary key includes the partition key, as PostgreSQL requires.
+        """
+        sql, _ = schema_editor.table_sql(model_class)
+        quote_name = schema_editor.quote_name
+        pk_column = model_class._meta.pk.column
+        key_column = model_class._meta.get_field(partitioning['field']).column
+        key_columns = dict.fromkeys([pk_column, key_column])
+        # The primary key is the first column
+        sql = sql.replace(' PRIMARY KEY', '', 1)
+        return '{table_sql}, PRIMARY KEY ({key_columns})) PARTITION BY {method} ({key})'.format(
+            table_sql=sql[:-1],
+            key_columns=', '.join(quote_name(column) for column in key_columns),
+            method=partitioning['type'].upper(),
+            key=quote_name(key_column),
+        )
+
+    @staticmethod
+    def create_table(schema_editor, model_class, partitioning: Mapping[str, Any]) -> None:
+        """Create the partitioned table with its indexes and initial partitions."""
+        # Unique constraints are part of the table definition
+        schema_editor.execute(DynamicPartitionService.get_parent_sql(schema_editor, model_class, partitioning), params=None)
+        for index in model_class._meta.indexes:
+            schema_editor.add_index(model_class, index)
+
+        table = model_class._meta.db_table
+        quote_name = schema_editor.quote_name
+        if partitioning['type'] == 'hash':
+            for remainder in range(partitioning['partitions']):
+                schema_editor.execute(
+                    'CREATE TABLE {partition} PARTITION OF {table} FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})'.format(
+                        partition=quote_name(f'{table}_p{remainder}'),
+                        table=quote_name(table),
+                        modulus=partitioning['partitions'],
+                        remainder=remainder,
+                    ),
+                    params=None,
+                )
+            return
+
+        schema_editor.execute('CREATE TABLE {partition} PARTITION OF {table} DEFAULT'.format(
+            partition=quote_name(f'{table}_{DynamicPartitionService.DEFAULT_SUFFIX}'),
+            table=quote_name(table),
+        ), params=None)
+        if partitioning['field'] == DynamicPartitionService.CREATED_AT:
+            for start, end in DynamicPartitionService.get_upcoming_ranges(partitioning, timezone.now()):
+                DynamicPartitionService.create_range_partition(
+                    model_class, partitioning, DynamicPartitionService.get_time_partition_name(table, start), start, end
+                )
+
+    @staticmethod
+    def truncate(interval: str, moment: datetime.datetime) -> datetime.datetime:
+        """Return the start of the interval containing the moment, in UTC."""
+        moment = moment.astimezone(datetime.timezone.utc)
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        if interval == 'week':
+            return start - datetime.timedelta(days=start.weekday())
+        if interval == 'month':
+            return start.replace(day=1)
+        if interval == 'year':
+            return start.replace(month=1, day=1)
+        return start
+
+    @staticmethod
+    def add_intervals(interval: str, start: datetime.datetime, count: int) -> datetime.datetime:
+        if interval == 'day':
+            return start + datetime.timedelta(days=count)
+        if interval == 'week':
+            return start + datetime.timedelta(weeks=count)
+        months = start.year * 12 + start.month - 1 + (count * 12 if interval == 'year' else count)
+        return start.replace(year=months // 12, month=months % 12 + 1)
+
+    @staticmethod
+    def get_upcoming_ranges(partitioning: Mapping[str, Any], now: datetime.datetime) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """Return the ranges of the current interval and the intervals created ahead of time."""
+        interval = partitioning['interval']
+        start = DynamicPartitionService.truncate(interval, now)
+        premake = getattr(settings, 'DYNAMIC_MODELS_PARTITION_PREMAKE', 4)
+        return [
+            (
+                DynamicPartitionService.add_intervals(interval, start, offset),
+                DynamicPartitionService.add_intervals(interval, start, offset + 1),
+            )
+            for offset in range(premake + 1)
+        ]
+
+    @staticmethod
+    def get_time_partition_name(table: str, start: datetime.datetime) -> str:
+        return f'{table}_p{start:%Y%m%d}'
+
+    @staticmethod
+    def get_number_partition_name(table: str, bucket: int) -> str:
+        return f'{table}_b{bucket}' if bucket >= 0 else f'{table}_bm{-bucket}'
+
+    @staticmethod
+    def list_partitions(model_class) -> List[Dict[str, Any]]:
+        """Return the partitions of the table with their bounds and estimated number of rows."""
+        connection = connections[router.db_for_write(model_class)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), greatest(child.reltuples, 0)::bigint '
+                'FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname',
+                [connection.ops.quote_name(model_class._meta.db_table)],
+            )
+            return [{'name': name, 'bounds': bounds, 'rows': rows} for name, bounds, rows in cursor.fetchall()]
+
+    @staticmethod
+    def create_range_partition(model_class, partitioning: Mapping[str, Any], name: str, start: Any, end: Any) -> bool:
+        """
+        Create the partition of the range unless it exists. Rows of the range
+        stored in the default partition are moved into it, as PostgreSQL
+        refuses to create a partition for rows of the default partition.
+        Return whether the partition was created.
+        """
+        using = router.db_for_write(model_class)
+        connection = connections[using]
+        table = model_class._meta.db_table
+        quote_name = connection.ops.quote_name
+        key = quote_name(model_class._meta.get_field(partitioning['field']).column)
+        default = quote_name(f'{table}_{DynamicPartitionService.DEFAULT_SUFFIX}')
+        create_sql = f'CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(table)} FOR VALUES FROM (%s) TO (%s)'
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [quote_name(name)])
+            if cursor.fetchone()[0]:
+                return False
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default} WHERE {key} >= %s AND {key} < %s)', [start, end])
+            if not cursor.fetchone()[0]:
+                cursor.execute(create_sql, [start, end])
+                return True
+
+            columns = ', '.join(quote_name(field.column) for field in model_class._meta.concrete_fields)
+            cursor.execute(f'ALTER TABLE {quote_name(table)} DETACH PARTITION {default}')
+            cursor.execute(create_sql, [start, end])
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {default} WHERE {key} >= %s AND {key} < %s RETURNING {columns}) '
+                f'INSERT INTO {quote_name(table)} ({columns}) SELECT {columns} FROM moved',
+                [start, end],
+            )
+            cursor.execute(f'ALTER TABLE {quote_name(table)} ATTACH PARTITION {default} DEFAULT')
+        return True
+
+    @staticmethod
+    def get_default_buckets(model_class, partitioning: Mapping[str, Any]) -> List[Any]:
+        """Return the starts of the ranges of the rows stored in the default partition."""
+        connection = connections[router.db_for_write(model_class)]
+        quote_name = connection.ops.quote_name
+        key = quote_name(model_class._meta.get_field(partitioning['field']).column)
+        default = quote_name(f'{model_class._meta.db_table}_{DynamicPartitionService.DEFAULT_SUFFIX}')
+        with connection.cursor() as cursor:
+            if partitioning['field'] == DynamicPartitionService.CREATED_AT:
+                cursor.execute(f"SELECT DISTINCT date_trunc(%s, {key}, 'UTC') FROM {default}", [partitioning['interval']])
+            else:
+                cursor.execute(f'SELECT DISTINCT floor({key} / %s)::bigint FROM {default}', [partitioning['size']])
+            return sorted(bucket for bucket, in cursor.fetchall())
+
+    @staticmethod
+    def drop_expired_partitions(
+        model_instance: DynamicModel, model_class, partitioning: Mapping[str, Any], now: datetime.datetime
+    ) -> Dict[str, int]:
+        """
+        Detach and drop the partitions whose whole range is older than the
+        retention, which removes their rows without deleting them one by one.
+        Return the number of rows of every dropped partition.
+
+        Every partition is detached in a transaction of its own. Writes to
+        the partition are blocked first, and its rows are counted and
+        subtracted from the rollups and the row count of the table, while
+        the table itself stays available. The detach, which locks the whole
+        table, is the last statement before the commit. The detached
+        partition is then dropped in another transaction.
+        """
+        interval = partitioning['interval']
+        cutoff = DynamicPartitionService.add_intervals(
+            interval, DynamicPartitionService.truncate(interval, now), 1 - partitioning['retention']
+        )
+        table = model_class._meta.db_table
+        pattern = re.compile(rf'^{re.escape(table)}_p(\d{{8}})$')
+        using = router.db_for_write(model_class)
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        dropped = {}
+        for partition in DynamicPartitionService.list_partitions(model_class):
+            match = pattern.match(partition['name'])
+            if match is None:
+                continue
+            start = datetime.datetime.strptime(match.group(1), '%Y%m%d').replace(tzinfo=datetime.timezone.utc)
+            end = DynamicPartitionService.add_intervals(interval, start, 1)
+            if end > cutoff:
+                continue
+            name = quote_name(partition['name'])
+            with DynamicDataVersionService.atomic(using), connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {name} IN SHARE MODE')
+                cursor.execute(f'SELECT count(*) FROM {name}')
+                dropped[partition['name']] = cursor.fetchone()[0]
+                rows = model_class.objects.using(using).filter(**{
+                    f'{partitioning["field"]}__gte': start, f'{partitioning["field"]}__lt': end,
+                })
+                for rollup_class in DynamicRollupService.get_rollup_classes(model_class).values():
+                    DynamicRollupService.apply_deltas(
+                        rollup_class, DynamicRollupService.get_queryset_deltas(rollup_class, rows), -1, using
+                    )
+                DynamicDataVersionService.bump(model_instance.pk, rows=-dropped[partition['name']])
+                # Only the detach locks the table, until the commit right after it
+                cursor.execute(f'ALTER TABLE {quote_name(table)} DETACH PARTITION {name}')
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {name}')
+        return dropped
+
+    @staticmethod
+    def maintain(model_instance: DynamicModel, model_class, now: Optional[datetime.datetime] = None) -> Dict[str, List[str]]:
+        """
+        Create the partitions ahead of time and for the rows of the default
+        partition, and drop the expired partitions of a range partitioned
+        table. Every partition is created or dropped in a short transaction
+        of its own, so the table is never locked for the whole maintenance.
+        Concurrent maintenance of the same table is skipped.
+        """
+        result: Dict[str, List[str]] = {'created': [], 'dropped': []}
+        partitioning = DynamicPartitionService.get_partitioning(model_instance)
+        if partitioning is None or partitioning['type'] != 'range':
+            return result
+        now = now or timezone.now()
+        table = model_class._meta.db_table
+        connection = connections[router.db_for_write(model_class)]
+
+        # The lock is held by the session, across the transactions of the maintenance
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [DynamicPartitionService.LOCK_NAMESPACE, model_instance.pk])
+            if not cursor.fetchone()[0]:
+                return result
+        try:
+            if partitioning['field'] == DynamicPartitionService.CREATED_AT:
+                ranges = DynamicPartitionService.get_upcoming_ranges(partitioning, now)
+                for start in DynamicPartitionService.get_default_buckets(model_class, partitioning):
+                    ranges.append((start, DynamicPartitionService.add_intervals(partitioning['interval'], start, 1)))
+                for start, end in ranges:
+                    name = DynamicPartitionService.get_time_partition_name(table, start)
+                    if DynamicPartitionService.create_range_partition(model_class, partitioning, name, start, end):
+                        result['created'].append(name)
+                if partitioning.get('retention'):
+                    dropped = DynamicPartitionService.drop_expired_partitions(model_instance, model_class, partitioning, now)
+                    result['dropped'] = list(dropped)
+            else:
+                size = partitioning['size']
+                for bucket in DynamicPartitionService.get_default_buckets(model_class, partitioning):
+                    name = DynamicPartitionService.get_number_partition_name(table, bucket)
+                    bounds = (bucket * size, (bucket + 1) * size)
+                    if DynamicPartitionService.create_range_partition(model_class, partitioning, name, *bounds):
+                        result['created'].append(name)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [DynamicPartitionService.LOCK_NAMESPACE, model_instance.pk])
+        return result
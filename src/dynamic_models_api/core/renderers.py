@@ -0,0 +1,19 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class CSVRenderer(JSONRenderer):
+    """
+    Lets the export endpoint be requested with `format=csv`. Exports are
+    streamed, so the renderer only renders errors, as JSON.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Lets the export endpoint be requested with `format=ndjson`. Exports are
+    streamed, so the renderer only renders errors, as JSON.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
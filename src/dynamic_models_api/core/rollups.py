@@ -0,0 +1,430 @@
+import hashlib
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.db import models
+from django.db import router
+from django.db import transaction
+from django.db.backends.utils import truncate_name
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Cast
+from django.db.models.functions import Coalesce
+from django.db.models.functions import NullIf
+from rest_framework.exceptions import ValidationError
+
+from core.filters import DynamicRowsFilter
+from core.models import DynamicModel
+from core.routing import DynamicDatabaseService
+from core.runtime_generated import DynamicModelRegistry
+
+
+rollup_registry = DynamicModelRegistry(max_size=getattr(settings, 'DYNAMIC_MODELS_REGISTRY_SIZE', 1024))
+
+# Sums of the rows of a group by the key of the group, and the columns of the rollup table
+DynamicRollupDeltas = Dict[Tuple[Any, ...], Dict[str, Any]]
+
+
+class DynamicRollupService:
+    """
+    Maintains rollups of dynamic models: summary tables holding aggregates
+    of the rows of the table grouped by some of its fields.
+
+    A rollup is declared with a `name`, the `group_by` fields and the
+    `aggregates`, written like the aggregates of the aggregation endpoint.
+    Only aggregates that can be updated by adding and subtracting rows
+    are supported: `count`, and `sum`, `avg` and `count` of number fields,
+    `true` and `false` of boolean fields.
+
+    Every write of rows updates the rollup tables in its transaction with
+    the sums of the written rows per group: inserted rows are added,
+    deleted rows subtracted, and updated rows subtracted before the update
+    and added after it. Groups left without rows are removed.
+    """
+    COUNT = 'rollup_count'
+    RESERVED_PARAMS = {'ordering', 'format'}
+    NUMBER_FUNCTIONS = ['sum', 'avg', 'count']
+    BOOLEAN_FUNCTIONS = ['true', 'false']
+    NUMBER_FIELDS = (models.FloatField, models.IntegerField, models.DecimalField)
+    UPSERT_BATCH_SIZE = 500
+
+    @staticmethod
+    def parse_aggregate(item: str) -> Tuple[str, Optional[str]]:
+        """Return the function and the field name of an aggregate, without field for `count`."""
+        function, _, name = item.partition(':')
+        return function, name or None
+
+    @staticmethod
+    def get_field_names(rollup: Mapping[str, Any]) -> List[str]:
+        """Return the names of the fields the rollup reads."""
+        names = list(rollup['group_by'])
+        for item in rollup['aggregates']:
+            name = DynamicRollupService.parse_aggregate(item)[1]
+            if name is not None and name not in names:
+                names.append(name)
+        return names
+
+    @staticmethod
+    def get_rollups(model_instance: DynamicModel) -> List[Dict[str, Any]]:
+        """
+        Return the rollups of the model instance with the definitions of
+        the fields they read. A rollup is rebuilt when any of them changes.
+        """
+        fields = {field['name']: field for field in model_instance.fields}
+        return [{
+            **rollup,
+            'fields': {name: fields.get(name) for name in DynamicRollupService.get_field_names(rollup)},
+        } for rollup in getattr(model_instance, 'rollups', None) or []]
+
+    @staticmethod
+    def validate(rollup: Mapping[str, Any], model_instance: DynamicModel, model_fields: Dict[str, models.Field]) -> None:
+        """Check that the rollup can be maintained, raising a ValueError otherwise."""
+        names = [field['name'] for field in model_instance.fields]
+        if len(set(rollup['group_by'])) != len(rollup['group_by']):
+            raise ValueError(f'Rollup "{rollup["name"]}" groups by a field more than once.')
+        for name in rollup['group_by']:
+            if name not in names:
+                raise ValueError(f'Rollup "{rollup["name"]}" groups by the unknown field "{name}".')
+            if model_fields[name].null:
+                raise ValueError(f'Rollup "{rollup["name"]}" groups by the nullable field "{name}".')
+            if name == 'count' or name.startswith('rollup_'):
+                raise ValueError(f'Rollup "{rollup["name"]}" can not group by the field "{name}".')
+        for item in rollup['aggregates']:
+            function, name = DynamicRollupService.parse_aggregate(item)
+            if function == 'count' and name is None:
+                continue
+            if name not in names:
+                raise ValueError(f'Rollup "{rollup["name"]}" aggregates the unknown field "{name}".')
+            field = model_fields[name]
+            if isinstance(field, DynamicRollupService.NUMBER_FIELDS) and function in DynamicRollupService.NUMBER_FUNCTIONS:
+                continue
+            if isinstance(field, models.BooleanField) and function in DynamicRollupService.BOOLEAN_FUNCTIONS:
+                continue
+            raise ValueError(f'Unsupported rollup aggregate "{function}" for field "{name}".')
+
+    @staticmethod
+    def get_columns(rollup: Mapping[str, Any]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """
+        Return the function and the field of every aggregate column of the
+        rollup table. Averages are stored as a sum and a count, and sums
+        of nullable fields with a count, so groups without values return
+        null like the aggregation endpoint.
+        """
+        columns: Dict[str, Tuple[str, Optional[str]]] = {DynamicRollupService.COUNT: ('count', None)}
+        for item in rollup['aggregates']:
+            function, name = DynamicRollupService.parse_aggregate(item)
+            if name is None:
+                continue
+            if function in ('sum', 'avg'):
+                columns[f'rollup_{name}_sum'] = ('sum', name)
+                columns[f'rollup_{name}_count'] = ('count', name)
+            else:
+                columns[f'rollup_{name}_{function}'] = (function, name)
+        return columns
+
+    @staticmethod
+    def prepare_column(function: str, field: Optional[models.Field]) -> models.Field:
+        if function != 'sum' or isinstance(field, models.IntegerField):
+            return models.BigIntegerField(default=0)
+        if isinstance(field, models.DecimalField):
+            return models.DecimalField(
+                max_digits=min(field.max_digits + 18, 1000), decimal_places=field.decimal_places, default=0
+            )
+        return models.FloatField(default=0)
+
+    @staticmethod
+    def get_table_name(model_instance: DynamicModel, table_name: str, rollup: Mapping[str, Any]) -> str:
+        """
+        Return the name of the rollup table, shortened with a hash of the
+        full name to the length of names allowed by the database.
+        """
+        connection = connections[DynamicDatabaseService.get_database(model_instance)]
+        return truncate_name(f'{table_name}_rollup_{rollup["name"]}', connection.ops.max_name_length())
+
+    @staticmethod
+    def create_rollup_class(model_instance: DynamicModel, table_name: str, rollup: Dict[str, Any], model_fields: Dict[str, models.Field]):
+        """Create the model class of the rollup table, with a unique constraint on the grouped fields."""
+        rollup_table = DynamicRollupService.get_table_name(model_instance, table_name, rollup)
+        digest = hashlib.sha1(rollup_table.encode()).hexdigest()
+        rollup_fields = {name: model_fields[name].clone() for name in rollup['group_by']}
+        for column, (function, name) in DynamicRollupService.get_columns(rollup).items():
+            rollup_fields[column] = DynamicRollupService.prepare_column(function, model_fields.get(name))
+
+        model_meta = type('Meta', (), {
+            'apps': rollup_registry,
+            'app_label': rollup_registry.APP_LABEL,
+            'db_table': rollup_table,
+            'constraints': [models.UniqueConstraint(fields=rollup['group_by'], name=f'{rollup_table[:20]}_{digest[:8]}_key')],
+        })
+        return type(f'{model_instance.name}__{rollup["name"]}', (models.Model,), {
+            '__module__': 'core.runtime_generated',
+            'Meta': model_meta,
+            '_rollup': rollup,
+            **rollup_fields
+        })
+
+    @staticmethod
+    def create_rollup_classes(model_instance: DynamicModel, table_name: str, model_fields: Dict[str, models.Field]) -> Dict[str, Any]:
+        return {
+            rollup['name']: DynamicRollupService.create_rollup_class(model_instance, table_name, rollup, model_fields)
+            for rollup in DynamicRollupService.get_rollups(model_instance)
+        }
+
+    @staticmethod
+    def get_rollup_classes(model_class) -> Dict[str, Any]:
+        """Return the classes of the rollup tables of a generated model class by their rollup names."""
+        return getattr(model_class, '_rollups', {})
+
+    @staticmethod
+    def get_aggregates(rollup_class) -> Dict[str, Any]:
+        """Return the expressions computing the aggregate columns from the rows of the table."""
+        aggregates = {}
+        for column, (function, name) in DynamicRollupService.get_columns(rollup_class._rollup).items():
+            if function == 'count':
+                aggregates[column] = Count(name or 'pk')
+            elif function == 'sum':
+                aggregates[column] = Coalesce(Sum(name), Value(0), output_field=rollup_class._meta.get_field(column))
+            else:
+                aggregates[column] = Count('pk', filter=Q(**{name: function == 'true'}))
+        return aggregates
+
+    @staticmethod
+    def get_outputs(rollup_class) -> Dict[str, Any]:
+        """Return the expressions of the declared aggregates, named like the results of the aggregation endpoint."""
+        outputs = {}
+        for item in rollup_class._rollup['aggregates']:
+            function, name = DynamicRollupService.parse_aggregate(item)
+            if name is None:
+                outputs['count'] = F(DynamicRollupService.COUNT)
+            elif function == 'avg':
+                outputs[f'{name}__avg'] = Cast(F(f'rollup_{name}_sum'), models.FloatField()) / NullIf(
+                    F(f'rollup_{name}_count'), Value(0)
+                )
+            elif function == 'sum' and rollup_class._rollup['fields'][name].get('null'):
+                outputs[f'{name}__sum'] = Case(
+                    When(**{f'rollup_{name}_count': 0}, then=Value(None)),
+                    default=F(f'rollup_{name}_sum'),
+                    output_field=rollup_class._meta.get_field(f'rollup_{name}_sum'),
+                )
+            else:
+                outputs[f'{name}__{function}'] = F(f'rollup_{name}_{function}')
+        return outputs
+
+    @staticmethod
+    def get_row_deltas(rollup_class, instances: Iterable[models.Model]) -> DynamicRollupDeltas:
+        """Sum the inserted rows per group, like the aggregates of the rollup table do."""
+        keys = [rollup_class._meta.get_field(name).attname for name in rollup_class._rollup['group_by']]
+        columns = DynamicRollupService.get_columns(rollup_class._rollup)
+        deltas: DynamicRollupDeltas = {}
+        for instance in instances:
+            totals = deltas.setdefault(tuple(getattr(instance, key) for key in keys), dict.fromkeys(columns, 0))
+            for column, (function, name) in columns.items():
+                value = getattr(instance, name) if name else None
+                if function == 'count':
+                    totals[column] += name is None or value is not None
+                elif function == 'sum':
+                    totals[column] += value or 0
+                else:
+                    totals[column] += value is (function == 'true')
+        return deltas
+
+    @staticmethod
+    def get_queryset_deltas(rollup_class, queryset: QuerySet) -> DynamicRollupDeltas:
+        """Sum the rows of the queryset per group in the database."""
+        keys = rollup_class._rollup['group_by']
+        groups = queryset.values(*keys).annotate(**DynamicRollupService.get_aggregates(rollup_class)).order_by()
+        return {tuple(group.pop(key) for key in keys): group for group in groups}
+
+    @staticmethod
+    def apply_deltas(rollup_class, deltas: DynamicRollupDeltas, sign: int, using: str) -> None:
+        """
+        Add the sums of the groups to the rollup table, or subtract them
+        with a negative sign, in one upsert per batch of groups. The groups
+        are written in the order of their keys, so concurrent writes lock
+        them in the same order.
+        """
+        if not deltas:
+            return
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        table = quote_name(rollup_class._meta.db_table)
+        keys = rollup_class._rollup['group_by']
+        columns = list(DynamicRollupService.get_columns(rollup_class._rollup))
+        fields = [rollup_class._meta.get_field(name) for name in keys + columns]
+        sql = 'INSERT INTO {table} ({columns}) VALUES {{values}} ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+            table=table,
+            columns=', '.join(quote_name(field.column) for field in fields),
+            keys=', '.join(quote_name(name) for name in keys),
+            updates=', '.join(f'{quote_name(name)} = {table}.{quote_name(name)} + EXCLUDED.{quote_name(name)}' for name in columns),
+        )
+        placeholders = '({})'.format(', '.join(['%s'] * len(fields)))
+        groups = sorted(deltas.items())
+        with connection.cursor() as cursor:
+            for start in range(0, len(groups), DynamicRollupService.UPSERT_BATCH_SIZE):
+                batch = groups[start:start + DynamicRollupService.UPSERT_BATCH_SIZE]
+                params = []
+                for key, totals in batch:
+                    values = list(key) + [totals[column] * sign for column in columns]
+                    params += [field.get_db_prep_save(value, connection) for field, value in zip(fields, values)]
+                cursor.execute(sql.format(values=', '.join([placeholders] * len(batch))), params)
+            if sign < 0:
+                cursor.execute(f'DELETE FROM {table} WHERE {quote_name(DynamicRollupService.COUNT)} <= 0')
+
+    @staticmethod
+    def add_rows(model_class, instances: List[models.Model], using: Optional[str] = None) -> None:
+        """Add inserted rows to the rollups, in the transaction of the insert."""
+        using = using or router.db_for_write(model_class)
+        for rollup_class in DynamicRollupService.get_rollup_classes(model_class).values():
+            DynamicRollupService.apply_deltas(rollup_class, DynamicRollupService.get_row_deltas(rollup_class, instances), 1, using)
+
+    @staticmethod
+    def write_rows(
+            queryset: QuerySet,
+            write: Callable[[QuerySet], int],
+            values: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Write the rows of the queryset with `write`, in the transaction of
+        the caller, and update the rollups reading any of the updated
+        `values`, all rollups for deletes. The rows are locked before they
+        are subtracted, so concurrent writes can not change them in between,
+        and updated rows are added back from their sums before the update.
+        """
+        model_class = queryset.model
+        rollup_classes = [
+            rollup_class for rollup_class in DynamicRollupService.get_rollup_classes(model_class).values()
+            if values is None or set(values) & set(DynamicRollupService.get_field_names(rollup_class._rollup))
+        ]
+        if not rollup_classes:
+            return write(queryset)
+        using = router.db_for_write(model_class)
+        DynamicRollupService.lock_rows(queryset, using)
+        deltas = {
+            rollup_class: DynamicRollupService.get_queryset_deltas(rollup_class, queryset.using(using))
+            for rollup_class in rollup_classes
+        }
+        for rollup_class in rollup_classes:
+            DynamicRollupService.apply_deltas(rollup_class, deltas[rollup_class], -1, using)
+        count = write(queryset)
+        if values is not None:
+            for rollup_class in rollup_classes:
+                updated_deltas = DynamicRollupService.get_updated_deltas(rollup_class, deltas[rollup_class], values)
+                DynamicRollupService.apply_deltas(rollup_class, updated_deltas, 1, using)
+        return count
+
+    @staticmethod
+    def lock_rows(queryset: QuerySet, using: str) -> None:
+        """Lock the rows of the queryset until the end of the transaction, without fetching them."""
+        connection = connections[using]
+        if not connection.features.has_select_for_update:
+            return
+        sql, params = queryset.select_for_update().values('pk').query.get_compiler(using).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM ({sql}) AS locked', params)
+
+    @staticmethod
+    def get_updated_deltas(rollup_class, deltas: DynamicRollupDeltas, values: Dict[str, Any]) -> DynamicRollupDeltas:
+        """
+        Return the sums of the groups of rows after setting the values on
+        them, from their sums before. An updated field holds the same value
+        in every row, so its aggregates follow from the number of rows.
+        """
+        keys = rollup_class._rollup['group_by']
+        columns = DynamicRollupService.get_columns(rollup_class._rollup)
+        updated: DynamicRollupDeltas = {}
+        for key, totals in deltas.items():
+            rows = totals[DynamicRollupService.COUNT]
+            updated_key = tuple(values.get(name, value) for name, value in zip(keys, key))
+            updated_totals = updated.setdefault(updated_key, dict.fromkeys(columns, 0))
+            for column, (function, name) in columns.items():
+                if name not in values:
+                    updated_totals[column] += totals[column]
+                elif values[name] is None:
+                    continue
+                elif function == 'sum':
+                    updated_totals[column] += values[name] * rows
+                elif function == 'count':
+                    updated_totals[column] += rows
+                elif values[name] == (function == 'true'):
+                    updated_totals[column] += rows
+        return updated
+
+    @staticmethod
+    def rebuild(model_class, rollup_class, using: str) -> None:
+        """
+        Recompute the rollup table from the rows of the table. On PostgreSQL
+        writes to the table wait until the rollup is rebuilt.
+        """
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        keys = rollup_class._rollup['group_by']
+        aggregates = DynamicRollupService.get_aggregates(rollup_class)
+        queryset = model_class.objects.using(using).values(*keys).annotate(**aggregates).order_by()
+        select, params = queryset.query.get_compiler(using).as_sql()
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'LOCK TABLE {quote_name(model_class._meta.db_table)} IN SHARE MODE')
+            cursor.execute(f'DELETE FROM {quote_name(rollup_class._meta.db_table)}')
+            cursor.execute('INSERT INTO {table} ({columns}) {select}'.format(
+                table=quote_name(rollup_class._meta.db_table),
+                columns=', '.join(quote_name(name) for name in keys + list(aggregates)),
+                select=select,
+            ), params)
+
+    @staticmethod
+    def update_tables(schema_editor, previous_class, model_class) -> None:
+        """
+        Drop the rollup tables of removed or changed rollups, and create and
+        fill the tables of added or changed rollups.
+        """
+        using = schema_editor.connection.alias
+        previous_rollup_classes = DynamicRollupService.get_rollup_classes(previous_class)
+        rollup_classes = DynamicRollupService.get_rollup_classes(model_class)
+        for name, rollup_class in previous_rollup_classes.items():
+            updated_class = rollup_classes.get(name)
+            if updated_class is None or updated_class._rollup != rollup_class._rollup:
+                schema_editor.delete_model(rollup_class)
+        for name, rollup_class in rollup_classes.items():
+            previous_rollup_class = previous_rollup_classes.get(name)
+            if previous_rollup_class is None or previous_rollup_class._rollup != rollup_class._rollup:
+                schema_editor.create_model(rollup_class)
+                DynamicRollupService.rebuild(model_class, rollup_class, using)
+
+    @staticmethod
+    def get_rows(rollup_class, query_params: Mapping[str, Any], using: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Return the groups of the rollup matching the filters on the grouped
+        fields, ordered by the grouped fields or the given `ordering`.
+        """
+        keys = rollup_class._rollup['group_by']
+        outputs = DynamicRollupService.get_outputs(rollup_class)
+        rows_filter = DynamicRowsFilter(
+            rollup_class, {name: rollup_class._meta.get_field(name) for name in keys}, using=using
+        )
+        ordering = [item for item in query_params.get('ordering', '').split(',') if item] or keys
+        for item in ordering:
+            if item.lstrip('-') not in keys + list(outputs):
+                raise ValidationError({'ordering': f'Unknown group field or aggregate "{item.lstrip("-")}".'})
+
+        max_groups = getattr(settings, 'DYNAMIC_MODELS_AGGREGATE_MAX_GROUPS', 10000)
+        queryset = rows_filter.model_class.objects.using(using).filter(
+            rows_filter.build_q(query_params, ignore=DynamicRollupService.RESERVED_PARAMS)
+        )
+        groups = list(queryset.annotate(**outputs).values(*keys, *outputs).order_by(*ordering)[:max_groups + 1])
+        if len(groups) > max_groups:
+            raise ValidationError({'non_field_errors': [f'More than {max_groups} groups, narrow down the groups with filters.']})
+        return groups
@@ -0,0 +1,78 @@
+import random
+import zlib
+from typing import List
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from core.conditional import DynamicDataVersion
+from core.models import DynamicModel
+
+
+class DynamicDatabaseService:
+    """
+    Places the tables of dynamic models on the databases listed in
+    `DYNAMIC_MODELS_DATABASES`.
+
+    A table is placed on the database given when its dynamic model is
+    created, or on a database chosen by a hash of its name. The placement
+    is stored with the dynamic model and never changes, so adding a
+    database does not move existing tables. The dynamic models themselves
+    are always stored in the default database.
+    """
+
+    @staticmethod
+    def get_databases() -> List[str]:
+        """Return the aliases of the databases holding dynamic tables."""
+        return list(getattr(settings, 'DYNAMIC_MODELS_DATABASES', None) or [DEFAULT_DB_ALIAS])
+
+    @staticmethod
+    def place(name: str) -> str:
+        """Return the database of a new dynamic model placed by a hash of its name."""
+        databases = DynamicDatabaseService.get_databases()
+        return databases[zlib.crc32(name.lower().encode()) % len(databases)]
+
+    @staticmethod
+    def get_database(model_instance: DynamicModel) -> str:
+        """Return the database holding the table of the dynamic model."""
+        return model_instance.database or DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def get_read_database(model_instance: DynamicModel, version: Optional[DynamicDataVersion] = None) -> str:
+        """
+        Return the database to read the rows of the dynamic model from, a
+        random read replica of its database when it has any. Rows written
+        less than `DYNAMIC_MODELS_READ_REPLICA_LAG` seconds before the
+        version was read are read from the primary database, so responses
+        never hold rows older than their version.
+        """
+        database = DynamicDatabaseService.get_database(model_instance)
+        replicas = getattr(settings, 'DYNAMIC_MODELS_READ_REPLICAS', {}).get(database)
+        if not replicas:
+            return database
+        if version is not None:
+            lag = getattr(settings, 'DYNAMIC_MODELS_READ_REPLICA_LAG', 5)
+            if (timezone.now() - version.data_modified_at).total_seconds() < lag:
+                return database
+        return random.choice(replicas)
+
+
+class DynamicModelRouter:
+    """
+    Routes the queries of generated model classes to the database holding
+    their table, and keeps the tables of the core app in the default
+    database. Other models are left to the next router.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return getattr(model, '_dynamic_database', None)
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return getattr(model, '_dynamic_database', None)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        if app_label == 'core':
+            return db == DEFAULT_DB_ALIAS
+        return None
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import Any
+from typing import Optional
+
+from django.apps.registry import Apps
+from django.conf import settings
+
+
+class DynamicModelRegistry(Apps):
+    """
+    App registry of the model classes generated for dynamic models,
+    separate from the global app registry of the project.
+
+    Registering a class replaces the class of the same name in a single
+    step, without clearing any cache of the registry, and drops the
+    reference to the replaced class so it can be garbage collected. The
+    registry keeps the `max_size` most recently used classes; an evicted
+    class is generated again on its next access.
+    """
+    APP_LABEL = 'core'
+
+    def __init__(self, max_size: int = 1024):
+        super().__init__(installed_apps=())
+        self.max_size = max_size
+        self.all_models[self.APP_LABEL] = OrderedDict()
+
+    def register_model(self, app_label: str, model: Any) -> None:
+        # Called by the model metaclass when a generated class is created
+        with self._lock:
+            models = self.all_models[app_label]
+            models[model._meta.model_name] = model
+            models.move_to_end(model._meta.model_name)
+            while len(models) > self.max_size:
+                models.popitem(last=False)
+
+    def get_model_class(self, name: str) -> Optional[Any]:
+        """Return the registered class of the named dynamic model, or None."""
+        with self._lock:
+            models = self.all_models[self.APP_LABEL]
+            model = models.get(name.lower())
+            if model is not None:
+                models.move_to_end(name.lower())
+            return model
+
+    def unregister(self, name: str) -> None:
+        """Drop the class of the named dynamic model."""
+        with self._lock:
+            self.all_models[self.APP_LABEL].pop(name.lower(), None)
+
+    def __len__(self) -> int:
+        return len(self.all_models[self.APP_LABEL])
+
+
+registry = DynamicModelRegistry(max_size=getattr(settings, 'DYNAMIC_MODELS_REGISTRY_SIZE', 1024))
@@ -0,0 +1,192 @@
+from itertools import zip_longest
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Union
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+from django.db import models
+
+from core.search import DynamicSearchService
+
+
+DynamicIndexType = Union[models.Index, models.UniqueConstraint]
+
+
+class DynamicSchemaChange(NamedTuple):
+    operation: str
+    name: str
+    sql: List[str]
+    rewrite: bool
+
+
+class DynamicSchemaDiff:
+    """
+    The changes needed to bring the table of a dynamic model from its
+    current model class to an updated set of fields and indexes.
+
+    The diff is computed up front, so it can be described without touching
+    the table. On PostgreSQL the column changes are applied with a single
+    `ALTER TABLE` statement holding all the actions, so the table is
+    rewritten and locked at most once. The search column is rebuilt in
+    the same statement when the searchable fields change.
+    """
+
+    def __init__(
+            self,
+            model_class,
+            updated_fields: Dict[str, models.Field],
+            updated_indexes: List[DynamicIndexType],
+            using: str = DEFAULT_DB_ALIAS,
+            updated_search_fields: Optional[List[Dict[str, Any]]] = None
+    ):
+        self.model_class = model_class
+        self.connection = connections[using]
+
+        self.existing_search_fields = getattr(model_class, '_search_fields', [])
+        if updated_search_fields is None:
+            updated_search_fields = self.existing_search_fields
+        self.rebuild_search = updated_search_fields != self.existing_search_fields
+        self.updated_search_fields = updated_search_fields
+
+        existing_fields = {
+            field.name: field for field in model_class._meta.concrete_fields if not field.primary_key
+        }
+        self.fields_to_remove = [field for name, field in existing_fields.items() if name not in updated_fields]
+        self.fields_to_add = [field for name, field in updated_fields.items() if name not in existing_fields]
+        self.fields_to_alter = [
+            (field, updated_fields[name]) for name, field in existing_fields.items()
+            if name in updated_fields and field.deconstruct()[1:] != updated_fields[name].deconstruct()[1:]
+        ]
+
+        existing_indexes = {index.name: index for index in [*model_class._meta.indexes, *model_class._meta.constraints]}
+        updated_indexes = {index.name: index for index in updated_indexes}
+        self.indexes_to_remove = [index for name, index in existing_indexes.items() if updated_indexes.get(name) != index]
+        self.indexes_to_add = [index for name, index in updated_indexes.items() if existing_indexes.get(name) != index]
+
+    def needs_rewrite(self, old_field: models.Field, new_field: models.Field) -> bool:
+        """Return whether altering the field rewrites every row of the table."""
+        return old_field.db_parameters(self.connection)['type'] != new_field.db_parameters(self.connection)['type']
+
+    def collect_sql(self, operation: Callable[[Any], None]) -> List[str]:
+        """Return the statements the schema editor runs for the operation, without running them."""
+        with self.connection.schema_editor(collect_sql=True, atomic=False) as schema_editor:
+            operation(schema_editor)
+        return schema_editor.collected_sql
+
+    def get_changes(self) -> List[DynamicSchemaChange]:
+        """
+        Return the changes applied to the table in the order they are
+        applied. Dropping an index is cheap, and dropping it before its
+        columns avoids failing on indexes already dropped with their columns.
+        The search column depends on the searchable columns, so it is dropped
+        first and added back last.
+        """
+        model_class = self.model_class
+        table_name = model_class._meta.db_table
+        changes = []
+        if self.rebuild_search and self.existing_search_fields:
+            sql = DynamicSearchService.get_remove_sql(self.connection, table_name)
+            changes.append(DynamicSchemaChange('remove_search', DynamicSearchService.SEARCH_VECTOR, sql, False))
+        for index in self.indexes_to_remove:
+            if isinstance(index, models.Index):
+                sql = self.collect_sql(lambda schema_editor: schema_editor.remove_index(model_class, index))
+            else:
+                sql = self.collect_sql(lambda schema_editor: schema_editor.remove_constraint(model_class, index))
+            changes.append(DynamicSchemaChange('remove_index', index.name, sql, False))
+        for field in self.fields_to_remove:
+            sql = self.collect_sql(lambda schema_editor: schema_editor.remove_field(model_class, field))
+            changes.append(DynamicSchemaChange('remove_field', field.name, sql, False))
+        for field in self.fields_to_add:
+            # Columns added with a constant default do not rewrite the table since PostgreSQL 11
+            sql = self.collect_sql(lambda schema_editor: schema_editor.add_field(model_class, field))
+            changes.append(DynamicSchemaChange('add_field', field.name, sql, False))
+        for old_field, new_field in self.fields_to_alter:
+            sql = self.collect_sql(lambda schema_editor: schema_editor.alter_field(model_class, old_field, new_field))
+            changes.append(DynamicSchemaChange('alter_field', new_field.name, sql, self.needs_rewrite(old_field, new_field)))
+        if self.rebuild_search and self.updated_search_fields:
+            # A stored generated column is computed for every row when added
+            sql = self.collect_sql(
+                lambda schema_editor: DynamicSearchService.add_search(schema_editor, table_name, self.updated_search_fields)
+            )
+            changes.append(DynamicSchemaChange('add_search', DynamicSearchService.SEARCH_VECTOR, sql, True))
+        return changes
+
+    def get_index_changes(self) -> List[DynamicSchemaChange]:
+        """Return the indexes built once the table changes are committed."""
+        model_class = self.model_class
+        changes = []
+        for index in self.indexes_to_add:
+            if isinstance(index, models.Index):
+                sql = self.collect_sql(lambda schema_editor: schema_editor.add_index(model_class, index))
+            else:
+                sql = self.collect_sql(lambda schema_editor: schema_editor.add_constraint(model_class, index))
+            changes.append(DynamicSchemaChange('add_index', index.name, sql, False))
+        return changes
+
+    def combine_statements(self, changes: List[DynamicSchemaChange]) -> List[str]:
+        """
+        Combine the statements of the changes into as few statements as
+        possible. The n-th statements of all changes are grouped together,
+        because PostgreSQL does not let an action refer to a column added
+        by the same statement, and consecutive `ALTER TABLE` statements of
+        a group are merged into one statement with several actions.
+        """
+        if self.connection.vendor != 'postgresql':
+            return [statement for change in changes for statement in change.sql]
+
+        prefix = f'ALTER TABLE {self.connection.ops.quote_name(self.model_class._meta.db_table)} '
+        statements: List[str] = []
+        actions: List[str] = []
+        for group in zip_longest(*[change.sql for change in changes]):
+            for statement in filter(None, group):
+                statement = statement.rstrip().rstrip(';')
+                action = statement[len(prefix):]
+                if statement.startswith(prefix) and not action.startswith('RENAME '):
+                    actions.append(action)
+                    continue
+                if actions:
+                    statements.append(prefix + ', '.join(actions) + ';')
+                    actions = []
+                statements.append(statement + ';')
+            if actions:
+                statements.append(prefix + ', '.join(actions) + ';')
+                actions = []
+        return statements
+
+    def get_statements(self) -> List[str]:
+        """Return the statements applying the table changes."""
+        return self.combine_statements(self.get_changes())
+
+    def apply(self, schema_editor) -> None:
+        """Apply the table changes with the schema editor."""
+        if self.connection.vendor == 'postgresql':
+            for statement in self.get_statements():
+                schema_editor.execute(statement, params=None)
+            return
+
+        for index in self.indexes_to_remove:
+            if isinstance(index, models.Index):
+                schema_editor.remove_index(self.model_class, index)
+            else:
+                schema_editor.remove_constraint(self.model_class, index)
+        for field in self.fields_to_remove:
+            schema_editor.remove_field(self.model_class, field)
+        for field in self.fields_to_add:
+            schema_editor.add_field(self.model_class, field)
+        for old_field, new_field in self.fields_to_alter:
+            schema_editor.alter_field(self.model_class, old_field, new_field)
+
+    def describe(self) -> Dict[str, Any]:
+        """Describe the planned changes, as returned by a dry run."""
+        changes = self.get_changes()
+        index_changes = self.get_index_changes()
+        return {
+            'statements': self.combine_statements(changes),
+            'rewrite': any(change.rewrite for change in changes),
+            'changes': [change._asdict() for change in changes + index_changes],
+        }
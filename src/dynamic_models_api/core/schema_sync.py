@@ -0,0 +1,141 @@
+import logging
+import os
+import select
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import close_old_connections
+from django.db import connections
+
+from core.cache import DynamicModelCache
+from core.models import DynamicModel
+
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaChangeListener:
+    """
+    Keeps the in-process cache of generated classes in sync with schema
+    changes made by other processes.
+
+    On PostgreSQL the listener subscribes to the schema change channel with
+    LISTEN and invalidates the affected cache entries as soon as a
+    notification arrives. On other backends, and whenever the notification
+    connection is (re)established, it polls the schema versions of the
+    cached dynamic models instead.
+    """
+    CHANNEL = 'dynamic_models_schema'
+
+    def __init__(self, cache: DynamicModelCache):
+        self.cache = cache
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # Set while the cache is known to be in sync with the database
+        self._synced = threading.Event()
+
+    @property
+    def mode(self) -> str:
+        return getattr(settings, 'DYNAMIC_MODELS_SCHEMA_SYNC', 'notify')
+
+    @property
+    def poll_interval(self) -> float:
+        return getattr(settings, 'DYNAMIC_MODELS_SCHEMA_POLL_INTERVAL', 5)
+
+    def ensure_started(self) -> bool:
+        """
+        Start the listener thread of the current process if needed. Return
+        whether cache entries can be trusted without checking the database,
+        which is the case once the listener has checked the cached entries.
+        """
+        if self.mode == 'off':
+            return False
+        # Threads do not survive a fork, so a pre-forked worker starts its own
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return self._synced.is_set()
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._synced.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self.run, name='dynamic-models-schema-sync', daemon=True)
+                self._thread.start()
+        return self._synced.is_set()
+
+    @staticmethod
+    def notify(model_instance: DynamicModel, using: str = DEFAULT_DB_ALIAS) -> None:
+        """
+        Announce a new schema version of the model instance. On PostgreSQL
+        the notification is delivered when the current transaction commits.
+        """
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [SchemaChangeListener.CHANNEL, f'{model_instance.pk}:{model_instance.schema_version}']
+            )
+
+    def handle_payload(self, payload: str) -> None:
+        """Invalidate the cache entry mentioned in a notification payload."""
+        try:
+            pk, version = (int(value) for value in payload.split(':'))
+        except ValueError:
+            logger.warning('Ignoring malformed schema notification %r', payload)
+            return
+        entry = self.cache.get(pk)
+        if entry is not None and entry.model_instance.schema_version < version:
+            self.cache.invalidate(pk)
+
+    def poll(self) -> None:
+        """Invalidate cache entries whose schema version is outdated or which were deleted."""
+        cached_versions = self.cache.versions()
+        if not cached_versions:
+            return
+        current_versions = dict(
+            DynamicModel.objects.filter(pk__in=cached_versions.keys()).values_list('pk', 'schema_version')
+        )
+        for pk, version in cached_versions.items():
+            if current_versions.get(pk) != version:
+                self.cache.invalidate(pk)
+
+    def run(self) -> None:
+        while True:
+            try:
+                if self.mode == 'notify' and connections[DEFAULT_DB_ALIAS].vendor == 'postgresql':
+                    self.listen()
+                else:
+                    self.poll()
+                    self._synced.set()
+                    time.sleep(self.poll_interval)
+            except Exception:
+                self._synced.clear()
+                logger.exception('Schema change listener failed, retrying')
+                time.sleep(self.poll_interval)
+            finally:
+                close_old_connections()
+
+    def listen(self) -> None:
+        """Block on the notification channel, invalidating entries as notifications arrive."""
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            connection.ensure_connection()
+            connection.set_autocommit(True)
+            raw_connection = connection.connection
+            with raw_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.CHANNEL}')
+            # Notifications sent before LISTEN was issued are lost
+            self.poll()
+            self._synced.set()
+            while self.mode == 'notify':
+                if select.select([raw_connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                raw_connection.poll()
+                while raw_connection.notifies:
+                    self.handle_payload(raw_connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
@@ -0,0 +1,166 @@
+import hashlib
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections
+from django.db import models
+from django.db.models import Expression
+from django.db.models import F
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.db.models.sql import Query
+from rest_framework.exceptions import ValidationError
+
+from core.models import DynamicModel
+
+
+class DynamicSearchVectorColumn(Expression):
+    """
+    The search column of the table of the query, quoted like the columns
+    of fields.
+    """
+    output_field = SearchVectorField()
+
+    def __init__(self, alias: Optional[str] = None):
+        super().__init__()
+        self.alias = alias
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+        resolved = super().resolve_expression(query, allow_joins, reuse, summarize, for_save)
+        resolved.alias = query.get_initial_alias()
+        return resolved
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(change_map.get(self.alias, self.alias))
+
+    def as_sql(self, compiler, connection):
+        return '{}.{}'.format(
+            compiler.quote_name_unless_alias(self.alias),
+            connection.ops.quote_name(DynamicSearchService.SEARCH_VECTOR),
+        ), []
+
+
+class DynamicSearchService:
+    """
+    Full-text search on the `string` and `varchar` fields of a dynamic
+    model marked with `search`.
+
+    On PostgreSQL the table gets a stored generated `tsvector` column
+    combining the searchable fields, weighted by their order in the
+    definition, with a GIN index. Searches are ranked full-text queries
+    on that column. Fields marked with `trigram` get a trigram GIN index,
+    used by substring filters.
+    """
+    SEARCH_VECTOR = 'search_vector'
+    SEARCH_RANK = 'search_rank'
+    FIELD_TYPES = ['string', 'varchar']
+    WEIGHTS = ['A', 'B', 'C', 'D']
+
+    @staticmethod
+    def get_config() -> str:
+        return getattr(settings, 'DYNAMIC_MODELS_SEARCH_CONFIG', 'english')
+
+    @staticmethod
+    def get_search_fields(model_instance: DynamicModel) -> List[Dict[str, Any]]:
+        """Return the definitions of the searchable fields, in the order of their weights."""
+        return [field for field in model_instance.fields if field.get('search')]
+
+    @staticmethod
+    def get_trigram_fields(model_instance: DynamicModel) -> List[str]:
+        return [field['name'] for field in model_instance.fields if field.get('trigram')]
+
+    @staticmethod
+    def prepare_trigram_index(table_name: str, name: str) -> models.Index:
+        digest = hashlib.sha1(f'{table_name}.{name}'.encode()).hexdigest()
+        return GinIndex(fields=[name], name=f'{table_name[:15]}_{digest[:8]}_trgm', opclasses=['gin_trgm_ops'])
+
+    @staticmethod
+    def has_trigram_extension(using: str) -> bool:
+        """Return whether the trigram extension can be installed in the database."""
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def create_extension(schema_editor) -> None:
+        """Install the trigram extension, once per database."""
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm', params=None)
+
+    @staticmethod
+    def get_expression(connection, search_fields: List[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """
+        Return the SQL and the parameters of the expression of the search
+        column, combining the searchable columns weighted by their position.
+        """
+        config = DynamicSearchService.get_config()
+        weights = DynamicSearchService.WEIGHTS
+        vector = None
+        for position, field in enumerate(search_fields):
+            column = RawSQL(connection.ops.quote_name(field['name']), [], output_field=models.TextField())
+            field_vector = SearchVector(column, config=config, weight=weights[min(position, len(weights) - 1)])
+            vector = field_vector if vector is None else vector + field_vector
+        query = Query(None)
+        return vector.resolve_expression(query).as_sql(query.get_compiler(connection=connection), connection)
+
+    @staticmethod
+    def add_search(schema_editor, table_name: str, search_fields: List[Dict[str, Any]]) -> None:
+        """Add the search column and its index."""
+        quote_name = schema_editor.quote_name
+        expression, params = DynamicSearchService.get_expression(schema_editor.connection, search_fields)
+        schema_editor.execute(
+            'ALTER TABLE {table} ADD COLUMN {column} tsvector GENERATED ALWAYS AS ({expression}) STORED'.format(
+                table=quote_name(table_name),
+                column=quote_name(DynamicSearchService.SEARCH_VECTOR),
+                expression=expression,
+            ),
+            params,
+        )
+        schema_editor.execute('CREATE INDEX {name} ON {table} USING gin ({column})'.format(
+            name=quote_name(f'{table_name[:40]}_search'),
+            table=quote_name(table_name),
+            column=quote_name(DynamicSearchService.SEARCH_VECTOR),
+        ), params=None)
+
+    @staticmethod
+    def get_remove_sql(connection, table_name: str) -> List[str]:
+        """Return the statements dropping the search column, and with it its index."""
+        quote_name = connection.ops.quote_name
+        return ['ALTER TABLE {table} DROP COLUMN {column}'.format(
+            table=quote_name(table_name),
+            column=quote_name(DynamicSearchService.SEARCH_VECTOR),
+        )]
+
+    @staticmethod
+    def get_vector() -> 'DynamicSearchVectorColumn':
+        """Return an expression referring to the search column, which is not a field of the model class."""
+        return DynamicSearchVectorColumn()
+
+    @staticmethod
+    def search(queryset: QuerySet, text: str, rank: bool = False) -> QuerySet:
+        """
+        Filter the rows matching the search text, written like a web
+        search query, and annotate their rank when requested.
+        """
+        model_class = queryset.model
+        if not getattr(model_class, '_search_fields', None):
+            raise ValidationError({'search': 'No field of this table is searchable.'})
+        query = SearchQuery(text, config=DynamicSearchService.get_config(), search_type='websearch')
+        vector = DynamicSearchService.get_vector()
+        queryset = queryset.alias(**{DynamicSearchService.SEARCH_VECTOR: vector}).filter(
+            **{DynamicSearchService.SEARCH_VECTOR: query}
+        )
+        if rank:
+            # The rank is a real, cast so its value in pagination cursors compares equal to itself
+            rank_expression = Cast(SearchRank(F(DynamicSearchService.SEARCH_VECTOR), query), models.FloatField())
+            queryset = queryset.annotate(**{DynamicSearchService.SEARCH_RANK: rank_expression})
+        return queryset
@@ -1,22 +1,261 @@
+import copy
+from typing import Any
+from typing import Dict
+
 from rest_framework import serializers
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
 from django.db import transaction
 
+from .bulk import DynamicRowsBulkService
+from .changes import DynamicChangeService
+from .conditional import DynamicDataVersionService
+from .counts import DynamicCountService
+from .field_migrations import DynamicFieldMigrationService
+from .models import DynamicFieldMigration
 from .models import DynamicModel
+from .partitions import DynamicPartitionService
+from .rollups import DynamicRollupService
+from .routing import DynamicDatabaseService
+from .search import DynamicSearchService
 from .services import DynamicModelService
 
 
 class FieldSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=255)
     type = serializers.ChoiceField(choices=DynamicModelService.get_choices())
+    length = serializers.IntegerField(min_value=1, max_value=10485760, required=False)
+    precision = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    scale = serializers.IntegerField(min_value=0, max_value=1000, required=False)
+    null = serializers.BooleanField(required=False)
+    default = serializers.JSONField(required=False)
+    search = serializers.BooleanField(required=False)
+    trigram = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        required = DynamicModelService.FIELD_OPTIONS.get(attrs['type'], [])
+        for options in DynamicModelService.FIELD_OPTIONS.values():
+            for option in options:
+                if option in required and option not in attrs:
+                    raise serializers.ValidationError({option: f'This option is required for {attrs["type"]} fields.'})
+                if option not in required and option in attrs:
+                    raise serializers.ValidationError({option: f'This option is not supported by {attrs["type"]} fields.'})
+        for option in ['search', 'trigram']:
+            if attrs.get(option) and attrs['type'] not in DynamicSearchService.FIELD_TYPES:
+                raise serializers.ValidationError({option: f'This option is not supported by {attrs["type"]} fields.'})
+        if attrs['type'] == 'decimal' and attrs['scale'] > attrs['precision']:
+            raise serializers.ValidationError({'scale': 'Ensure the scale is not greater than the precision.'})
+        if isinstance(attrs.get('default'), (dict, list)):
+            raise serializers.ValidationError({'default': 'Expected a single value.'})
+        if attrs.get('default') is not None:
+            model_field = DynamicModelService.prepare_field({**attrs, 'default': None})
+            try:
+                model_field.clean(attrs['default'], None)
+            except DjangoValidationError as error:
+                raise serializers.ValidationError({'default': error.messages})
+        return attrs
+
+
+class IndexSerializer(serializers.Serializer):
+    name = serializers.RegexField(r'^[a-zA-Z][a-zA-Z0-9_]*$', max_length=30, required=False)
+    fields = serializers.ListField(child=serializers.CharField(max_length=255), min_length=1)
+    unique = serializers.BooleanField(default=False)
+    condition = serializers.DictField(required=False)
+
+
+class RollupSerializer(serializers.Serializer):
+    name = serializers.RegexField(r'^[a-z][a-z0-9_]*$', max_length=30)
+    group_by = serializers.ListField(child=serializers.CharField(max_length=255), min_length=1)
+    aggregates = serializers.ListField(child=serializers.CharField(max_length=255), min_length=1, default=['count'])
+
+    def validate_group_by(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Group by every field once.')
+        return value
+
+    def validate_aggregates(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Declare every aggregate once.')
+        return value
+
+
+class PartitioningSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=DynamicPartitionService.TYPES)
+    field = serializers.CharField(max_length=255)
+    interval = serializers.ChoiceField(choices=DynamicPartitionService.INTERVALS, required=False)
+    size = serializers.FloatField(min_value=0, required=False)
+    partitions = serializers.IntegerField(min_value=2, max_value=1024, required=False)
+    retention = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Ensure this value is greater than 0.')
+        return value
 
 
 class DynamicModelSerializer(serializers.ModelSerializer):
     fields = FieldSerializer(many=True)
+    indexes = IndexSerializer(many=True, required=False)
+    partitioning = PartitioningSerializer(required=False, allow_null=True)
+    rollups = RollupSerializer(many=True, required=False)
+    database = serializers.CharField(max_length=100, required=False)
 
     class Meta:
         model = DynamicModel
         fields = '__all__'
-        read_only_fields = ['pk']
+        read_only_fields = ['pk', 'schema_version', 'data_version', 'data_modified_at', 'row_count', 'index_errors']
+
+    def validate_database(self, value):
+        if self.instance is not None and value != self.instance.database:
+            raise serializers.ValidationError('The database of an existing table cannot be changed.')
+        if value not in DynamicDatabaseService.get_databases():
+            raise serializers.ValidationError(f'Supported databases: {", ".join(DynamicDatabaseService.get_databases())}.')
+        return value
+
+    def validate(self, attrs):
+        if self.instance is None and 'database' not in attrs:
+            attrs['database'] = DynamicDatabaseService.place(attrs['name'])
+        model_instance = DynamicModel(
+            name=attrs.get('name', getattr(self.instance, 'name', '')),
+            fields=attrs.get('fields', getattr(self.instance, 'fields', [])),
+            indexes=attrs.get('indexes', getattr(self.instance, 'indexes', [])),
+            partitioning=attrs.get('partitioning', getattr(self.instance, 'partitioning', None)),
+            database=attrs.get('database', getattr(self.instance, 'database', None)),
+            change_tracking=attrs.get('change_tracking', getattr(self.instance, 'change_tracking', False)),
+            rollups=attrs.get('rollups', getattr(self.instance, 'rollups', [])),
+        )
+        model_fields = DynamicModelService.prepare_fields(model_instance)
+        if self.instance is None:
+            # The name of the table may be taken by the rollup table of another dynamic model
+            table_name = DynamicModelService.prepare_table_name(model_instance)
+            connection = connections[DynamicDatabaseService.get_database(model_instance)]
+            if table_name in connection.introspection.table_names():
+                raise serializers.ValidationError({'name': f'The table "{table_name}" already exists.'})
+        self.validate_partitioning_of(model_instance, model_fields)
+        self.validate_change_tracking_of(model_instance)
+        self.validate_search_of(model_instance)
+        self.validate_rollups_of(model_instance, model_fields)
+
+        index_names = set()
+        for index in model_instance.indexes:
+            unknown_fields = [name for name in index['fields'] if name not in model_fields]
+            if unknown_fields:
+                raise serializers.ValidationError({'indexes': f'Unknown fields: {", ".join(unknown_fields)}.'})
+            name = index.get('name') or DynamicModelService.prepare_index_name(model_instance, index)
+            if name in index_names:
+                raise serializers.ValidationError({'indexes': f'Duplicate index name "{name}".'})
+            index_names.add(name)
+
+        if self.instance is not None:
+            current_fields = {field['name']: field for field in self.instance.fields}
+            updated_fields = {field['name']: field for field in model_instance.fields}
+            migrating_fields = DynamicFieldMigration.objects.filter(
+                dynamic_model=self.instance, status__in=DynamicFieldMigration.ACTIVE_STATUSES
+            ).values_list('field_name', flat=True)
+            for name in migrating_fields:
+                if updated_fields.get(name) != current_fields.get(name):
+                    raise serializers.ValidationError({'fields': f'Field "{name}" is being migrated to another type.'})
+            for name, field in updated_fields.items():
+                from_type = current_fields.get(name, field)['type']
+                if not DynamicModelService.can_convert(from_type, field['type']):
+                    raise serializers.ValidationError({
+                        'fields': f'Field "{name}" cannot be converted from {from_type} to {field["type"]}.'
+                    })
+
+        try:
+            DynamicModelService.prepare_indexes(model_instance, model_fields)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError({'indexes': error.detail})
+        return attrs
+
+    def validate_partitioning_of(self, model_instance: DynamicModel, model_fields: Dict[str, Any]) -> None:
+        partitioning = DynamicPartitionService.get_partitioning(model_instance)
+        if self.instance is not None and 'partitioning' in self.initial_data:
+            if partitioning != DynamicPartitionService.get_partitioning(self.instance):
+                raise serializers.ValidationError({'partitioning': 'The partitioning of an existing table cannot be changed.'})
+        if partitioning is None:
+            return
+        if connections[DynamicDatabaseService.get_database(model_instance)].vendor != 'postgresql':
+            raise serializers.ValidationError({'partitioning': 'Partitioning requires PostgreSQL.'})
+        names = [field['name'] for field in model_instance.fields]
+        if DynamicPartitionService.uses_created_at(model_instance) and DynamicPartitionService.CREATED_AT in names:
+            raise serializers.ValidationError({
+                'fields': f'"{DynamicPartitionService.CREATED_AT}" is the built-in creation timestamp of the partitioned table.'
+            })
+        try:
+            DynamicPartitionService.validate(partitioning, model_fields, model_instance.indexes)
+        except ValueError as error:
+            raise serializers.ValidationError({'partitioning': str(error)})
+
+        if self.instance is not None:
+            current_field = next(
+                (field for field in self.instance.fields if field['name'] == partitioning['field']), None
+            )
+            updated_field = next((field for field in model_instance.fields if field['name'] == partitioning['field']), None)
+            if current_field != updated_field:
+                raise serializers.ValidationError({'fields': f'The partition key "{partitioning["field"]}" cannot be changed.'})
+
+    def validate_rollups_of(self, model_instance: DynamicModel, model_fields: Dict[str, Any]) -> None:
+        table_name = DynamicModelService.prepare_table_name(model_instance)
+        # Tables of the current rollups are replaced by the rollups of the same name
+        current_tables = set()
+        if self.instance is not None:
+            current_tables = {
+                DynamicRollupService.get_table_name(self.instance, table_name, rollup)
+                for rollup in DynamicRollupService.get_rollups(self.instance)
+            }
+        names, tables = set(), None
+        for rollup in model_instance.rollups:
+            if rollup['name'] in names:
+                raise serializers.ValidationError({'rollups': f'Duplicate rollup name "{rollup["name"]}".'})
+            names.add(rollup['name'])
+            try:
+                DynamicRollupService.validate(rollup, model_instance, model_fields)
+            except ValueError as error:
+                raise serializers.ValidationError({'rollups': str(error)})
+
+            rollup_table = DynamicRollupService.get_table_name(model_instance, table_name, rollup)
+            if rollup_table in current_tables:
+                continue
+            if tables is None:
+                connection = connections[DynamicDatabaseService.get_database(model_instance)]
+                tables = set(connection.introspection.table_names())
+            if rollup_table in tables:
+                raise serializers.ValidationError({'rollups': f'The table "{rollup_table}" of rollup "{rollup["name"]}" already exists.'})
+
+    def validate_search_of(self, model_instance: DynamicModel) -> None:
+        searchable = DynamicSearchService.get_search_fields(model_instance)
+        if not searchable and not DynamicSearchService.get_trigram_fields(model_instance):
+            return
+        using = DynamicDatabaseService.get_database(model_instance)
+        if connections[using].vendor != 'postgresql':
+            raise serializers.ValidationError({'fields': 'Searchable fields require PostgreSQL.'})
+        if DynamicSearchService.get_trigram_fields(model_instance) and not DynamicSearchService.has_trigram_extension(using):
+            raise serializers.ValidationError({'fields': 'Trigram indexes require the pg_trgm extension of PostgreSQL.'})
+        names = [field['name'] for field in model_instance.fields]
+        for name in [DynamicSearchService.SEARCH_VECTOR, DynamicSearchService.SEARCH_RANK]:
+            if searchable and name in names:
+                raise serializers.ValidationError({'fields': f'"{name}" is a built-in column of the searchable table.'})
+
+    def validate_change_tracking_of(self, model_instance: DynamicModel) -> None:
+        if self.instance is not None and model_instance.change_tracking != self.instance.change_tracking:
+            raise serializers.ValidationError({'change_tracking': 'Change tracking of an existing table cannot be changed.'})
+        if not model_instance.change_tracking:
+            return
+        if connections[DynamicDatabaseService.get_database(model_instance)].vendor != 'postgresql':
+            raise serializers.ValidationError({'change_tracking': 'Change tracking requires PostgreSQL.'})
+        if DynamicChangeService.CHANGE_SEQ in [field['name'] for field in model_instance.fields]:
+            raise serializers.ValidationError({
+                'fields': f'"{DynamicChangeService.CHANGE_SEQ}" is the built-in change sequence of the tracked table.'
+            })
+        partitioning = DynamicPartitionService.get_partitioning(model_instance)
+        if partitioning is not None and partitioning['field'] == DynamicChangeService.CHANGE_SEQ:
+            raise serializers.ValidationError({'partitioning': 'The change sequence cannot be the partition key.'})
+
+    def to_representation(self, instance):
+        DynamicDataVersionService.refresh(instance)
+        return super().to_representation(instance)
 
     @transaction.atomic()
     def create(self, validated_data):
@@ -26,6 +265,66 @@ class DynamicModelSerializer(serializers.ModelSerializer):
 
     @transaction.atomic()
     def update(self, instance, validated_data):
-        instance = super().update(instance, validated_data)
-        DynamicModelService.update_table_for_model(instance)
+        previous_instance = copy.deepcopy(instance)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Indexes whose build failed are built again
+        instance.index_errors = {}
+        # The versions and the row count are written concurrently by the row writes
+        instance.save(update_fields=list(validated_data) + ['index_errors'])
+        field_migrations = []
+        if self.context.get('online'):
+            field_migrations = DynamicFieldMigrationService.defer_type_changes(instance, previous_instance)
+        DynamicModelService.update_table_for_model(instance, previous_instance)
+        DynamicFieldMigrationService.start(field_migrations)
         return instance
+
+    def plan_update(self) -> Dict[str, Any]:
+        """Describe the changes of the table the update would apply, without applying them."""
+        instance = copy.deepcopy(self.instance)
+        for attr, value in self.validated_data.items():
+            setattr(instance, attr, value)
+        instance.index_errors = {}
+        return DynamicModelService.plan_table_update(instance, self.instance).describe()
+
+
+class UpdateOptionsSerializer(serializers.Serializer):
+    dry_run = serializers.BooleanField(default=False)
+    online = serializers.BooleanField(default=False)
+
+
+class DynamicFieldMigrationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DynamicFieldMigration
+        exclude = ['dynamic_model', 'last_id']
+
+
+class BulkRowsOptionsSerializer(serializers.Serializer):
+    batch_size = serializers.IntegerField(
+        min_value=1,
+        max_value=getattr(settings, 'DYNAMIC_MODELS_BULK_MAX_BATCH_SIZE', 50000),
+        default=getattr(settings, 'DYNAMIC_MODELS_BULK_BATCH_SIZE', 1000)
+    )
+    method = serializers.ChoiceField(choices=DynamicRowsBulkService.METHODS, default='auto')
+
+
+class RowsWriteOptionsSerializer(serializers.Serializer):
+    batch_size = serializers.IntegerField(
+        min_value=1,
+        max_value=getattr(settings, 'DYNAMIC_MODELS_WRITE_MAX_BATCH_SIZE', 100000),
+        default=getattr(settings, 'DYNAMIC_MODELS_WRITE_BATCH_SIZE', 10000)
+    )
+    all = serializers.BooleanField(default=False)
+
+
+class CountOptionsSerializer(serializers.Serializer):
+    mode = serializers.ChoiceField(choices=DynamicCountService.MODES, default='cached')
+
+
+class ChangesOptionsSerializer(serializers.Serializer):
+    since = serializers.RegexField(DynamicChangeService.CURSOR_PATTERN, required=False)
+    page_size = serializers.IntegerField(
+        min_value=1,
+        max_value=getattr(settings, 'DYNAMIC_MODELS_ROWS_MAX_PAGE_SIZE', 1000),
+        default=getattr(settings, 'DYNAMIC_MODELS_ROWS_PAGE_SIZE', 100)
+    )
@@ -1,33 +1,115 @@
+import contextlib
+import copy
+import hashlib
+import json
+from typing import Any
 from typing import Dict
 from typing import List
+from typing import Optional
 from typing import Type
 from typing import TypeVar
 
-from django.apps import apps
-from django.db import connection
+from django.conf import settings
+from django.db import connections
 from django.db import models
-from django.db.utils import DataError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.db.utils import DatabaseError
+from django.utils import timezone
 from rest_framework import serializers
 
+from core.cache import DynamicModelCache
+from core.cache import DynamicModelCacheEntry
+from core.changes import DynamicChangeService
+from core.encoders import DynamicRowsEncoder
+from core.filters import DynamicRowsFilter
+from core.instrumentation import DynamicInstrumentation
 from core.models import DynamicModel
+from core.partitions import DynamicPartitionService
+from core.rollups import DynamicRollupService
+from core.routing import DynamicDatabaseService
+from core.runtime_generated import registry
+from core.schema_diff import DynamicIndexType
+from core.schema_diff import DynamicSchemaDiff
+from core.schema_sync import SchemaChangeListener
+from core.search import DynamicSearchService
 
 
 DynamicModelType = TypeVar('DynamicModelType')
 DynamicModelSerializerType = TypeVar('DynamicModelSerializerType')
 
+dynamic_model_cache = DynamicModelCache(max_size=getattr(settings, 'DYNAMIC_MODELS_CACHE_SIZE', 128))
+schema_change_listener = SchemaChangeListener(dynamic_model_cache)
+
 
 class DynamicModelService:
     FIELDS_MAP: Dict[str, Type[models.Field]] = {
         'string': models.TextField,
         'number': models.FloatField,
         'boolean': models.BooleanField,
+        'integer': models.IntegerField,
+        'bigint': models.BigIntegerField,
+        'smallint': models.SmallIntegerField,
+        'decimal': models.DecimalField,
+        'varchar': models.CharField,
+        'date': models.DateField,
+        'timestamp': models.DateTimeField,
+        'uuid': models.UUIDField,
+    }
+    # Options of a field definition, and the field types requiring them
+    FIELD_OPTIONS: Dict[str, List[str]] = {
+        'varchar': ['length'],
+        'decimal': ['precision', 'scale'],
     }
+    # Groups of field types whose values the database can cast to each other
+    CONVERSION_GROUPS: List[List[str]] = [
+        ['string', 'varchar'],
+        ['number', 'integer', 'bigint', 'smallint', 'decimal'],
+        ['boolean', 'integer'],
+        ['date', 'timestamp'],
+    ]
+    # Template of the schema editor for unique indexes built concurrently, which Django does not provide
+    SQL_CREATE_UNIQUE_INDEX_CONCURRENTLY = (
+        'CREATE UNIQUE INDEX CONCURRENTLY %(name)s ON %(table)s%(using)s '
+        '(%(columns)s)%(include)s%(extra)s%(condition)s'
+    )
 
     @staticmethod
     def get_choices() -> List[str]:
         """Return a list of available field choices."""
         return list(DynamicModelService.FIELDS_MAP.keys())
 
+    @staticmethod
+    def can_convert(from_type: str, to_type: str) -> bool:
+        """
+        Return whether the values of a field can be converted from one
+        type to another. Every type can be converted to and from text,
+        which fails for text values not written like the other type.
+        """
+        text_types = DynamicModelService.CONVERSION_GROUPS[0]
+        return from_type == to_type or from_type in text_types or to_type in text_types or any(
+            from_type in group and to_type in group for group in DynamicModelService.CONVERSION_GROUPS
+        )
+
+    @staticmethod
+    def prepare_field(field: Dict[str, Any]) -> models.Field:
+        """Prepare the model field of a field definition, with its options."""
+        kwargs: Dict[str, Any] = {}
+        if field['type'] == 'varchar':
+            kwargs['max_length'] = field['length']
+        elif field['type'] == 'decimal':
+            kwargs.update(max_digits=field['precision'], decimal_places=field['scale'])
+        if field.get('null'):
+            kwargs['null'] = True
+        model_field = DynamicModelService.FIELDS_MAP[field['type']](**kwargs)
+        if field.get('default') is not None:
+            default = model_field.to_python(field['default'])
+            if isinstance(model_field, models.DateTimeField) and timezone.is_naive(default):
+                default = timezone.make_aware(default)
+            model_field.default = default
+        return model_field
+
     @staticmethod
     def prepare_table_name(model_instance: DynamicModel) -> str:
         """
@@ -36,6 +118,24 @@ class DynamicModelService:
         """
         return f'dynamic_{model_instance.name.lower()}'
 
+    @staticmethod
+    def get_schema_fingerprint(model_instance: DynamicModel) -> str:
+        """
+        Return a fingerprint of the model instance definition. Classes
+        built from definitions with the same fingerprint are interchangeable.
+        """
+        definition = json.dumps({
+            'name': model_instance.name,
+            'fields': model_instance.fields,
+            'indexes': model_instance.indexes,
+            'partitioning': DynamicPartitionService.get_partitioning(model_instance),
+            'change_tracking': DynamicChangeService.is_tracked(model_instance),
+            'rollups': model_instance.rollups,
+            # Indexes whose build failed are left out of the class
+            'index_errors': sorted(model_instance.index_errors),
+        }, sort_keys=True)
+        return hashlib.sha1(definition.encode()).hexdigest()
+
     @staticmethod
     def prepare_fields(model_instance: DynamicModel) -> Dict[str, models.Field]:
         """
@@ -45,10 +145,12 @@ class DynamicModelService:
         model_fields: Dict[str, models.Field] = dict()
 
         for field in model_instance.fields:
-            field_type = field['type']
-            field_class = DynamicModelService.FIELDS_MAP.get(field_type)
-            if field_class:
-                model_fields[field['name']] = field_class()
+            if field['type'] in DynamicModelService.FIELDS_MAP:
+                model_fields[field['name']] = DynamicModelService.prepare_field(field)
+        if DynamicPartitionService.uses_created_at(model_instance):
+            model_fields[DynamicPartitionService.CREATED_AT] = DynamicPartitionService.prepare_created_at_field()
+        if DynamicChangeService.is_tracked(model_instance):
+            model_fields[DynamicChangeService.CHANGE_SEQ] = DynamicChangeService.prepare_change_seq_field()
 
         # Setting the attributes for each field based on its name is
         # necessary to ensure that the field behaves correctly within
@@ -58,29 +160,88 @@ class DynamicModelService:
 
         return model_fields
 
+    @staticmethod
+    def prepare_index_name(model_instance: DynamicModel, index: Dict[str, Any]) -> str:
+        """
+        Prepare a name for an index declared without one. The name is
+        derived from the table name and the index definition, so it only
+        changes when the definition changes.
+        """
+        table_name = DynamicModelService.prepare_table_name(model_instance)
+        definition = json.dumps({'table': table_name, **index}, sort_keys=True)
+        digest = hashlib.sha1(definition.encode()).hexdigest()
+        suffix = 'uniq' if index.get('unique') else 'idx'
+        return f'{table_name[:15]}_{digest[:9]}_{suffix}'
+
+    @staticmethod
+    def prepare_indexes(
+            model_instance: DynamicModel,
+            model_fields: Optional[Dict[str, models.Field]] = None
+    ) -> List[DynamicIndexType]:
+        """
+        Prepare the indexes and unique constraints for the dynamic model
+        based on the index definitions in the model instance, and the
+        trigram indexes of the fields marked with `trigram`. Indexes whose
+        build failed do not exist in the table and are left out.
+        """
+        if model_fields is None:
+            model_fields = DynamicModelService.prepare_fields(model_instance)
+        rows_filter = DynamicRowsFilter.for_fields(model_fields)
+
+        prepared_indexes: List[DynamicIndexType] = []
+        for index in model_instance.indexes:
+            name = index.get('name') or DynamicModelService.prepare_index_name(model_instance, index)
+            if name in model_instance.index_errors:
+                continue
+            condition = rows_filter.build_q(index['condition']) if index.get('condition') else None
+            if index.get('unique'):
+                prepared_indexes.append(models.UniqueConstraint(fields=index['fields'], name=name, condition=condition))
+            else:
+                prepared_indexes.append(models.Index(fields=index['fields'], name=name, condition=condition))
+        table_name = DynamicModelService.prepare_table_name(model_instance)
+        for name in DynamicSearchService.get_trigram_fields(model_instance):
+            prepared_indexes.append(DynamicSearchService.prepare_trigram_index(table_name, name))
+        return prepared_indexes
+
     @staticmethod
     def create_model_class(model_instance: DynamicModel) -> DynamicModelType:
         """
-        Create a dynamic model class based on the model instance.
+        Create a dynamic model class based on the model instance, replacing
+        the class registered for it in the registry of generated models.
         """
         table_name = DynamicModelService.prepare_table_name(model_instance)
         model_fields = DynamicModelService.prepare_fields(model_instance)
+        model_indexes = DynamicModelService.prepare_indexes(model_instance, model_fields)
 
-        model_meta = type('Meta', (), {'db_table': table_name})
+        model_meta = type('Meta', (), {
+            'apps': registry,
+            'app_label': registry.APP_LABEL,
+            'db_table': table_name,
+            'indexes': [index for index in model_indexes if isinstance(index, models.Index)],
+            'constraints': [index for index in model_indexes if isinstance(index, models.UniqueConstraint)],
+        })
         model_class = type(model_instance.name, (models.Model,), {
             '__module__': 'core.runtime_generated',
             'Meta': model_meta,
+            '_schema_fingerprint': DynamicModelService.get_schema_fingerprint(model_instance),
+            '_dynamic_database': DynamicDatabaseService.get_database(model_instance),
+            '_search_fields': DynamicSearchService.get_search_fields(model_instance),
+            '_rollups': DynamicRollupService.create_rollup_classes(model_instance, table_name, model_fields),
             **model_fields
         })
 
         return model_class
 
     @staticmethod
-    def create_serializer_class(model_instance: DynamicModel) -> DynamicModelSerializerType:
+    def create_serializer_class(
+            model_instance: DynamicModel,
+            model_class: Optional[DynamicModelType] = None
+    ) -> DynamicModelSerializerType:
         """
         Create a serializer class for the dynamic model based on the model instance.
         """
-        model_class = DynamicModelService.get_or_create_model_class(model_instance)
+        if model_class is None:
+            model_class = DynamicModelService.get_or_create_model_class(model_instance)
 
         serializer_meta = type('Meta', (), {
             'model': model_class,
@@ -93,70 +254,333 @@ class DynamicModelService:
 
         return serializer_class
 
+    @staticmethod
+    def warm_serializer_class(serializer_class: DynamicModelSerializerType) -> DynamicModelSerializerType:
+        """
+        Return a subclass of the serializer class that reuses the fields and
+        validators introspected from the model once, instead of building
+        them again on every instantiation.
+
+        The serialized fields can be limited with the `fields` list
+        of the serializer context.
+        """
+        prototype = serializer_class()
+        prepared_fields = prototype.get_fields()
+        prepared_validators = prototype.get_validators()
+
+        def get_fields(self):
+            field_names = self.context.get('fields')
+            if field_names is None:
+                return copy.deepcopy(prepared_fields)
+            return {name: copy.deepcopy(prepared_fields[name]) for name in field_names}
+
+        def get_validators(self):
+            return list(prepared_validators)
+
+        return type(serializer_class.__name__, (serializer_class,), {
+            '__module__': 'core.runtime_generated',
+            'get_fields': get_fields,
+            'get_validators': get_validators,
+        })
+
+    @staticmethod
+    def get_cached_classes(model_instance: DynamicModel) -> DynamicModelCacheEntry:
+        """
+        Return the model class, the warmed serializer class and the row
+        encoder for the model instance, building and caching them on the first access and after
+        every change of the instance definition.
+        """
+        fingerprint = DynamicModelService.get_schema_fingerprint(model_instance)
+        entry = dynamic_model_cache.get(model_instance.pk, fingerprint)
+        if entry is not None:
+            return entry._replace(model_instance=model_instance)
+
+        with dynamic_model_cache.lock, DynamicInstrumentation.phase('classes'):
+            entry = dynamic_model_cache.get(model_instance.pk, fingerprint)
+            if entry is not None:
+                return entry
+
+            model_class = DynamicModelService.get_model_class(model_instance)
+            serializer_class = DynamicModelService.warm_serializer_class(
+                DynamicModelService.create_serializer_class(model_instance, model_class)
+            )
+            entry = DynamicModelCacheEntry(
+                model_instance=model_instance,
+                fingerprint=fingerprint,
+                model_class=model_class,
+                serializer_class=serializer_class,
+                row_encoder=DynamicRowsEncoder(model_class),
+            )
+            dynamic_model_cache.set(entry)
+        return entry
+
+    @staticmethod
+    def get_cached_entry(pk) -> Optional[DynamicModelCacheEntry]:
+        """
+        Return the cached classes of the dynamic model with the given pk
+        without touching the database, or None when they are not cached or
+        when the cache is not kept in sync with other processes. The data
+        version and row count of the cached model instance are not kept up
+        to date, so they are read by the endpoints needing them.
+        """
+        if not schema_change_listener.ensure_started():
+            return None
+        try:
+            return dynamic_model_cache.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
     @staticmethod
     def get_or_create_model_class(model_instance: DynamicModel) -> DynamicModelType:
         """
         Get or create a model class for the dynamic model based on the
         model instance.
         """
-        try:
-            model_class = apps.get_model(app_label='core', model_name=model_instance.name)
-        except LookupError:
+        model_class = registry.get_model_class(model_instance.name)
+        if model_class is None:
             model_class = DynamicModelService.create_model_class(model_instance)
         return model_class
 
     @staticmethod
-    def prepare_existing_models_on_ready() -> None:
+    def get_model_class(model_instance: DynamicModel) -> DynamicModelType:
+        """
+        Get the model class for the current definition of the model
+        instance, creating it on the first access and when the registered
+        class was built from an outdated definition.
+        """
+        model_class = DynamicModelService.get_or_create_model_class(model_instance)
+        if getattr(model_class, '_schema_fingerprint', None) != DynamicModelService.get_schema_fingerprint(model_instance):
+            model_class = DynamicModelService.create_model_class(model_instance)
+        return model_class
+
+    @staticmethod
+    def prepare_existing_models_on_ready(names: List[str]) -> None:
         """
         This method is intended to be used in the `ready` method of
         the `CoreConfig` class in the app's AppConfig.
 
-        It creates model classes for all existing DynamicModel
-        instances on start or restart of the application.
+        Model classes are created on first access, this method prepares
+        the classes of the named dynamic models ahead of time. Nothing is
+        prepared while the core migrations are not applied yet.
         """
-        for model_instance in DynamicModel.objects.all():
-            DynamicModelService.create_model_class(model_instance)
+        try:
+            model_instances = list(DynamicModel.objects.filter(name__in=names))
+        except DatabaseError:
+            return
+        for model_instance in model_instances:
+            DynamicModelService.get_cached_classes(model_instance)
 
     @staticmethod
     def create_table_for_model(model_instance: DynamicModel) -> None:
         """
-        Create a database table for the dynamic model.
+        Create a database table for the dynamic model in the database it is
+        placed on, partitioned as declared by the partitioning of the model
+        instance, with the triggers tracking its changes and the search
+        column when enabled, and the empty tables of its rollups.
         """
         prepared_model = DynamicModelService.create_model_class(model_instance)
+        DynamicInstrumentation.set_table(prepared_model._meta.db_table)
 
-        with connection.schema_editor() as schema_editor:
-            schema_editor.create_model(prepared_model)
+        partitioning = DynamicPartitionService.get_partitioning(model_instance)
+        connection = connections[DynamicDatabaseService.get_database(model_instance)]
+        with DynamicInstrumentation.phase('schema'), connection.schema_editor() as schema_editor:
+            if DynamicSearchService.get_trigram_fields(model_instance):
+                DynamicSearchService.create_extension(schema_editor)
+            if partitioning is None:
+                schema_editor.create_model(prepared_model)
+            else:
+                DynamicPartitionService.create_table(schema_editor, prepared_model, partitioning)
+            if DynamicChangeService.is_tracked(model_instance):
+                DynamicChangeService.create_tracking(schema_editor, prepared_model, partitioned=partitioning is not None)
+            if prepared_model._search_fields:
+                DynamicSearchService.add_search(schema_editor, prepared_model._meta.db_table, prepared_model._search_fields)
+            for rollup_class in prepared_model._rollups.values():
+                schema_editor.create_model(rollup_class)
+        dynamic_model_cache.invalidate(model_instance.pk)
 
     @staticmethod
-    def update_table_for_model(model_instance: DynamicModel) -> None:
+    def get_existing_model_class(
+            model_instance: DynamicModel,
+            previous_instance: Optional[DynamicModel] = None
+    ) -> DynamicModelType:
+        """
+        Get a model class matching the table of the dynamic model as it
+        exists in the database, before the changes in the model instance.
+
+        The previous state of the model instance should be given when the
+        instance was already saved with the changes. Otherwise the registered
+        class is used, or the stored definition when no class is registered.
+        """
+        if previous_instance is None:
+            model_class = registry.get_model_class(model_instance.name)
+            if model_class is not None:
+                return model_class
+            previous_instance = DynamicModel.objects.get(pk=model_instance.pk)
+        return DynamicModelService.get_model_class(previous_instance)
+
+    @staticmethod
+    def plan_table_update(
+            model_instance: DynamicModel,
+            previous_instance: Optional[DynamicModel] = None
+    ) -> DynamicSchemaDiff:
+        """
+        Compute the changes of the database table schema needed for
+        the changes in the model instance, without applying them.
+        """
+        model_class = DynamicModelService.get_existing_model_class(model_instance, previous_instance)
+        updated_fields = DynamicModelService.prepare_fields(model_instance)
+        updated_indexes = DynamicModelService.prepare_indexes(model_instance, updated_fields)
+        return DynamicSchemaDiff(
+            model_class, updated_fields, updated_indexes,
+            using=DynamicDatabaseService.get_database(model_instance),
+            updated_search_fields=DynamicSearchService.get_search_fields(model_instance),
+        )
+
+    @staticmethod
+    def update_table_for_model(model_instance: DynamicModel, previous_instance: Optional[DynamicModel] = None) -> None:
         """
         Update the database table schema for a dynamic model based
         on the changes in the model instance.
+
+        The changes are applied in one transaction. A change the existing
+        rows can not be converted for fails the whole update instead of
+        dropping the data of the column. Rollups that were added or changed
+        are then filled from the rows of the updated table.
         """
-        model_class = apps.get_model(app_label='core', model_name=model_instance.name)
-        existing_fields = {field.name: field for field in model_class._meta.get_fields()}
-        updated_fields = DynamicModelService.prepare_fields(model_instance)
-        existing_keys = set(existing_fields.keys())
-        updated_keys = set(updated_fields.keys())
-
-        fields_to_remove = existing_keys - updated_keys
-        fields_to_add = updated_keys - existing_keys
-        fields_to_alter = existing_keys & updated_keys
-
-        with connection.schema_editor() as schema_editor:
-            for field_name in fields_to_remove:
-                schema_editor.remove_field(model_class, existing_fields[field_name])
-            for field_name in fields_to_add:
-                schema_editor.add_field(model_class, updated_fields[field_name])
-            for field_name in fields_to_alter:
-                try:
-                    schema_editor.alter_field(model_class, existing_fields[field_name], updated_fields[field_name])
-                except DataError:
-                    # If altering the field causes a DataError,
-                    # remove the field and add the updated field instead
-                    schema_editor.remove_field(model_class, existing_fields[field_name])
-                    schema_editor.add_field(model_class, updated_fields[field_name])
-        # Clear the app registry cache to reflect the changes
-        apps.clear_cache()
+        schema_diff = DynamicModelService.plan_table_update(model_instance, previous_instance)
+        DynamicInstrumentation.set_table(schema_diff.model_class._meta.db_table)
+        try:
+            with DynamicInstrumentation.phase('schema'), schema_diff.connection.schema_editor() as schema_editor:
+                schema_diff.apply(schema_editor)
+        except DatabaseError as error:
+            raise serializers.ValidationError({'fields': [f'The table could not be updated: {error}']})
         # Create the updated model class based on the model instance
-        DynamicModelService.create_model_class(model_instance)
+        updated_model_class = DynamicModelService.create_model_class(model_instance)
+        with DynamicInstrumentation.phase('schema'), schema_diff.connection.schema_editor() as schema_editor:
+            DynamicRollupService.update_tables(schema_editor, schema_diff.model_class, updated_model_class)
+        dynamic_model_cache.invalidate(model_instance.pk)
+        DynamicModelService.bump_schema_version(model_instance)
+
+        indexes_to_add = schema_diff.indexes_to_add
+        if indexes_to_add:
+            # Building an index scans the whole table, on PostgreSQL it is
+            # built concurrently once the schema changes are committed
+            transaction.on_commit(
+                lambda: DynamicModelService.create_indexes(model_instance, updated_model_class, indexes_to_add),
+                using=schema_diff.connection.alias,
+            )
+
+    @staticmethod
+    def create_indexes(model_instance: DynamicModel, model_class: DynamicModelType, indexes: List[DynamicIndexType]) -> None:
+        """
+        Create indexes and unique constraints on the table of an existing
+        dynamic model. On PostgreSQL, outside a transaction, they are built
+        with CREATE INDEX CONCURRENTLY so the table stays readable and
+        writable. Indexes that cannot be built are recorded with their
+        error in the `index_errors` of the model instance, and left out of
+        its generated class until an update of the model builds them again.
+        """
+        using = DynamicDatabaseService.get_database(model_instance)
+        connection = connections[using]
+        # Indexes of partitioned tables cannot be built concurrently
+        concurrently = (
+            connection.vendor == 'postgresql'
+            and not connection.in_atomic_block
+            and DynamicPartitionService.get_partitioning(model_instance) is None
+        )
+        failed_indexes = {}
+        with connection.schema_editor(atomic=not concurrently) as schema_editor:
+            if DynamicSearchService.get_trigram_fields(model_instance):
+                DynamicSearchService.create_extension(schema_editor)
+            for index in indexes:
+                try:
+                    with contextlib.nullcontext() if concurrently else transaction.atomic(using=using):
+                        if concurrently:
+                            DynamicModelService.create_index_concurrently(schema_editor, model_class, index)
+                        elif isinstance(index, models.Index):
+                            schema_editor.add_index(model_class, index)
+                        else:
+                            schema_editor.add_constraint(model_class, index)
+                except DatabaseError as error:
+                    if concurrently:
+                        # A failed concurrent build leaves an invalid index behind
+                        schema_editor.execute(schema_editor.sql_delete_index_concurrently % {
+                            'name': schema_editor.quote_name(index.name)
+                        }, params=None)
+                    failed_indexes[index.name] = str(error).strip()
+
+        if failed_indexes:
+            model_instance.index_errors = {**model_instance.index_errors, **failed_indexes}
+            DynamicModel.objects.filter(pk=model_instance.pk).update(index_errors=model_instance.index_errors)
+            DynamicModelService.create_model_class(model_instance)
+            dynamic_model_cache.invalidate(model_instance.pk)
+            DynamicModelService.bump_schema_version(model_instance)
+
+    @staticmethod
+    def list_indexes(model_instance: DynamicModel) -> List[Dict[str, Any]]:
+        """
+        List the declared indexes of the dynamic model with their name and
+        the status of their build: `ready`, `building` while it is not
+        usable yet, or `failed` with its error.
+        """
+        table_name = DynamicModelService.prepare_table_name(model_instance)
+        connection = connections[DynamicDatabaseService.get_database(model_instance)]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # An index built concurrently is listed before it is valid
+                cursor.execute(
+                    'SELECT index_class.relname, pg_index.indisvalid FROM pg_index '
+                    'JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid '
+                    'WHERE pg_index.indrelid = %s::regclass',
+                    [connection.ops.quote_name(table_name)],
+                )
+                valid_indexes = {name for name, valid in cursor.fetchall() if valid}
+            else:
+                valid_indexes = set(connection.introspection.get_constraints(cursor, table_name))
+
+        indexes = []
+        for index in model_instance.indexes:
+            name = index.get('name') or DynamicModelService.prepare_index_name(model_instance, index)
+            if name in model_instance.index_errors:
+                status = {'status': 'failed', 'error': model_instance.index_errors[name]}
+            elif name in valid_indexes:
+                status = {'status': 'ready', 'error': None}
+            else:
+                status = {'status': 'building', 'error': None}
+            indexes.append({**index, 'name': name, **status})
+        return indexes
+
+    @staticmethod
+    def create_index_concurrently(schema_editor, model_class: DynamicModelType, index: DynamicIndexType) -> None:
+        """
+        Build the index or unique constraint with CREATE INDEX CONCURRENTLY.
+        Unconditional unique constraints are then attached to the built index.
+        """
+        if isinstance(index, models.Index):
+            schema_editor.add_index(model_class, index, concurrently=True)
+            return
+
+        statement = models.Index(fields=index.fields, name=index.name, condition=index.condition).create_sql(
+            model_class, schema_editor, sql=DynamicModelService.SQL_CREATE_UNIQUE_INDEX_CONCURRENTLY
+        )
+        schema_editor.execute(statement, params=None)
+        if index.condition is None:
+            schema_editor.execute('ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}'.format(
+                table=schema_editor.quote_name(model_class._meta.db_table),
+                name=schema_editor.quote_name(index.name),
+            ), params=None)
+
+    @staticmethod
+    def bump_schema_version(model_instance: DynamicModel) -> None:
+        """
+        Increment the schema version and the data version of the model
+        instance and notify the other processes, so they rebuild their
+        generated classes.
+        """
+        DynamicModel.objects.filter(pk=model_instance.pk).update(
+            schema_version=F('schema_version') + 1,
+            data_version=F('data_version') + 1,
+            data_modified_at=Now(),
+        )
+        model_instance.refresh_from_db(fields=['schema_version', 'data_version', 'data_modified_at'])
+        SchemaChangeListener.notify(model_instance)
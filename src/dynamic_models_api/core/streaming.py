@@ -0,0 +1,108 @@
+from itertools import islice
+from typing import AsyncIterator
+from typing import Iterable
+from typing import Iterator
+from typing import Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+from core.encoders import DynamicRowsEncoder
+
+
+class DynamicRowsStream:
+    """
+    Streams dynamic model rows straight from a server-side cursor, so
+    the memory usage does not depend on the size of the table.
+    """
+    CONTENT_TYPES = {
+        'ndjson': 'application/x-ndjson',
+        'json': 'application/json',
+    }
+
+    @staticmethod
+    def get_formats() -> Iterable[str]:
+        """Return the supported stream formats."""
+        return DynamicRowsStream.CONTENT_TYPES.keys()
+
+    @staticmethod
+    def iterate_encoded_rows(encoder: DynamicRowsEncoder, queryset: QuerySet, columns: Sequence[str]) -> Iterator[bytes]:
+        """Yield every row of the queryset, read as tuples of the columns, encoded as a JSON object."""
+        chunk_size = getattr(settings, 'DYNAMIC_MODELS_ROWS_CHUNK_SIZE', 2000)
+        return encoder.iterate_encoded_rows(queryset.iterator(chunk_size=chunk_size), columns)
+
+    @staticmethod
+    def iterate_ndjson(encoder: DynamicRowsEncoder, queryset: QuerySet, columns: Sequence[str]) -> Iterator[bytes]:
+        for row in DynamicRowsStream.iterate_encoded_rows(encoder, queryset, columns):
+            yield row + b'\n'
+
+    @staticmethod
+    def iterate_json(encoder: DynamicRowsEncoder, queryset: QuerySet, columns: Sequence[str]) -> Iterator[bytes]:
+        separator = b'['
+        for row in DynamicRowsStream.iterate_encoded_rows(encoder, queryset, columns):
+            yield separator + row
+            separator = b','
+        yield b'[]' if separator == b'[' else b']'
+
+    @staticmethod
+    async def aiterate_encoded_rows(
+            encoder: DynamicRowsEncoder,
+            queryset: QuerySet,
+            columns: Sequence[str]
+    ) -> AsyncIterator[bytes]:
+        """
+        Async version of `iterate_encoded_rows`, fetching and encoding the
+        rows one chunk at a time.
+
+        The `aiterator()` of Django 4.2 runs the query of `values_list()`
+        querysets in the event loop, so the server-side cursor is driven
+        with `sync_to_async` instead, in the thread holding the connection.
+        """
+        chunk_size = getattr(settings, 'DYNAMIC_MODELS_ROWS_CHUNK_SIZE', 2000)
+        rows = await sync_to_async(lambda: iter(queryset.iterator(chunk_size=chunk_size)))()
+        while chunk := await sync_to_async(lambda: list(islice(rows, chunk_size)))():
+            for encoded_row in encoder.iterate_encoded_rows(chunk, columns):
+                yield encoded_row
+
+    @staticmethod
+    async def aiterate_ndjson(encoder: DynamicRowsEncoder, queryset: QuerySet, columns: Sequence[str]) -> AsyncIterator[bytes]:
+        async for row in DynamicRowsStream.aiterate_encoded_rows(encoder, queryset, columns):
+            yield row + b'\n'
+
+    @staticmethod
+    async def aiterate_json(encoder: DynamicRowsEncoder, queryset: QuerySet, columns: Sequence[str]) -> AsyncIterator[bytes]:
+        separator = b'['
+        async for row in DynamicRowsStream.aiterate_encoded_rows(encoder, queryset, columns):
+            yield separator + row
+            separator = b','
+        yield b'[]' if separator == b'[' else b']'
+
+    @staticmethod
+    def create_response(
+            encoder: DynamicRowsEncoder,
+            queryset: QuerySet,
+            columns: Sequence[str],
+            stream_format: str,
+            asynchronous: bool = False
+    ) -> StreamingHttpResponse:
+        """
+        Create a streaming response with the rows of the queryset in
+        the given format, either `ndjson` or a `json` array. The rows of
+        an asynchronous response are read with the async ORM.
+        """
+        if asynchronous:
+            iterate = {
+                'ndjson': DynamicRowsStream.aiterate_ndjson,
+                'json': DynamicRowsStream.aiterate_json,
+            }[stream_format]
+        else:
+            iterate = {
+                'ndjson': DynamicRowsStream.iterate_ndjson,
+                'json': DynamicRowsStream.iterate_json,
+            }[stream_format]
+        return StreamingHttpResponse(
+            iterate(encoder, queryset, columns),
+            content_type=DynamicRowsStream.CONTENT_TYPES[stream_format]
+        )
@@ -1,10 +1,60 @@
+import copy
+import datetime
+import decimal
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management import CommandError
+from django.core.management import call_command
 from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.db import DatabaseError
+from django.db import connection
+from django.db import connections
+from django.db import router
 from django.db import models
 from django.apps import apps
 from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework.test import APITransactionTestCase
 
+from core.benchmarks import DynamicModelBenchmark
+from core.cache import DynamicModelCache
+from core.cache import DynamicModelCacheEntry
+from core.changes import DynamicChangeService
+from core.conditional import DynamicDataVersion
+from core.conditional import DynamicDataVersionService
+from core.encoders import DynamicRowsEncoder
+from core.export import DynamicRowsExport
+from core.field_migrations import DynamicFieldMigrationService
+from core.filters import DynamicRowsFilter
+from core.instrumentation import DynamicInstrumentation
+from core.instrumentation import metrics_registry
+from core.models import DynamicDataDelta
+from core.models import DynamicFieldMigration
 from core.models import DynamicModel
+from core.partitions import DynamicPartitionService
+from core.routing import DynamicDatabaseService
+from core.routing import DynamicModelRouter
+from core.runtime_generated import DynamicModelRegistry
+from core.runtime_generated import registry
+from core.schema_sync import SchemaChangeListener
+from core.search import DynamicSearchService
+from core.serializers import DynamicModelSerializer
 from core.services import DynamicModelService
+from core.services import dynamic_model_cache
+from core.services import schema_change_listener
+from core.views import DynamicModelViewSet
 
 
 class DynamicModelServiceTestCase(TestCase):
@@ -18,9 +68,18 @@ class DynamicModelServiceTestCase(TestCase):
 
     def test_get_choices(self):
         choices = DynamicModelService.get_choices()
-        expected_choices = ['string', 'number', 'boolean']
+        expected_choices = ['string', 'number', 'boolean', 'integer', 'bigint', 'smallint', 'decimal', 'varchar', 'date', 'timestamp', 'uuid']
         self.assertEqual(choices, expected_choices)
 
+    def test_prepare_field_options(self):
+        field = DynamicModelService.prepare_field({'name': 'code', 'type': 'varchar', 'length': 12, 'null': True})
+        self.assertEqual((field.max_length, field.null), (12, True))
+        field = DynamicModelService.prepare_field({'name': 'price', 'type': 'decimal', 'precision': 8, 'scale': 2, 'default': '1.5'})
+        self.assertEqual((field.max_digits, field.decimal_places, field.default), (8, 2, decimal.Decimal('1.5')))
+        self.assertTrue(DynamicModelService.can_convert('number', 'smallint'))
+        self.assertTrue(DynamicModelService.can_convert('uuid', 'varchar'))
+        self.assertFalse(DynamicModelService.can_convert('date', 'boolean'))
+
     def test_prepare_table_name(self):
         table_name = DynamicModelService.prepare_table_name(self.model_instance)
         expected_table_name = 'dynamic_testmodel'
@@ -76,7 +135,7 @@ class DynamicModelServiceTestCase(TestCase):
         DynamicModelService.update_table_for_model(self.model_instance)
 
         # Check if the field has been removed from the table
-        model_class = apps.get_model(app_label='core', model_name='TestModel')
+        model_class = registry.get_model_class('TestModel')
         field_names = [field.name for field in model_class._meta.get_fields()]
         self.assertNotIn('string_field', field_names)
 
@@ -89,7 +148,7 @@ class DynamicModelServiceTestCase(TestCase):
         DynamicModelService.update_table_for_model(self.model_instance)
 
         # Check if the new field has been added to the table
-        model_class = apps.get_model(app_label='core', model_name='TestModel')
+        model_class = registry.get_model_class('TestModel')
         field_names = [field.name for field in model_class._meta.get_fields()]
         self.assertIn('new_field', field_names)
 
@@ -102,8 +161,1424 @@ class DynamicModelServiceTestCase(TestCase):
         DynamicModelService.update_table_for_model(self.model_instance)
 
         # Check if the field name has been updated in the table
-        model_class = apps.get_model(app_label='core', model_name='TestModel')
+        model_class = registry.get_model_class('TestModel')
         self.assertEquals(
             model_class.number_field.field.__class__,
             DynamicModelService.FIELDS_MAP['string']
         )
+
+    def test_update_table_for_model_combines_changes(self):
+        DynamicModelService.create_table_for_model(self.model_instance)
+
+        self.model_instance.fields = [
+            {'name': 'number_field', 'type': 'string'},
+            {'name': 'boolean_field', 'type': 'boolean'},
+            {'name': 'new_field', 'type': 'string'},
+        ]
+        statements = DynamicModelService.plan_table_update(self.model_instance).get_statements()
+        alter_statements = [statement for statement in statements if 'DROP COLUMN' in statement]
+        self.assertEqual(len(alter_statements), 1)
+        self.assertIn('ADD COLUMN "new_field"', alter_statements[0])
+        self.assertIn('ALTER COLUMN "number_field" TYPE', alter_statements[0])
+
+        DynamicModelService.update_table_for_model(self.model_instance)
+        model_class = registry.get_model_class('TestModel')
+        self.assertEqual(
+            [field.name for field in model_class._meta.concrete_fields],
+            ['id', 'number_field', 'boolean_field', 'new_field']
+        )
+
+    def test_update_table_for_model_keeps_unconvertible_data(self):
+        DynamicModelService.create_table_for_model(self.model_instance)
+        model_class = DynamicModelService.get_model_class(self.model_instance)
+        model_class.objects.create(string_field='not a number', number_field=1, boolean_field=True)
+
+        previous_instance = copy.deepcopy(self.model_instance)
+        self.model_instance.fields[0]['type'] = 'number'
+        with self.assertRaises(serializers.ValidationError):
+            DynamicModelService.update_table_for_model(self.model_instance, previous_instance)
+
+        self.assertEqual(model_class.objects.get().string_field, 'not a number')
+
+
+class DynamicModelCacheTestCase(TestCase):
+    def setUp(self):
+        dynamic_model_cache.clear()
+        self.model_instance = DynamicModel.objects.create(name='CachedModel', fields=[
+            {'name': 'title', 'type': 'string'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+
+    def test_get_cached_classes_reuses_entry(self):
+        entry = DynamicModelService.get_cached_classes(self.model_instance)
+        model_instance = DynamicModel.objects.get(pk=self.model_instance.pk)
+        cached_entry = DynamicModelService.get_cached_classes(model_instance)
+        self.assertIs(cached_entry.model_class, entry.model_class)
+        self.assertIs(cached_entry.serializer_class, entry.serializer_class)
+        self.assertIs(cached_entry.model_instance, model_instance)
+        self.assertEqual(entry.model_class._meta.db_table, 'dynamic_cachedmodel')
+        self.assertEqual(entry.serializer_class.Meta.fields, '__all__')
+
+    def test_warmed_serializer_fields(self):
+        serializer_class = DynamicModelService.get_cached_classes(self.model_instance).serializer_class
+        first, second = serializer_class(), serializer_class()
+        self.assertCountEqual(first.fields.keys(), ['id', 'title'])
+        self.assertIsNot(first.fields['title'], second.fields['title'])
+
+    def test_definition_change_rebuilds_entry(self):
+        entry = DynamicModelService.get_cached_classes(self.model_instance)
+        self.model_instance.fields.append({'name': 'price', 'type': 'number'})
+        DynamicModelService.update_table_for_model(self.model_instance)
+
+        updated_entry = DynamicModelService.get_cached_classes(self.model_instance)
+        self.assertIsNot(updated_entry, entry)
+        field_names = [field.name for field in updated_entry.model_class._meta.get_fields()]
+        self.assertIn('price', field_names)
+
+    def test_lru_eviction(self):
+        cache = DynamicModelCache(max_size=2)
+        entries = [
+            DynamicModelCacheEntry(DynamicModel(pk=pk, name=f'Model{pk}'), 'fingerprint', None, None)
+            for pk in range(3)
+        ]
+        for entry in entries[:2]:
+            cache.set(entry)
+        cache.get(0)
+        cache.set(entries[2])
+
+        self.assertIsNone(cache.get(1))
+        self.assertIs(cache.get(0), entries[0])
+        self.assertIsNone(cache.get(0, 'other'))
+
+
+class SchemaChangeListenerTestCase(TestCase):
+    def setUp(self):
+        dynamic_model_cache.clear()
+        self.listener = SchemaChangeListener(dynamic_model_cache)
+        self.model_instance = DynamicModel.objects.create(name='SyncedModel', fields=[
+            {'name': 'title', 'type': 'string'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+
+    def test_update_table_for_model_bumps_schema_version(self):
+        self.model_instance.fields.append({'name': 'price', 'type': 'number'})
+        DynamicModelService.update_table_for_model(self.model_instance)
+
+        self.assertEqual(self.model_instance.schema_version, 2)
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.schema_version, 2)
+
+    def test_handle_payload_invalidates_outdated_entry(self):
+        DynamicModelService.get_cached_classes(self.model_instance)
+
+        self.listener.handle_payload(f'{self.model_instance.pk}:1')
+        self.assertIsNotNone(dynamic_model_cache.get(self.model_instance.pk))
+
+        self.listener.handle_payload(f'{self.model_instance.pk}:2')
+        self.assertIsNone(dynamic_model_cache.get(self.model_instance.pk))
+
+    def test_poll_invalidates_outdated_entry(self):
+        DynamicModelService.get_cached_classes(self.model_instance)
+        DynamicModel.objects.filter(pk=self.model_instance.pk).update(schema_version=5)
+
+        self.listener.poll()
+        self.assertIsNone(dynamic_model_cache.get(self.model_instance.pk))
+
+    def test_get_cached_entry_skips_database(self):
+        entry = DynamicModelService.get_cached_classes(self.model_instance)
+        with mock.patch.object(schema_change_listener, 'ensure_started', return_value=True):
+            with self.assertNumQueries(0):
+                self.assertIs(DynamicModelService.get_cached_entry(self.model_instance.pk), entry)
+
+    @override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+    def test_get_cached_entry_requires_schema_sync(self):
+        DynamicModelService.get_cached_classes(self.model_instance)
+        self.assertIsNone(DynamicModelService.get_cached_entry(self.model_instance.pk))
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class DynamicModelRowsViewTestCase(APITestCase):
+    def setUp(self):
+        self.model_instance = DynamicModel.objects.create(name='ViewModel', fields=[
+            {'name': 'title', 'type': 'string'},
+            {'name': 'price', 'type': 'number'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+        self.rows_url = f'/api/table/{self.model_instance.pk}/rows/'
+        for index in range(5):
+            self.client.post(f'/api/table/{self.model_instance.pk}/row/', {'title': f'row {index}', 'price': index})
+
+    def test_rows_returns_all_rows(self):
+        response = self.client.get(self.rows_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['title'] for row in response.json()], [f'row {index}' for index in range(5)])
+
+    def test_rows_keyset_pagination(self):
+        response = self.client.get(self.rows_url, {'page_size': 2})
+        first_page = response.json()
+        self.assertEqual([row['title'] for row in first_page['results']], ['row 0', 'row 1'])
+
+        second_page = self.client.get(first_page['next']).json()
+        self.assertEqual([row['title'] for row in second_page['results']], ['row 2', 'row 3'])
+
+    def test_rows_stream_ndjson(self):
+        response = self.client.get(self.rows_url, {'stream': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['price'] for line in lines], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_rows_stream_json_matches_rows(self):
+        response = self.client.get(self.rows_url, {'stream': 'json'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), self.client.get(self.rows_url).json())
+
+    def test_rows_stream_unknown_format(self):
+        response = self.client.get(self.rows_url, {'stream': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_json_reports_invalid_records(self):
+        records = [{'title': 'bulk 0', 'price': 1}, {'title': 'bulk 1', 'price': 'abc'}, {'title': 'bulk 2', 'price': 3}]
+        response = self.client.post(f'{self.rows_url}bulk/?batch_size=2', records, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertEqual(len(self.client.get(self.rows_url).json()), 7)
+
+    def test_bulk_ndjson_copy(self):
+        body = '{"title": "back\\\\slash", "price": 1}\n\nnot json\n{"title": "new\\nline\\ttab", "price": 2}\n'
+        response = self.client.post(
+            f'{self.rows_url}bulk/?method=copy', body, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['errors'][0]['index'], 1)
+        titles = [row['title'] for row in self.client.get(self.rows_url).json()]
+        self.assertEqual(titles[-2:], ['back\\slash', 'new\nline\ttab'])
+
+    def test_rows_filters_by_field_type(self):
+        response = self.client.get(self.rows_url, {'price__gte': '2', 'price__lt': '4'})
+        self.assertEqual([row['title'] for row in response.json()], ['row 2', 'row 3'])
+
+        response = self.client.get(self.rows_url, {'price__in': '0,4', 'title__startswith': 'row'})
+        self.assertEqual([row['title'] for row in response.json()], ['row 0', 'row 4'])
+
+        response = self.client.get(self.rows_url, {'price': '10.0'})
+        self.assertEqual(response.json(), [])
+
+    def test_rows_rejects_invalid_filters(self):
+        self.assertEqual(self.client.get(self.rows_url, {'price': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.rows_url, {'price__startswith': '1'}).status_code, 400)
+        self.assertEqual(self.client.get(self.rows_url, {'missing': '1'}).status_code, 400)
+
+    def test_rows_ordering_and_projection(self):
+        response = self.client.get(self.rows_url, {'ordering': '-price', 'fields': 'title'})
+        self.assertEqual(response.json()[:2], [{'title': 'row 4'}, {'title': 'row 3'}])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.rows_url, {'ordering': '-price', 'fields': 'price', 'page_size': 2})
+        self.assertNotIn('"title"', queries[-1]['sql'])
+        next_page = self.client.get(response.json()['next']).json()
+        self.assertEqual(next_page['results'], [{'price': 2.0}, {'price': 1.0}])
+
+    def test_rows_keyset_pagination_with_ties(self):
+        for index in range(5, 9):
+            self.client.post(f'/api/table/{self.model_instance.pk}/row/', {'title': f'row {index}', 'price': 2})
+        expected = ['row 0', 'row 1', 'row 2', 'row 5', 'row 6', 'row 7', 'row 8', 'row 3', 'row 4']
+        pages = [self.client.get(self.rows_url, {'ordering': 'price', 'page_size': 2}).json()]
+        while pages[-1]['next']:
+            with CaptureQueriesContext(connection) as queries:
+                pages.append(self.client.get(pages[-1]['next']).json())
+            self.assertNotIn('OFFSET', queries[-1]['sql'])
+        self.assertEqual([row['title'] for page in pages for row in page['results']], expected)
+
+        previous_page = self.client.get(pages[-2]['previous']).json()
+        self.assertEqual(previous_page['results'], pages[-3]['results'])
+        self.assertEqual(self.client.get(self.rows_url, {'ordering': 'price', 'cursor': 'cD1bMV0='}).status_code, 404)
+
+    def test_rows_keyset_pagination_with_nulls(self):
+        response = self.client.post('/api/table/', {'name': 'Nullable', 'fields': [
+            {'name': 'score', 'type': 'number', 'null': True},
+            {'name': 'day', 'type': 'date', 'null': True},
+        ]}, format='json')
+        url = f'/api/table/{response.data["id"]}/rows/'
+        for score, day in [(3, None), (None, '2026-01-02'), (1, None), (None, None), (2, '2026-01-01'), (None, '2026-01-03')]:
+            self.client.post(f'/api/table/{response.data["id"]}/row/', {'score': score, 'day': day}, format='json')
+
+        for ordering, expected in [
+            ('score', [3, 5, 1, 2, 4, 6]),
+            ('-score', [1, 5, 3, 2, 4, 6]),
+            ('day,-score', [5, 2, 6, 1, 3, 4]),
+        ]:
+            self.assertEqual([row['id'] for row in self.client.get(url, {'ordering': ordering}).json()], expected)
+            pages = [self.client.get(url, {'ordering': ordering, 'page_size': 2}).json()]
+            while pages[-1]['next']:
+                response = self.client.get(pages[-1]['next'])
+                self.assertEqual(response.status_code, 200)
+                pages.append(response.json())
+            self.assertEqual([row['id'] for page in pages for row in page['results']], expected)
+            previous_pages = [self.client.get(pages[-1]['previous']).json()]
+            while previous_pages[-1]['previous']:
+                previous_pages.append(self.client.get(previous_pages[-1]['previous']).json())
+            self.assertEqual([page['results'] for page in reversed(previous_pages)], [page['results'] for page in pages[:-1]])
+
+
+    def test_rows_encoder_matches_serializer_rendering(self):
+        model_class = DynamicModelService.get_or_create_model_class(self.model_instance)
+        model_class.objects.create(title='unicode   "quoted" é', price=1e-7)
+        serializer_class = DynamicModelService.get_cached_classes(self.model_instance).serializer_class
+        expected = JSONRenderer().render(serializer_class(model_class.objects.order_by('id'), many=True).data)
+
+        self.assertEqual(self.client.get(self.rows_url).content, expected)
+        self.assertEqual(
+            self.client.get(self.rows_url, {'page_size': 100}).content,
+            b'{"next":null,"previous":null,"results":%s}' % expected
+        )
+
+    def test_rows_encoder_orjson_backend(self):
+        model_class = DynamicModelService.get_or_create_model_class(self.model_instance)
+        encoder = DynamicRowsEncoder(model_class, backend='orjson')
+        rows = model_class.objects.order_by('id').values_list('id', 'title', 'price')
+        self.assertEqual(
+            json.loads(encoder.encode_rows(rows, ['id', 'title', 'price'])),
+            self.client.get(self.rows_url).json()
+        )
+    def test_update_dry_run(self):
+        url = f'/api/table/{self.model_instance.pk}/'
+        data = {'name': 'ViewModel', 'fields': [
+            {'name': 'title', 'type': 'number'},
+            {'name': 'price', 'type': 'number'},
+        ]}
+        response = self.client.put(f'{url}?dry_run=true', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        plan = response.json()
+        self.assertTrue(plan['rewrite'])
+        self.assertEqual([(change['operation'], change['name']) for change in plan['changes']], [('alter_field', 'title')])
+        self.assertIn('ALTER COLUMN "title" TYPE double precision', ' '.join(plan['statements']))
+
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.fields[0]['type'], 'string')
+        self.assertEqual(self.model_instance.schema_version, 1)
+
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+    def test_aggregate(self):
+        url = f'/api/table/{self.model_instance.pk}/aggregate/'
+        response = self.client.get(url, {'aggregate': 'count,sum:price,avg:price,max:price', 'price__gte': 1})
+        self.assertEqual(response.json(), {'count': 4, 'price__sum': 10.0, 'price__avg': 2.5, 'price__max': 4.0})
+
+        response = self.client.get(url, {'aggregate': 'sum:title'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_aggregate_group_by(self):
+        model_instance = DynamicModel.objects.create(name='Sales', fields=[
+            {'name': 'region', 'type': 'string'},
+            {'name': 'amount', 'type': 'number'},
+            {'name': 'paid', 'type': 'boolean'},
+        ])
+        DynamicModelService.create_table_for_model(model_instance)
+        model_class = DynamicModelService.get_model_class(model_instance)
+        model_class.objects.bulk_create([
+            model_class(region=region, amount=amount, paid=paid)
+            for region, amount, paid in [('east', 1, True), ('east', 2, False), ('west', 5, True)]
+        ])
+
+        url = f'/api/table/{model_instance.pk}/aggregate/'
+        params = {'group_by': 'region', 'aggregate': 'count,sum:amount,true:paid,false:paid', 'ordering': '-amount__sum'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(len([query for query in queries if 'GROUP BY' in query['sql']]), 1)
+        self.assertEqual(response.json(), [
+            {'region': 'west', 'count': 1, 'amount__sum': 5.0, 'paid__true': 1, 'paid__false': 0},
+            {'region': 'east', 'count': 2, 'amount__sum': 3.0, 'paid__true': 1, 'paid__false': 1},
+        ])
+
+    def test_rows_conditional_requests(self):
+        response = self.client.get(self.rows_url)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+        self.assertEqual(self.client.get(self.rows_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.rows_url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.client.post(f'/api/table/{self.model_instance.pk}/row/', {'title': 'new', 'price': 1})
+        response = self.client.get(self.rows_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(response.json()), 6)
+
+    def test_data_deltas_are_folded(self):
+        version = DynamicDataVersionService.get(self.model_instance.pk)
+        self.assertEqual(DynamicModel.objects.get(pk=self.model_instance.pk).row_count, 0)
+        self.client.post(f'{self.rows_url}bulk/', [{'title': 'bulk', 'price': 1}] * 2, format='json')
+        current = DynamicDataVersionService.get(self.model_instance.pk)
+        self.assertEqual(current.data_version, version.data_version + 1)
+        self.assertEqual(self.client.get(f'/api/table/{self.model_instance.pk}/count/').data['count'], 7)
+
+        self.assertEqual(DynamicDataVersionService.fold(), 6)
+        model_instance = DynamicModel.objects.get(pk=self.model_instance.pk)
+        self.assertEqual((model_instance.data_version, model_instance.row_count), (current.data_version, 7))
+        self.assertEqual(DynamicDataVersionService.get(self.model_instance.pk), current)
+        self.assertFalse(DynamicDataDelta.objects.exists())
+
+        # Writes fold the deltas once committed
+        with self.settings(DYNAMIC_MODELS_DATA_FOLD_SIZE=1), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/table/{self.model_instance.pk}/row/', {'title': 'new', 'price': 1})
+        self.assertFalse(DynamicDataDelta.objects.exists())
+        self.assertEqual(DynamicModel.objects.get(pk=self.model_instance.pk).row_count, 8)
+
+    @override_settings(DYNAMIC_MODELS_ROWS_CACHE='default')
+    def test_rows_response_cache(self):
+        params = {'ordering': '-id', 'fields': 'title'}
+        first_response = self.client.get(self.rows_url, params)
+        with CaptureQueriesContext(connection) as queries:
+            cached_response = self.client.get(self.rows_url, params)
+        self.assertEqual(cached_response.content, first_response.content)
+        self.assertFalse([query for query in queries if 'dynamic_viewmodel' in query['sql']])
+
+        self.client.post(f'/api/table/{self.model_instance.pk}/row/', {'title': 'new', 'price': 0.5})
+        response = self.client.get(self.rows_url, params)
+        self.assertEqual(response.json()[0], {'title': 'new'})
+        self.client.post(f'/api/table/{self.model_instance.pk}/rows/bulk/', [{'title': 'bulk', 'price': 1.5}], format='json')
+        response = self.client.get(self.rows_url, params)
+        self.assertEqual(response.json()[0], {'title': 'bulk'})
+
+    def test_export(self):
+        self.client.post(f'/api/table/{self.model_instance.pk}/row/', {'title': 'a "b",\\c\nd é', 'price': 9.5})
+        url = f'/api/table/{self.model_instance.pk}/export/'
+
+        response = self.client.get(url, {'format': 'ndjson', 'fields': 'title,price', 'price__gte': 3})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'title': 'row 3', 'price': 3},
+            {'title': 'row 4', 'price': 4},
+            {'title': 'a "b",\\c\nd é', 'price': 9.5},
+        ])
+
+        response = self.client.get(url, {'format': 'csv', 'ordering': '-id'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="dynamic_viewmodel.csv"')
+        content = b''.join(response.streaming_content)
+        objects = DynamicRowsFilter(DynamicModelService.get_model_class(self.model_instance)).get_queryset({'ordering': '-id'}, named=False)
+        self.assertEqual(content, b''.join(DynamicRowsExport.iterate_csv(objects, ['id', 'title', 'price'])))
+        self.assertTrue(content.startswith(b'id,title,price\n6,"a ""b"",\\c\nd \xc3\xa9",9.5\n'))
+
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+
+    def test_update_rows_by_filter(self):
+        data_version = DynamicDataVersionService.get(self.model_instance.pk).data_version
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'{self.rows_url}?price__gte=1&batch_size=2', {'title': 'sale'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 4})
+        # Two full batches, delimited without scanning skipped rows
+        self.assertEqual([query['sql'].startswith('UPDATE "dynamic_viewmodel"') for query in queries].count(True), 2)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+        self.assertEqual(DynamicDataVersionService.get(self.model_instance.pk).data_version, data_version + 2)
+        self.assertEqual([row['title'] for row in self.client.get(self.rows_url).json()], ['row 0'] + ['sale'] * 4)
+
+        response = self.client.patch(f'{self.rows_url}?title=missing', {'price': 1}, format='json')
+        self.assertEqual(response.data, {'updated': 0})
+        for url, data in [
+            (self.rows_url, {'price': 1}),
+            (f'{self.rows_url}?price=1', {'price': 'x'}),
+            (f'{self.rows_url}?price=1', {}),
+            (f'{self.rows_url}?missing=1', {'price': 1}),
+            (f'{self.rows_url}?price=1&batch_size=0', {'price': 1}),
+        ]:
+            response = self.client.patch(url, data, format='json')
+            self.assertEqual(response.status_code, 400, url)
+        response = self.client.patch(f'{self.rows_url}?all=true', {'price': 7}, format='json')
+        self.assertEqual(response.data, {'updated': 5})
+
+    def test_delete_rows_by_filter(self):
+        response = self.client.delete(f'{self.rows_url}?price__in=1,3,4&batch_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'deleted': 3})
+        self.assertEqual([row['title'] for row in self.client.get(self.rows_url).json()], ['row 0', 'row 2'])
+        self.assertEqual(self.client.delete(self.rows_url).status_code, 400)
+        self.assertEqual(self.client.delete(f'{self.rows_url}?all=true').data, {'deleted': 2})
+
+    def test_write_rows_rejected_batch(self):
+        self.model_instance.indexes = [{'fields': ['title'], 'unique': True}]
+        self.model_instance.save()
+        DynamicModelService.create_indexes(
+            self.model_instance,
+            DynamicModelService.get_model_class(self.model_instance),
+            DynamicModelService.prepare_indexes(self.model_instance),
+        )
+        response = self.client.patch(f'{self.rows_url}?price__gte=3&batch_size=1', {'title': 'same'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertIn('could not be written', response.data['non_field_errors'][0])
+        self.assertEqual([row['title'] for row in self.client.get(self.rows_url).json()][3:], ['same', 'row 4'])
+
+    def test_count(self):
+        count_url = f'/api/table/{self.model_instance.pk}/count/'
+        self.client.post(f'{self.rows_url}bulk/', [{'title': 'bulk', 'price': 9}, {'title': 'invalid'}], format='json')
+        self.client.delete(f'{self.rows_url}?price__lt=2')
+        self.assertEqual(self.client.get(count_url).data, {'count': 4, 'mode': 'cached'})
+        self.assertEqual(self.client.get(count_url, {'mode': 'exact'}).data, {'count': 4, 'mode': 'exact'})
+        # The table was never analyzed
+        self.assertEqual(self.client.get(count_url, {'mode': 'estimate'}).data, {'count': 4, 'mode': 'cached'})
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE dynamic_viewmodel')
+        self.assertEqual(self.client.get(count_url, {'mode': 'estimate'}).data, {'count': 4, 'mode': 'estimate'})
+        self.assertEqual(self.client.get(count_url, {'mode': 'approximate'}).status_code, 400)
+
+        DynamicModel.objects.filter(pk=self.model_instance.pk).update(row_count=None)
+        self.assertEqual(self.client.get(count_url).data, {'count': 4, 'mode': 'cached'})
+        response = self.client.put(f'/api/table/{self.model_instance.pk}/', {
+            'name': 'ViewModel', 'fields': self.model_instance.fields, 'row_count': 0,
+        }, format='json')
+        self.assertEqual(response.data['row_count'], 4)
+
+        def fail_bump(execute, sql, params, many, context):
+            if sql.startswith(f'INSERT INTO "{DynamicDataDelta._meta.db_table}"'):
+                raise DatabaseError('bump failed')
+            return execute(sql, params, many, context)
+
+        # The rows are written in the transaction bumping the count
+        with connection.execute_wrapper(fail_bump):
+            response = self.client.delete(f'{self.rows_url}?price__gte=0')
+        self.assertEqual(response.data['deleted'], 0)
+        self.assertEqual(self.client.get(count_url, {'mode': 'exact'}).data, {'count': 4, 'mode': 'exact'})
+
+    def test_typed_fields(self):
+        response = self.client.post('/api/table/', {'name': 'Typed', 'fields': [
+            {'name': 'count', 'type': 'smallint', 'null': True},
+            {'name': 'price', 'type': 'decimal', 'precision': 8, 'scale': 2, 'default': 1},
+            {'name': 'code', 'type': 'varchar', 'length': 3},
+            {'name': 'day', 'type': 'date'},
+            {'name': 'key', 'type': 'uuid'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        url = f'/api/table/{response.data["id"]}/'
+        row = {'code': 'abc', 'day': '2026-10-17', 'key': '12345678-1234-5678-1234-567812345678'}
+        created = self.client.post(f'{url}row/', row, format='json').data
+        self.assertEqual(created, {'id': 1, 'count': None, 'price': '1.00', **row})
+        self.assertEqual(self.client.post(f'{url}row/', {**row, 'code': 'abcd'}, format='json').status_code, 400)
+        self.assertEqual(self.client.get(f'{url}rows/', {'count__isnull': 'True', 'day__gte': '2026-01-01'}).json(), [created])
+
+        response = self.client.put(url, {'name': 'Typed', 'fields': [{'name': 'day', 'type': 'number'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cannot be converted from date to number', str(response.data['fields']))
+        response = self.client.post('/api/table/', {'name': 'Invalid', 'fields': [{'name': 'code', 'type': 'varchar'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DynamicModelIndexesTestCase(TestCase):
+    def setUp(self):
+        self.model_instance = DynamicModel.objects.create(name='IndexedModel', fields=[
+            {'name': 'title', 'type': 'string'},
+            {'name': 'price', 'type': 'number'},
+        ], indexes=[
+            {'fields': ['title']},
+            {'name': 'indexed_price_uniq', 'fields': ['title', 'price'], 'unique': True},
+            {'name': 'indexed_cheap_idx', 'fields': ['price'], 'condition': {'price__lt': '10'}},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+
+    def get_table_indexes(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, 'dynamic_indexedmodel')
+
+    def test_create_table_for_model_creates_indexes(self):
+        indexes = self.get_table_indexes()
+        generated_name = DynamicModelService.prepare_index_name(self.model_instance, {'fields': ['title']})
+        self.assertEqual(indexes[generated_name]['columns'], ['title'])
+        self.assertTrue(indexes['indexed_price_uniq']['unique'])
+        self.assertEqual(indexes['indexed_cheap_idx']['columns'], ['price'])
+
+    def test_prepare_indexes_converts_condition(self):
+        partial_index = DynamicModelService.prepare_indexes(self.model_instance)[2]
+        self.assertEqual(partial_index.condition, models.Q(price__lt=10.0))
+
+    def test_update_table_for_model_updates_indexes(self):
+        self.model_instance.indexes = [
+            {'name': 'indexed_price_uniq', 'fields': ['title', 'price'], 'unique': True},
+            {'name': 'indexed_price_idx', 'fields': ['price']},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            DynamicModelService.update_table_for_model(self.model_instance)
+
+        indexes = self.get_table_indexes()
+        self.assertIn('indexed_price_idx', indexes)
+        self.assertIn('indexed_price_uniq', indexes)
+        self.assertNotIn('indexed_cheap_idx', indexes)
+
+    def test_failed_unique_index_is_recorded(self):
+        model_class = DynamicModelService.get_or_create_model_class(self.model_instance)
+        model_class.objects.create(title='duplicate', price=1)
+        model_class.objects.create(title='duplicate', price=2)
+
+        self.model_instance.indexes.append({'name': 'indexed_title_uniq', 'fields': ['title'], 'unique': True})
+        self.model_instance.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            DynamicModelService.update_table_for_model(self.model_instance)
+            # Like another process, cache the classes built before the index fails
+            stale_entry = DynamicModelService.get_cached_classes(DynamicModel.objects.get(pk=self.model_instance.pk))
+        dynamic_model_cache.set(stale_entry)
+        self.assertIn('indexed_title_uniq', [constraint.name for constraint in stale_entry.model_class._meta.constraints])
+        entry = DynamicModelService.get_cached_classes(DynamicModel.objects.get(pk=self.model_instance.pk))
+        self.assertNotIn('indexed_title_uniq', [constraint.name for constraint in entry.model_class._meta.constraints])
+
+        self.model_instance.refresh_from_db()
+        self.assertIn('indexed_title_uniq', [index.get('name') for index in self.model_instance.indexes])
+        self.assertIn('could not create unique index', self.model_instance.index_errors['indexed_title_uniq'])
+        self.assertNotIn('indexed_title_uniq', self.get_table_indexes())
+        model_class = DynamicModelService.get_model_class(self.model_instance)
+        self.assertNotIn('indexed_title_uniq', [constraint.name for constraint in model_class._meta.constraints])
+        statuses = {index['name']: index['status'] for index in DynamicModelService.list_indexes(self.model_instance)}
+        self.assertEqual(statuses['indexed_title_uniq'], 'failed')
+        self.assertEqual(statuses['indexed_price_uniq'], 'ready')
+
+        # Updating the model builds the failed index again
+        model_class.objects.filter(price=2).update(title='unique')
+        serializer = DynamicModelSerializer(self.model_instance, data={
+            'name': 'IndexedModel', 'fields': self.model_instance.fields, 'indexes': self.model_instance.indexes,
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.index_errors, {})
+        self.assertTrue(self.get_table_indexes()['indexed_title_uniq']['unique'])
+
+    def test_serializer_rejects_invalid_indexes(self):
+        serializer = DynamicModelSerializer(data={
+            'name': 'InvalidIndexes',
+            'fields': [{'name': 'price', 'type': 'number'}],
+            'indexes': [{'fields': ['missing']}],
+        })
+        self.assertFalse(serializer.is_valid())
+
+        serializer = DynamicModelSerializer(data={
+            'name': 'InvalidIndexes',
+            'fields': [{'name': 'price', 'type': 'number'}],
+            'indexes': [{'fields': ['price'], 'condition': {'price__gt': 'cheap'}}],
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('indexes', serializer.errors)
+
+
+class LazyModelRegistrationTestCase(TestCase):
+    def setUp(self):
+        dynamic_model_cache.clear()
+        self.model_instance = DynamicModel.objects.create(name='LazyModel', fields=[
+            {'name': 'title', 'type': 'string'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+        self.unregister()
+
+    def unregister(self):
+        registry.unregister('LazyModel')
+
+    def test_prepare_existing_models_on_ready_prepares_listed_models(self):
+        DynamicModelService.prepare_existing_models_on_ready(['LazyModel', 'MissingModel'])
+        self.assertIsNotNone(dynamic_model_cache.get(self.model_instance.pk))
+
+    def test_get_model_class_registers_on_first_access(self):
+        self.assertIsNone(registry.get_model_class('LazyModel'))
+        model_class = DynamicModelService.get_model_class(self.model_instance)
+        self.assertIs(registry.get_model_class('LazyModel'), model_class)
+
+    def test_registry_replaces_classes_outside_the_app_registry(self):
+        model_class = DynamicModelService.get_model_class(self.model_instance)
+        self.model_instance.fields.append({'name': 'price', 'type': 'number'})
+        updated_model_class = DynamicModelService.get_model_class(self.model_instance)
+        self.assertIsNot(updated_model_class, model_class)
+        self.assertIs(registry.get_model_class('LazyModel'), updated_model_class)
+        with self.assertRaises(LookupError):
+            apps.get_model(app_label='core', model_name='LazyModel')
+
+        small_registry = DynamicModelRegistry(max_size=2)
+        for name in ['First', 'Second', 'Third']:
+            type(name, (models.Model,), {
+                '__module__': 'core.runtime_generated',
+                'Meta': type('Meta', (), {'apps': small_registry, 'app_label': 'core'}),
+            })
+        small_registry.get_model_class('Second')
+        type('Fourth', (models.Model,), {
+            '__module__': 'core.runtime_generated',
+            'Meta': type('Meta', (), {'apps': small_registry, 'app_label': 'core'}),
+        })
+        self.assertEqual(list(small_registry.all_models['core']), ['second', 'fourth'])
+
+    def test_update_table_for_model_without_registered_class(self):
+        previous_instance = copy.deepcopy(self.model_instance)
+        self.model_instance.fields = [{'name': 'price', 'type': 'number'}]
+        self.model_instance.save()
+
+        DynamicModelService.update_table_for_model(self.model_instance, previous_instance)
+
+        with connection.cursor() as cursor:
+            columns = [
+                column.name for column in connection.introspection.get_table_description(cursor, 'dynamic_lazymodel')
+            ]
+        self.assertCountEqual(columns, ['id', 'price'])
+
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off', DYNAMIC_MODELS_FIELD_MIGRATION_RUNNER='command')
+class DynamicFieldMigrationTestCase(APITestCase):
+    def setUp(self):
+        dynamic_model_cache.clear()
+        self.model_instance = DynamicModel.objects.create(name='MigratedModel', fields=[
+            {'name': 'code', 'type': 'string'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+        self.url = f'/api/table/{self.model_instance.pk}/'
+
+    def create_rows(self, codes):
+        for code in codes:
+            self.client.post(f'{self.url}row/', {'code': code})
+
+    def migrate_code_to_number(self):
+        data = {'name': 'MigratedModel', 'fields': [{'name': 'code', 'type': 'number'}]}
+        response = self.client.put(f'{self.url}?online=true', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return DynamicFieldMigration.objects.get(dynamic_model=self.model_instance)
+
+    def get_columns(self):
+        with connection.cursor() as cursor:
+            return {
+                column.name: column.type_code
+                for column in connection.introspection.get_table_description(cursor, 'dynamic_migratedmodel')
+            }
+
+    @override_settings(DYNAMIC_MODELS_FIELD_MIGRATION_BATCH_SIZE=2)
+    def test_online_migration_converts_rows(self):
+        self.create_rows(['1.5', '2', '3'])
+        migration = self.migrate_code_to_number()
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.fields, [{'name': 'code', 'type': 'string'}])
+
+        # Rows written during the migration are converted by the trigger
+        self.create_rows(['4'])
+        DynamicFieldMigrationService.run(migration)
+
+        migration.refresh_from_db()
+        self.assertEqual(migration.status, DynamicFieldMigration.STATUS_COMPLETED)
+        self.assertEqual((migration.processed_rows, migration.total_rows), (4, 4))
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.fields, [{'name': 'code', 'type': 'number'}])
+        self.assertEqual(list(self.get_columns()), ['id', 'code'])
+        self.assertEqual([row['code'] for row in self.client.get(f'{self.url}rows/').json()], [1.5, 2.0, 3.0, 4.0])
+
+        response = self.client.get(f'{self.url}migrations/')
+        self.assertEqual(response.json()[0]['status'], 'completed')
+
+    def test_online_migration_reports_unconvertible_rows(self):
+        self.create_rows(['1', 'one'])
+        migration = self.migrate_code_to_number()
+        DynamicFieldMigrationService.run(migration)
+
+        migration.refresh_from_db()
+        self.assertEqual(migration.status, DynamicFieldMigration.STATUS_FAILED)
+        self.assertEqual(migration.error_count, 1)
+        self.assertIn("'one'", migration.errors[0]['errors'][0])
+        self.assertEqual(list(self.get_columns()), ['id', 'code'])
+        self.assertEqual([row['code'] for row in self.client.get(f'{self.url}rows/').json()], ['1', 'one'])
+
+    def test_online_migration_applies_field_options(self):
+        self.create_rows(['12', '7'])
+        data = {'name': 'MigratedModel', 'fields': [{'name': 'code', 'type': 'varchar', 'length': 2, 'null': True}]}
+        self.assertEqual(self.client.put(f'{self.url}?online=true', data, format='json').status_code, 200)
+        DynamicFieldMigrationService.run(DynamicFieldMigration.objects.get(dynamic_model=self.model_instance))
+
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.fields, data['fields'])
+        self.client.post(f'{self.url}row/', {'code': None}, format='json')
+        self.assertEqual([row['code'] for row in self.client.get(f'{self.url}rows/').json()], ['12', '7', None])
+
+    def test_online_migration_rebuilds_indexes_of_field(self):
+        self.create_rows(['1', '2'])
+        data = {'name': 'MigratedModel', 'fields': [{'name': 'code', 'type': 'string'}], 'indexes': [{'fields': ['code']}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.put(self.url, data, format='json').status_code, 200)
+        migration = self.migrate_code_to_number()
+        with self.captureOnCommitCallbacks(execute=True):
+            DynamicFieldMigrationService.run(migration)
+
+        self.model_instance.refresh_from_db()
+        statuses = [index['status'] for index in DynamicModelService.list_indexes(self.model_instance)]
+        self.assertEqual(statuses, ['ready'])
+
+    def test_online_migration_keeps_concurrent_schema_changes(self):
+        self.create_rows(['1'])
+        migration = self.migrate_code_to_number()
+        fields = [{'name': 'code', 'type': 'string'}, {'name': 'label', 'type': 'string', 'null': True}]
+
+        def update_schema(execute, sql, params, many, context):
+            # A schema update committed while the constraint is validated
+            if 'VALIDATE CONSTRAINT' in sql:
+                DynamicModel.objects.filter(pk=self.model_instance.pk).update(fields=fields)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(update_schema):
+            DynamicFieldMigrationService.run(migration)
+        self.model_instance.refresh_from_db()
+        self.assertEqual(self.model_instance.fields, [{'name': 'code', 'type': 'number'}, fields[1]])
+
+    def test_migrating_field_cannot_be_changed(self):
+        self.migrate_code_to_number()
+        data = {'name': 'MigratedModel', 'fields': [{'name': 'code', 'type': 'boolean'}]}
+        response = self.client.put(self.url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class AsyncRowsViewTestCase(TestCase):
+    def setUp(self):
+        dynamic_model_cache.clear()
+        self.model_instance = DynamicModel.objects.create(name='AsyncModel', fields=[
+            {'name': 'title', 'type': 'string'},
+            {'name': 'price', 'type': 'number'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+        model_class = DynamicModelService.get_model_class(self.model_instance)
+        model_class.objects.bulk_create([model_class(title=f'row {index}', price=index) for index in range(5)])
+        self.url = f'/api/async/table/{self.model_instance.pk}/'
+        self.sync_url = f'/api/table/{self.model_instance.pk}/'
+
+    async def test_rows_match_sync_rows(self):
+        for params in [{}, {'price__gte': 2, 'fields': 'title'}, {'page_size': 2, 'ordering': '-price'}]:
+            response = await self.async_client.get(f'{self.url}rows/', params)
+            sync_response = await sync_to_async(self.client.get)(f'{self.sync_url}rows/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.content.replace(b'/async', b''),
+                sync_response.content,
+            )
+
+    async def test_rows_keyset_pagination(self):
+        first_page = (await self.async_client.get(f'{self.url}rows/', {'page_size': 2})).json()
+        second_page = (await self.async_client.get(first_page['next'])).json()
+        self.assertEqual([row['title'] for row in second_page['results']], ['row 2', 'row 3'])
+
+    async def test_rows_stream_ndjson(self):
+        response = await self.async_client.get(f'{self.url}rows/', {'stream': 'ndjson'})
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([json.loads(line)['price'] for line in content.splitlines()], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    async def test_rows_errors(self):
+        response = await self.async_client.get(f'{self.url}rows/', {'price__gte': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('price__gte', response.json())
+
+        response = await self.async_client.get(f'/api/async/table/{self.model_instance.pk + 1}/rows/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_row_creates_row(self):
+        response = await self.async_client.post(f'{self.url}row/', {'title': 'async', 'price': 9}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': 6, 'title': 'async', 'price': 9.0})
+
+        response = await self.async_client.post(f'{self.url}row/', {'price': 'free'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertCountEqual(response.json(), ['title', 'price'])
+
+    async def test_permissions_of_viewset_are_checked(self):
+        with mock.patch.object(DynamicModelViewSet, 'permission_classes', [IsAuthenticated]):
+            response = await self.async_client.get(f'{self.url}rows/')
+            self.assertEqual(response.status_code, 403)
+            self.assertIn('detail', response.json())
+            response = await self.async_client.post(f'{self.url}row/', {'title': 'async'}, content_type='application/json')
+            self.assertEqual(response.status_code, 403)
+            sync_response = await sync_to_async(self.client.get)(f'{self.sync_url}rows/')
+            self.assertEqual(sync_response.status_code, 403)
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class DynamicModelBenchmarkTestCase(TestCase):
+    def test_run(self):
+        results = DynamicModelBenchmark(fields=4, models=2, rows=10, inserts=3, repeat=2).run()
+        self.assertEqual(list(results['results']), DynamicModelBenchmark.OPERATIONS)
+        self.assertEqual(results['meta']['scale'], {'fields': 4, 'models': 2, 'rows': 10, 'inserts': 3, 'repeat': 2})
+        self.assertEqual(results['results']['create_table']['count'], 2)
+        self.assertEqual(results['results']['row_insert']['count'], 6)
+        self.assertEqual(results['results']['rows_page']['count'], 4)
+        self.assertFalse(DynamicModel.objects.filter(name__startswith=DynamicModelBenchmark.NAME_PREFIX).exists())
+        self.assertNotIn('dynamic_benchmark0', connection.introspection.table_names())
+
+    def test_compare(self):
+        baseline = {'results': {'row_insert': {'median_ms': 2.0}, 'rows_list': {'median_ms': 10.0}}}
+        current = {'results': {'row_insert': {'median_ms': 2.1}, 'rows_list': {'median_ms': 12.0}, 'create_table': {'median_ms': 1.0}}}
+        comparison = DynamicModelBenchmark.compare(baseline, current, threshold=0.1)
+        self.assertEqual([item['operation'] for item in comparison], ['row_insert', 'rows_list'])
+        self.assertEqual([item['regressed'] for item in comparison], [False, True])
+        self.assertAlmostEqual(comparison[1]['change'], 0.2)
+
+    def test_command_compares_results(self):
+        meta = {'scale': {'rows': 10}}
+        with tempfile.TemporaryDirectory() as directory:
+            baseline_path = os.path.join(directory, 'baseline.json')
+            current_path = os.path.join(directory, 'current.json')
+            with open(baseline_path, 'w') as file:
+                json.dump({'meta': meta, 'results': {'rows_list': {'median_ms': 10.0}}}, file)
+            with open(current_path, 'w') as file:
+                json.dump({'meta': meta, 'results': {'rows_list': {'median_ms': 10.5}}}, file)
+
+            stdout = io.StringIO()
+            call_command('benchmark', input=current_path, compare=baseline_path, stdout=stdout)
+            self.assertIn('+5.0%', stdout.getvalue())
+            with self.assertRaisesMessage(CommandError, 'rows_list'):
+                call_command('benchmark', input=current_path, compare=baseline_path, threshold=0.01, stdout=io.StringIO())
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off', DYNAMIC_MODELS_INSTRUMENTATION=True)
+class DynamicInstrumentationTestCase(APITestCase):
+    def setUp(self):
+        metrics_registry.clear()
+        self.model_instance = DynamicModel.objects.create(name='Measured', fields=[
+            {'name': 'title', 'type': 'string'},
+        ])
+        DynamicModelService.create_table_for_model(self.model_instance)
+        self.url = f'/api/table/{self.model_instance.pk}/'
+        for index in range(3):
+            self.client.post(f'{self.url}row/', {'title': f'row {index}'})
+
+    def test_server_timing_header(self):
+        response = self.client.get(f'{self.url}rows/', {'page_size': 2})
+        timings = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings)[-1], 'total')
+        self.assertIn('metadata', timings)
+        self.assertIn('serialize', timings)
+        self.assertRegex(timings['sql'], r'^dur=[0-9.]+;desc="[0-9]+ queries"$')
+
+        response = self.client.get(f'{self.url}rows/', HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    def test_metrics(self):
+        self.client.get(f'{self.url}rows/')
+        self.client.get(f'{self.url}rows/', {'page_size': 2})
+
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE dynamic_models_request_duration_seconds histogram', lines)
+        self.assertIn('dynamic_models_request_duration_seconds_count{endpoint="rows",table="dynamic_measured"} 2', lines)
+        self.assertIn('dynamic_models_request_duration_seconds_count{endpoint="row",table="dynamic_measured"} 3', lines)
+        self.assertIn('dynamic_models_phase_duration_seconds_bucket{phase="sql",table="dynamic_measured",le="+Inf"} 5', lines)
+        self.assertIn('dynamic_models_rows_returned_total{endpoint="rows",table="dynamic_measured"} 5', lines)
+        self.assertTrue(any(line.startswith('dynamic_models_queries_total{endpoint="rows"') for line in lines))
+
+    def test_disabled(self):
+        with override_settings(DYNAMIC_MODELS_INSTRUMENTATION=False):
+            response = self.client.get(f'{self.url}rows/')
+            self.assertNotIn('Server-Timing', response)
+            self.assertIs(DynamicInstrumentation.phase('sql'), DynamicInstrumentation.NULL_PHASE)
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off', DYNAMIC_MODELS_PARTITION_PREMAKE=2)
+class DynamicPartitioningTestCase(APITestCase):
+    def create_model(self, name, fields, partitioning, indexes=()):
+        response = self.client.post('/api/table/', {
+            'name': name, 'fields': fields, 'partitioning': partitioning, 'indexes': list(indexes),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        model_instance = DynamicModel.objects.get(pk=response.data['id'])
+        return model_instance, DynamicModelService.get_model_class(model_instance)
+
+    def get_partitions(self, model_instance):
+        return [partition['name'] for partition in self.client.get(f'/api/table/{model_instance.pk}/partitions/').data]
+
+    def test_intervals(self):
+        moment = datetime.datetime(2026, 12, 17, 15, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(DynamicPartitionService.truncate('week', moment), datetime.datetime(2026, 12, 14, tzinfo=datetime.timezone.utc))
+        month = DynamicPartitionService.truncate('month', moment)
+        self.assertEqual(DynamicPartitionService.add_intervals('month', month, 1), datetime.datetime(2027, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(DynamicPartitionService.add_intervals('month', month, -12), datetime.datetime(2025, 12, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(DynamicPartitionService.add_intervals('year', month, 1), datetime.datetime(2027, 12, 1, tzinfo=datetime.timezone.utc))
+
+    def test_range_by_created_at(self):
+        model_instance, model_class = self.create_model(
+            'Events', [{'name': 'title', 'type': 'string'}],
+            {'type': 'range', 'field': 'created_at', 'interval': 'month', 'retention': 2},
+            [{'fields': ['title']}],
+        )
+        start = DynamicPartitionService.truncate('month', timezone.now())
+        months = [DynamicPartitionService.add_intervals('month', start, offset) for offset in range(3)]
+        self.assertEqual(self.get_partitions(model_instance), ['dynamic_events_default'] + [
+            f'dynamic_events_p{month:%Y%m%d}' for month in months
+        ])
+
+        response = self.client.post(f'/api/table/{model_instance.pk}/row/', {'title': 'new', 'created_at': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.data['created_at'], f'{start:%Y-%m}')
+        old_month = DynamicPartitionService.add_intervals('month', start, -3)
+        model_class.objects.create(title='old', created_at=old_month + datetime.timedelta(days=1))
+
+        rows = self.client.get(f'/api/table/{model_instance.pk}/rows/', {'created_at__gte': f'{start:%Y-%m-%dT%H:%M:%S}'}).json()
+        self.assertEqual([row['title'] for row in rows], ['new'])
+
+        data_version = DynamicDataVersionService.get(model_instance.pk).data_version
+        result = DynamicPartitionService.maintain(model_instance, model_class)
+        self.assertEqual(result, {
+            'created': [f'dynamic_events_p{old_month:%Y%m%d}'],
+            'dropped': [f'dynamic_events_p{old_month:%Y%m%d}'],
+        })
+        self.assertEqual(list(model_class.objects.values_list('title', flat=True)), ['new'])
+        self.assertEqual(DynamicDataVersionService.get(model_instance.pk).data_version, data_version + 1)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE dynamic_events')
+        response = self.client.get(f'/api/table/{model_instance.pk}/count/', {'mode': 'estimate'})
+        self.assertEqual(response.data, {'count': 1, 'mode': 'estimate'})
+
+        result = DynamicPartitionService.maintain(model_instance, model_class, now=months[1])
+        self.assertEqual(result['created'], [
+            f'dynamic_events_p{DynamicPartitionService.add_intervals("month", start, 3):%Y%m%d}'
+        ])
+
+    def test_range_by_number(self):
+        model_instance, model_class = self.create_model(
+            'Readings', [{'name': 'value', 'type': 'number'}],
+            {'type': 'range', 'field': 'value', 'size': 10},
+            [{'fields': ['value'], 'unique': True}],
+        )
+        for value in [1, 15, -3, 5]:
+            self.client.post(f'/api/table/{model_instance.pk}/row/', {'value': value})
+        self.assertEqual(self.get_partitions(model_instance), ['dynamic_readings_default'])
+
+        result = DynamicPartitionService.maintain(model_instance, model_class)
+        self.assertEqual(result['created'], ['dynamic_readings_bm1', 'dynamic_readings_b0', 'dynamic_readings_b1'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text, value FROM dynamic_readings ORDER BY value')
+            self.assertEqual(cursor.fetchall(), [
+                ('dynamic_readings_bm1', -3.0), ('dynamic_readings_b0', 1.0),
+                ('dynamic_readings_b0', 5.0), ('dynamic_readings_b1', 15.0),
+            ])
+        response = self.client.post(f'/api/table/{model_instance.pk}/row/', {'value': 5})
+        self.assertEqual(response.status_code, 400)
+
+    def test_hash(self):
+        model_instance, model_class = self.create_model(
+            'Sessions', [{'name': 'key', 'type': 'string'}], {'type': 'hash', 'field': 'key', 'partitions': 4},
+        )
+        self.assertEqual(self.get_partitions(model_instance), [f'dynamic_sessions_p{index}' for index in range(4)])
+        for index in range(8):
+            self.client.post(f'/api/table/{model_instance.pk}/row/', {'key': f'key {index}'})
+        self.assertEqual(model_class.objects.count(), 8)
+        self.assertEqual(self.client.get(f'/api/table/{model_instance.pk}/rows/', {'key': 'key 3'}).json(), [
+            {'id': 4, 'key': 'key 3'}
+        ])
+        self.assertEqual(DynamicPartitionService.maintain(model_instance, model_class), {'created': [], 'dropped': []})
+
+    def test_validation(self):
+        fields = [{'name': 'key', 'type': 'string'}, {'name': 'value', 'type': 'number'}]
+        for partitioning, indexes in [
+            ({'type': 'range', 'field': 'key'}, []),
+            ({'type': 'range', 'field': 'value'}, []),
+            ({'type': 'hash', 'field': 'value'}, []),
+            ({'type': 'range', 'field': 'created_at', 'interval': 'day', 'size': 2}, []),
+            ({'type': 'hash', 'field': 'missing', 'partitions': 2}, []),
+            ({'type': 'hash', 'field': 'key', 'partitions': 2}, [{'fields': ['value'], 'unique': True}]),
+        ]:
+            response = self.client.post('/api/table/', {
+                'name': 'Invalid', 'fields': fields, 'partitioning': partitioning, 'indexes': indexes,
+            }, format='json')
+            self.assertEqual(response.status_code, 400, partitioning)
+            self.assertIn('partitioning', response.data)
+
+        model_instance, _ = self.create_model('Keyed', fields, {'type': 'hash', 'field': 'key', 'partitions': 2})
+        url = f'/api/table/{model_instance.pk}/'
+        response = self.client.put(url, {'name': 'Keyed', 'fields': fields, 'partitioning': None}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('partitioning', response.data)
+        response = self.client.put(url, {'name': 'Keyed', 'fields': [fields[0], {'name': 'key', 'type': 'number'}][1:]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(url, {'name': 'Keyed', 'fields': fields + [{'name': 'note', 'type': 'string'}]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['partitioning'], {'type': 'hash', 'field': 'key', 'partitions': 2})
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class DynamicDatabaseRoutingTestCase(APITestCase):
+    def test_placement(self):
+        with override_settings(DYNAMIC_MODELS_DATABASES=['default', 'shard']):
+            placements = {name: DynamicDatabaseService.place(name) for name in ['Book', 'Author', 'Order', 'Review']}
+            self.assertEqual(set(placements.values()), {'default', 'shard'})
+            self.assertEqual(placements['Book'], DynamicDatabaseService.place('book'))
+
+        response = self.client.post('/api/table/', {'name': 'Book', 'fields': [{'name': 'title', 'type': 'string'}]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['database'], 'default')
+        model_class = DynamicModelService.get_model_class(DynamicModel.objects.get(pk=response.data['id']))
+        self.assertEqual(router.db_for_write(model_class), 'default')
+        self.assertIsNone(DynamicModelRouter().db_for_read(DynamicModel))
+
+        response = self.client.put(f'/api/table/{response.data["id"]}/', {
+            'name': 'Book', 'fields': [{'name': 'title', 'type': 'string'}], 'database': 'shard',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('database', response.data)
+        response = self.client.post('/api/table/', {
+            'name': 'Author', 'fields': [{'name': 'name', 'type': 'string'}], 'database': 'missing',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('database', response.data)
+
+    def test_migrations(self):
+        dynamic_router = DynamicModelRouter()
+        self.assertTrue(dynamic_router.allow_migrate('default', 'core'))
+        self.assertFalse(dynamic_router.allow_migrate('shard', 'core'))
+        self.assertIsNone(dynamic_router.allow_migrate('shard', 'auth'))
+
+    @override_settings(DYNAMIC_MODELS_READ_REPLICAS={'default': ['replica']}, DYNAMIC_MODELS_READ_REPLICA_LAG=5)
+    def test_read_database(self):
+        model_instance = DynamicModel(name='Book', database='default')
+        recent = DynamicDataVersion(1, 2, timezone.now() - datetime.timedelta(seconds=1))
+        old = DynamicDataVersion(1, 2, timezone.now() - datetime.timedelta(seconds=10))
+        self.assertEqual(DynamicDatabaseService.get_read_database(model_instance, recent), 'default')
+        self.assertEqual(DynamicDatabaseService.get_read_database(model_instance, old), 'replica')
+        self.assertEqual(DynamicDatabaseService.get_read_database(model_instance), 'replica')
+        self.assertEqual(DynamicDatabaseService.get_read_database(DynamicModel(name='Author', database='shard')), 'shard')
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class DynamicChangeFeedTestCase(APITransactionTestCase):
+    # Changes are only read once their transaction committed
+    def setUp(self):
+        response = self.client.post('/api/table/', {
+            'name': 'Feed',
+            'fields': [{'name': 'title', 'type': 'string'}, {'name': 'price', 'type': 'number'}],
+            'change_tracking': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.pk = response.data['id']
+        for title, price in [('a', 1), ('b', 2), ('c', 3)]:
+            self.client.post(f'/api/table/{self.pk}/row/', {'title': title, 'price': price})
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE dynamic_feed, dynamic_feed_deleted')
+            cursor.execute('DROP FUNCTION dynamic_feed_track_changes(), dynamic_feed_add_tombstone()')
+
+    def get_changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(f'/api/table/{self.pk}/changes/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_changes(self):
+        first = self.get_changes(page_size=2, fields='title')
+        self.assertEqual(first['rows'], [{'title': 'a'}, {'title': 'b'}])
+        self.assertTrue(first['more'])
+        second = self.get_changes(first['cursor'], page_size=2, fields='title')
+        self.assertEqual((second['rows'], second['deleted'], second['more']), ([{'title': 'c'}], [], False))
+        self.assertEqual(self.get_changes(second['cursor'])['cursor'], second['cursor'])
+
+        self.client.patch(f'/api/table/{self.pk}/rows/?title=b', {'price': 5}, format='json')
+        self.client.delete(f'/api/table/{self.pk}/rows/?title=a')
+        changes = self.get_changes(second['cursor'])
+        self.assertEqual(changes['rows'], [{'id': 2, 'title': 'b', 'price': 5.0, 'change_seq': changes['rows'][0]['change_seq']}])
+        self.assertEqual(changes['deleted'], [1])
+        self.assertEqual(self.get_changes()['deleted'], [1])
+
+    def test_validation(self):
+        self.assertEqual(self.client.get(f'/api/table/{self.pk}/changes/', {'since': 'abc'}).status_code, 400)
+        response = self.client.put(f'/api/table/{self.pk}/', {
+            'name': 'Feed', 'fields': [{'name': 'title', 'type': 'string'}], 'change_tracking': False,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('change_tracking', response.data)
+        response = self.client.post('/api/table/', {
+            'name': 'Untracked', 'fields': [{'name': DynamicChangeService.CHANGE_SEQ, 'type': 'number'}], 'change_tracking': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class DynamicSearchTestCase(APITestCase):
+    def setUp(self):
+        response = self.client.post('/api/table/', {
+            'name': 'Articles',
+            'fields': [
+                {'name': 'title', 'type': 'string', 'search': True},
+                {'name': 'body', 'type': 'string', 'search': True},
+                {'name': 'views', 'type': 'integer'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.pk = response.data['id']
+        for title, body, views in [
+            ('Indexing tables', 'How a GIN index serves text search', 1),
+            ('Cooking', 'An index of recipes for the searching cook', 2),
+            ('Gardening', 'Nothing to see here', 3),
+        ]:
+            self.client.post(f'/api/table/{self.pk}/row/', {'title': title, 'body': body, 'views': views}, format='json')
+
+    def get_titles(self, params):
+        response = self.client.get(f'/api/table/{self.pk}/rows/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['title'] for row in response.json()]
+
+    def test_search(self):
+        # Matches in the title weigh more than matches in the body
+        self.assertEqual(self.get_titles({'search': 'indexes'}), ['Indexing tables', 'Cooking'])
+        self.assertEqual(self.get_titles({'search': 'index -recipes'}), ['Indexing tables'])
+        self.assertEqual(self.get_titles({'search': 'index', 'ordering': '-views'}), ['Cooking', 'Indexing tables'])
+        self.assertEqual(self.get_titles({'title__icontains': 'ING', 'views__gte': 2}), ['Cooking', 'Gardening'])
+        self.assertEqual(self.get_titles({'body__contains': '_'}), [])
+
+        first = self.client.get(f'/api/table/{self.pk}/rows/', {'search': 'index', 'page_size': 1}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['title'] for row in first['results'] + second['results']], ['Indexing tables', 'Cooking'])
+        self.assertIsNone(second['next'])
+
+        response = self.client.get(f'/api/table/{self.pk}/aggregate/', {'search': 'index', 'aggregate': 'sum:views'})
+        self.assertEqual(response.json(), {'views__sum': 3})
+        response = self.client.delete(f'/api/table/{self.pk}/rows/?search=recipes')
+        self.assertEqual(response.data, {'deleted': 1})
+
+    def test_update_rebuilds_search_column(self):
+        url = f'/api/table/{self.pk}/'
+        data = {'name': 'Articles', 'fields': [
+            {'name': 'title', 'type': 'varchar', 'length': 100, 'search': True},
+            {'name': 'body', 'type': 'string'},
+            {'name': 'views', 'type': 'integer'},
+        ]}
+        plan = self.client.put(f'{url}?dry_run=true', data, format='json').json()
+        operations = [change['operation'] for change in plan['changes']]
+        self.assertEqual(operations, ['remove_search', 'alter_field', 'add_search'])
+        self.assertEqual(len(plan['statements']), 2)
+
+        self.assertEqual(self.client.put(url, data, format='json').status_code, 200)
+        self.assertEqual(self.get_titles({'search': 'index'}), ['Indexing tables'])
+
+        data['fields'][0] = {'name': 'title', 'type': 'varchar', 'length': 100}
+        self.assertEqual(self.client.put(url, data, format='json').status_code, 200)
+        response = self.client.get(f'/api/table/{self.pk}/rows/', {'search': 'index'})
+        self.assertEqual(response.status_code, 400)
+        with connection.cursor() as cursor:
+            columns = [column.name for column in connection.introspection.get_table_description(cursor, 'dynamic_articles')]
+        self.assertNotIn(DynamicSearchService.SEARCH_VECTOR, columns)
+
+    def test_validation(self):
+        for fields in [
+            [{'name': 'views', 'type': 'integer', 'search': True}],
+            [{'name': 'title', 'type': 'string', 'search': True}, {'name': DynamicSearchService.SEARCH_RANK, 'type': 'string'}],
+        ]:
+            response = self.client.post('/api/table/', {'name': 'Invalid', 'fields': fields}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('fields', response.data)
+
+        response = self.client.put(f'/api/table/{self.pk}/?online=true', {'name': 'Articles', 'fields': [
+            {'name': 'title', 'type': 'varchar', 'length': 100, 'search': True},
+            {'name': 'body', 'type': 'string', 'search': True},
+            {'name': 'views', 'type': 'integer'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('online', response.data)
+
+        response = self.client.post('/api/table/', {
+            'name': 'Trigrams', 'fields': [{'name': 'title', 'type': 'string', 'trigram': True}],
+        }, format='json')
+        if not DynamicSearchService.has_trigram_extension('default'):
+            self.assertEqual(response.status_code, 400)
+            return
+        self.assertEqual(response.status_code, 201, response.data)
+        index = DynamicSearchService.prepare_trigram_index('dynamic_trigrams', 'title')
+        with connection.cursor() as cursor:
+            self.assertIn(index.name, connection.introspection.get_constraints(cursor, 'dynamic_trigrams'))
+
+
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off')
+class DynamicRollupTestCase(APITestCase):
+    def setUp(self):
+        self.fields = [
+            {'name': 'region', 'type': 'string'},
+            {'name': 'amount', 'type': 'number', 'null': True},
+            {'name': 'paid', 'type': 'boolean'},
+        ]
+        response = self.client.post('/api/table/', {
+            'name': 'Sales',
+            'fields': self.fields,
+            'rollups': [{'name': 'by_region', 'group_by': ['region'], 'aggregates': ['count', 'sum:amount', 'avg:amount', 'true:paid']}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.pk = response.data['id']
+        self.url = f'/api/table/{self.pk}/rollups/by_region/'
+
+    def assertMatchesAggregate(self, aggregates):
+        rollup = self.client.get(self.url).json()
+        response = self.client.get(f'/api/table/{self.pk}/aggregate/', {'group_by': 'region', 'aggregate': aggregates})
+        self.assertEqual(rollup, response.json())
+        return rollup
+
+    def test_writes_maintain_rollup(self):
+        self.client.post(f'/api/table/{self.pk}/row/', {'region': 'east', 'amount': 1, 'paid': True}, format='json')
+        self.client.post(f'/api/table/{self.pk}/rows/bulk/', [
+            {'region': 'east', 'amount': 2, 'paid': False},
+            {'region': 'west', 'amount': None, 'paid': True},
+        ], format='json')
+        self.client.post(f'/api/table/{self.pk}/rows/bulk/?method=copy', [
+            {'region': 'north', 'amount': 4, 'paid': True},
+        ], format='json')
+        aggregates = 'count,sum:amount,avg:amount,true:paid'
+        rollup = self.assertMatchesAggregate(aggregates)
+        self.assertEqual(rollup[0], {'region': 'east', 'count': 2, 'amount__sum': 3.0, 'amount__avg': 1.5, 'paid__true': 1})
+
+        self.client.patch(f'/api/table/{self.pk}/rows/?region=east', {'region': 'west'}, format='json')
+        self.client.delete(f'/api/table/{self.pk}/rows/?region=north')
+        rollup = self.assertMatchesAggregate(aggregates)
+        self.assertEqual([row['region'] for row in rollup], ['west'])
+
+        # Updated aggregates follow from the values set on every row
+        self.client.patch(f'/api/table/{self.pk}/rows/?amount__gte=2', {'amount': 5, 'paid': True}, format='json')
+        self.assertEqual(self.assertMatchesAggregate(aggregates)[0]['amount__sum'], 6.0)
+        self.client.patch(f'/api/table/{self.pk}/rows/?region=west&batch_size=2', {'amount': None, 'paid': False}, format='json')
+        self.assertEqual(self.assertMatchesAggregate(aggregates)[0]['amount__sum'], None)
+
+        response = self.client.get(self.url, {'region': 'east'})
+        self.assertEqual(response.json(), [])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f'/api/table/{self.pk}/rollups/unknown/').status_code, 404)
+
+    def test_update_rebuilds_rollups(self):
+        self.client.post(f'/api/table/{self.pk}/rows/bulk/', [
+            {'region': 'east', 'amount': 1, 'paid': True},
+            {'region': 'east', 'amount': 2, 'paid': False},
+        ], format='json')
+        response = self.client.put(f'/api/table/{self.pk}/', {
+            'name': 'Sales',
+            'fields': self.fields,
+            'rollups': [{'name': 'by_paid', 'group_by': ['region', 'paid'], 'aggregates': ['count', 'sum:amount']}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        expected = [
+            {'region': 'east', 'paid': False, 'count': 1, 'amount__sum': 2.0},
+            {'region': 'east', 'paid': True, 'count': 1, 'amount__sum': 1.0},
+        ]
+        url = f'/api/table/{self.pk}/rollups/by_paid/'
+        self.assertEqual(self.client.get(url, {'ordering': 'paid'}).json(), expected)
+        with connection.cursor() as cursor:
+            self.assertNotIn('dynamic_sales_rollup_by_region', connection.introspection.table_names(cursor))
+            cursor.execute('DELETE FROM dynamic_sales_rollup_by_paid')
+
+        out = io.StringIO()
+        call_command('rebuild_rollups', 'Sales', stdout=out)
+        self.assertIn('rebuilt rollup by_paid', out.getvalue())
+        self.assertEqual(self.client.get(url, {'ordering': 'paid'}).json(), expected)
+
+    def test_validation(self):
+        for rollup in [
+            {'name': 'by_amount', 'group_by': ['amount']},
+            {'name': 'by_region', 'group_by': ['region'], 'aggregates': ['max:amount']},
+            {'name': 'by_region', 'group_by': ['region'], 'aggregates': ['sum:paid']},
+            {'name': 'By-Region', 'group_by': ['region']},
+            {'name': 'by_region', 'group_by': ['region', 'region']},
+            {'name': 'by_region', 'group_by': ['region'], 'aggregates': ['count', 'count']},
+        ]:
+            response = self.client.put(f'/api/table/{self.pk}/', {
+                'name': 'Sales', 'fields': self.fields, 'rollups': [rollup],
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('rollups', response.data)
+
+        fields = copy.deepcopy(self.fields)
+        fields[1]['type'] = 'integer'
+        response = self.client.put(f'/api/table/{self.pk}/?online=true', {
+            'name': 'Sales', 'fields': fields, 'rollups': [{'name': 'by_region', 'group_by': ['region'], 'aggregates': ['sum:amount']}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('online', response.data)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', 'Unknown')
+
+    def test_table_names(self):
+        response = self.client.post('/api/table/', {'name': 'Sales_rollup_by_region', 'fields': self.fields}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+
+        response = self.client.post('/api/table/', {'name': 'Sales_rollup_by_paid', 'fields': self.fields}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.put(f'/api/table/{self.pk}/', {
+            'name': 'Sales', 'fields': self.fields, 'rollups': [{'name': 'by_paid', 'group_by': ['paid']}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rollups', response.data)
+
+        name = f'Sales_{"x" * 50}'
+        rollup = {'name': f'by_region_{"y" * 20}', 'group_by': ['region']}
+        response = self.client.post('/api/table/', {'name': name, 'fields': self.fields, 'rollups': [rollup]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.client.post(f'/api/table/{response.data["id"]}/row/', {'region': 'east', 'amount': 1, 'paid': True}, format='json')
+        response = self.client.get(f'/api/table/{response.data["id"]}/rollups/{rollup["name"]}/')
+        self.assertEqual(response.json(), [{'region': 'east', 'count': 1}])
+
+
+@skipUnless('shard' in settings.DATABASES, 'A "shard" database is not configured')
+@override_settings(DYNAMIC_MODELS_SCHEMA_SYNC='off', DYNAMIC_MODELS_DATABASES=['default', 'shard'])
+class DynamicShardTestCase(APITestCase):
+    databases = '__all__'
+
+    def get_tables(self, using):
+        with connections[using].cursor() as cursor:
+            return connections[using].introspection.table_names(cursor)
+
+    def test_rows_on_shard(self):
+        response = self.client.post('/api/table/', {
+            'name': 'Book',
+            'fields': [{'name': 'title', 'type': 'string'}, {'name': 'price', 'type': 'number'}],
+            'indexes': [{'fields': ['title'], 'unique': True}],
+            'database': 'shard',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        pk = response.data['id']
+        self.assertIn('dynamic_book', self.get_tables('shard'))
+        self.assertNotIn('dynamic_book', self.get_tables('default'))
+
+        with CaptureQueriesContext(connections['shard']) as queries:
+            for title, price in [('Dune', 9.5), ('Emma', 4)]:
+                self.assertEqual(self.client.post(f'/api/table/{pk}/row/', {'title': title, 'price': price}).status_code, 200)
+            self.assertEqual(self.client.post(f'/api/table/{pk}/row/', {'title': 'Dune', 'price': 1}).status_code, 400)
+            rows = self.client.get(f'/api/table/{pk}/rows/', {'ordering': 'price'}).json()
+        self.assertEqual(rows, [{'id': 2, 'title': 'Emma', 'price': 4.0}, {'id': 1, 'title': 'Dune', 'price': 9.5}])
+        self.assertTrue(any('dynamic_book' in query['sql'] for query in queries))
+
+        # The indexes are built once the schema changes are committed on the shard
+        with self.captureOnCommitCallbacks(using='shard', execute=True):
+            response = self.client.put(f'/api/table/{pk}/', {
+                'name': 'Book',
+                'fields': [{'name': 'title', 'type': 'string'}, {'name': 'price', 'type': 'string'}],
+                'indexes': [{'fields': ['price']}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['database'], 'shard')
+        with connections['shard'].cursor() as cursor:
+            columns = [
+                column.name for column in connections['shard'].introspection.get_table_description(cursor, 'dynamic_book')
+            ]
+            constraints = connections['shard'].introspection.get_constraints(cursor, 'dynamic_book')
+        self.assertEqual(columns, ['id', 'title', 'price'])
+        self.assertTrue(any(constraint['columns'] == ['price'] and constraint['index'] for constraint in constraints.values()))
+        self.assertEqual(self.client.get(f'/api/table/{pk}/rows/', {'price': '4'}).json(), [
+            {'id': 2, 'title': 'Emma', 'price': '4'}
+        ])
+
+    def test_partitions_on_shard(self):
+        response = self.client.post('/api/table/', {
+            'name': 'Reading',
+            'fields': [{'name': 'value', 'type': 'number'}],
+            'partitioning': {'type': 'range', 'field': 'value', 'size': 10},
+            'database': 'shard',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        model_instance = DynamicModel.objects.get(pk=response.data['id'])
+        model_class = DynamicModelService.get_model_class(model_instance)
+        self.client.post(f'/api/table/{model_instance.pk}/row/', {'value': 12})
+        self.assertEqual(DynamicPartitionService.maintain(model_instance, model_class)['created'], ['dynamic_reading_b1'])
+        self.assertEqual(
+            [partition['name'] for partition in self.client.get(f'/api/table/{model_instance.pk}/partitions/').data],
+            ['dynamic_reading_b1', 'dynamic_reading_default'],
+        )
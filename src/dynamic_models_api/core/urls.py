@@ -2,11 +2,16 @@ from django.urls import path
 from django.urls import include
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import DynamicModelViewSet
+from .views import metrics
 
 router = DefaultRouter()
 router.register(r'table', DynamicModelViewSet, basename='dynamic_table')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/table/<int:pk>/row/', async_views.row, name='dynamic_table-async-row'),
+    path('async/table/<int:pk>/rows/', async_views.rows, name='dynamic_table-async-rows'),
+    path('metrics/', metrics, name='dynamic_models-metrics'),
 ]
\ No newline at end of file
@@ -1,32 +1,310 @@
+from collections.abc import Iterator
+
+from django.db import router
+from django.http import Http404
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import CreateModelMixin
 from rest_framework.mixins import UpdateModelMixin
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from .aggregates import DynamicRowsAggregation
+from .bulk import DynamicRowsBulkService
+from .bulk import DynamicRowsBulkWriteService
+from .changes import DynamicChangeService
+from .conditional import DynamicDataVersionService
+from .conditional import DynamicRowsResponseCache
+from .counts import DynamicCountService
+from .export import DynamicRowsExport
+from .filters import DynamicRowsFilter
+from .instrumentation import DynamicInstrumentation
+from .instrumentation import metrics_registry
 from .models import DynamicModel
+from .pagination import DynamicRowsPagination
+from .parsers import NDJSONParser
+from .partitions import DynamicPartitionService
+from .renderers import CSVRenderer
+from .renderers import NDJSONRenderer
+from .rollups import DynamicRollupService
+from .routing import DynamicDatabaseService
+from .serializers import BulkRowsOptionsSerializer
+from .serializers import ChangesOptionsSerializer
+from .serializers import CountOptionsSerializer
+from .serializers import DynamicFieldMigrationSerializer
 from .serializers import DynamicModelSerializer
+from .serializers import RowsWriteOptionsSerializer
+from .serializers import UpdateOptionsSerializer
 from .services import DynamicModelService
+from .streaming import DynamicRowsStream
 
 
 class DynamicModelViewSet(GenericViewSet, CreateModelMixin, UpdateModelMixin):
     queryset = DynamicModel.objects.all()
     serializer_class = DynamicModelSerializer
 
+    def dispatch(self, request, *args, **kwargs):
+        if not DynamicInstrumentation.is_enabled():
+            return super().dispatch(request, *args, **kwargs)
+        with DynamicInstrumentation.instrument_request() as metrics:
+            response = super().dispatch(request, *args, **kwargs)
+            if isinstance(response, Response):
+                with DynamicInstrumentation.phase('render'):
+                    response.render()
+        DynamicInstrumentation.finish_request(metrics, response, self.action or request.method.lower())
+        return response
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['online'] = getattr(self, 'online', False)
+        return context
+
+    def update(self, request, *args, **kwargs):
+        options = UpdateOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        self.online = options.validated_data['online']
+        if not options.validated_data['dry_run']:
+            return super().update(request, *args, **kwargs)
+
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.plan_update())
+
+    def get_cache_entry(self):
+        """
+        Return the generated classes of the requested dynamic model, only
+        querying its metadata when they are not cached yet.
+        """
+        with DynamicInstrumentation.phase('metadata'):
+            cache_entry = DynamicModelService.get_cached_entry(self.kwargs[self.lookup_field])
+            if cache_entry is None:
+                model_instance = self.get_object()
+        if cache_entry is None:
+            cache_entry = DynamicModelService.get_cached_classes(model_instance)
+        else:
+            self.check_object_permissions(self.request, cache_entry.model_instance)
+        DynamicInstrumentation.set_table(cache_entry.model_class._meta.db_table)
+        return cache_entry
+
     @action(detail=True, methods=['post'])
     def row(self, request, pk=None):
-        model_instance = self.get_object()
-        serializer_class = DynamicModelService.create_serializer_class(model_instance)
-        serializer = serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        cache_entry = self.get_cache_entry()
+        serializer = cache_entry.serializer_class(data=request.data)
+        with DynamicInstrumentation.phase('validate'):
+            serializer.is_valid(raise_exception=True)
+        with DynamicDataVersionService.atomic(router.db_for_write(cache_entry.model_class)):
+            instance = serializer.save()
+            DynamicRollupService.add_rows(cache_entry.model_class, [instance])
+            DynamicDataVersionService.bump(cache_entry.model_instance.pk, rows=1)
+        with DynamicInstrumentation.phase('serialize'):
+            data = serializer.data
+        return Response(data)
 
     @action(detail=True, methods=['get'])
+    def migrations(self, request, pk=None):
+        field_migrations = self.get_object().field_migrations.order_by('-pk')
+        return Response(DynamicFieldMigrationSerializer(field_migrations, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def indexes(self, request, pk=None):
+        return Response(DynamicModelService.list_indexes(self.get_object()))
+
+    @action(detail=True, methods=['get'])
+    def partitions(self, request, pk=None):
+        cache_entry = self.get_cache_entry()
+        if DynamicPartitionService.get_partitioning(cache_entry.model_instance) is None:
+            return Response([])
+        return Response(DynamicPartitionService.list_partitions(cache_entry.model_class))
+
+    @action(detail=True, methods=['get'])
+    def count(self, request, pk=None):
+        cache_entry = self.get_cache_entry()
+        options = CountOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        with DynamicInstrumentation.phase('query'):
+            result = DynamicCountService.count(
+                cache_entry.model_instance,
+                cache_entry.model_class,
+                options.validated_data['mode'],
+                DynamicDatabaseService.get_read_database(cache_entry.model_instance),
+            )
+        return Response(result)
+
+    @action(detail=True, methods=['get'], url_path=r'rollups/(?P<rollup>[a-z][a-z0-9_]*)')
+    def rollup(self, request, pk=None, rollup=None):
+        cache_entry = self.get_cache_entry()
+        rollup_class = DynamicRollupService.get_rollup_classes(cache_entry.model_class).get(rollup)
+        if rollup_class is None:
+            raise Http404
+        version = DynamicDataVersionService.get(cache_entry.model_instance.pk)
+        if version is None:
+            raise Http404
+        not_modified_response = DynamicDataVersionService.get_not_modified_response(request, version)
+        if not_modified_response is not None:
+            return not_modified_response
+        using = DynamicDatabaseService.get_read_database(cache_entry.model_instance, version)
+        with DynamicInstrumentation.phase('query'):
+            groups = DynamicRollupService.get_rows(rollup_class, request.query_params, using)
+        DynamicInstrumentation.add_rows(len(groups))
+        return DynamicDataVersionService.set_headers(Response(groups), version)
+
+    def is_compact_json_request(self) -> bool:
+        """Return whether the response is rendered as compact JSON, so it can be encoded directly."""
+        return self.request.accepted_renderer.format == 'json' and 'indent' not in self.request.accepted_media_type
+
+    @action(detail=True, methods=['get', 'patch', 'delete'], pagination_class=DynamicRowsPagination)
     def rows(self, request, pk=None):
-        model_instance = self.get_object()
-        serializer_class = DynamicModelService.create_serializer_class(model_instance)
-        model_class = DynamicModelService.get_or_create_model_class(model_instance)
-        objects = model_class.objects.all()
-        serializer = serializer_class(instance=objects, many=True)
-        return Response(serializer.data)
+        cache_entry = self.get_cache_entry()
+        if request.method != 'GET':
+            return self.write_rows(request, cache_entry)
+        pk = cache_entry.model_instance.pk
+        version = DynamicDataVersionService.get(pk)
+        if version is None:
+            raise Http404
+        not_modified_response = DynamicDataVersionService.get_not_modified_response(request, version)
+        if not_modified_response is not None:
+            return not_modified_response
+
+        cacheable = self.is_compact_json_request() and 'stream' not in request.query_params
+        if cacheable:
+            body = DynamicRowsResponseCache.get(pk, version, request)
+            if body is not None:
+                return DynamicDataVersionService.set_headers(HttpResponse(body, content_type='application/json'), version)
+
+        using = DynamicDatabaseService.get_read_database(cache_entry.model_instance, version)
+        response = self.list_rows(request, cache_entry, using)
+        if cacheable:
+            DynamicRowsResponseCache.set(pk, version, request, response.content)
+        return DynamicDataVersionService.set_headers(response, version)
+
+    def list_rows(self, request, cache_entry, using=None):
+        rows_filter = DynamicRowsFilter(cache_entry.model_class, using=using)
+        projection = rows_filter.get_projection(request.query_params)
+
+        stream_format = request.query_params.get('stream')
+        if stream_format is not None:
+            if stream_format not in DynamicRowsStream.get_formats():
+                raise ValidationError({'stream': f'Supported formats: {", ".join(DynamicRowsStream.get_formats())}.'})
+            objects = rows_filter.get_queryset(request.query_params, named=False)
+            return DynamicRowsStream.create_response(cache_entry.row_encoder, objects, projection, stream_format)
+
+        self.paginator.ordering = rows_filter.get_ordering(request.query_params)
+        page = self.paginate_queryset(rows_filter.get_queryset(request.query_params))
+        if page is not None and self.is_compact_json_request():
+            with DynamicInstrumentation.phase('serialize'):
+                body = cache_entry.row_encoder.encode_page(
+                    page, projection, self.paginator.get_next_link(), self.paginator.get_previous_link()
+                )
+            DynamicInstrumentation.add_rows(len(page))
+            return HttpResponse(body, content_type='application/json')
+        if page is not None:
+            serializer = cache_entry.serializer_class(instance=page, many=True, context={'fields': projection})
+            with DynamicInstrumentation.phase('serialize'):
+                data = serializer.data
+            DynamicInstrumentation.add_rows(len(page))
+            return self.get_paginated_response(data)
+
+        if self.is_compact_json_request():
+            objects = rows_filter.get_queryset(request.query_params, named=False)
+            with DynamicInstrumentation.phase('serialize'):
+                body = cache_entry.row_encoder.encode_rows(objects, projection)
+            # The rows are cached by the evaluated queryset
+            DynamicInstrumentation.add_rows(len(objects))
+            return HttpResponse(body, content_type='application/json')
+        objects = rows_filter.get_queryset(request.query_params)
+        serializer = cache_entry.serializer_class(instance=objects, many=True, context={'fields': projection})
+        with DynamicInstrumentation.phase('serialize'):
+            data = serializer.data
+        DynamicInstrumentation.add_rows(len(objects))
+        return Response(data)
+
+    def write_rows(self, request, cache_entry):
+        """Update the filtered rows with the values of the request body, or delete them."""
+        options = RowsWriteOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        batch_size = options.validated_data['batch_size']
+        queryset = DynamicRowsBulkWriteService.get_queryset(
+            DynamicRowsFilter(cache_entry.model_class), request.query_params, options.validated_data['all']
+        )
+        if request.method == 'DELETE':
+            result = DynamicRowsBulkWriteService.delete(cache_entry, queryset, batch_size)
+        else:
+            serializer = cache_entry.serializer_class(data=request.data, partial=True)
+            with DynamicInstrumentation.phase('validate'):
+                serializer.is_valid(raise_exception=True)
+            if not serializer.validated_data:
+                raise ValidationError({'non_field_errors': ['No values to set.']})
+            result = DynamicRowsBulkWriteService.update(cache_entry, queryset, serializer.validated_data, batch_size)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if 'non_field_errors' in result else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        cache_entry = self.get_cache_entry()
+        if not DynamicChangeService.is_tracked(cache_entry.model_instance):
+            raise ValidationError({'non_field_errors': ['Change tracking is not enabled for this table.']})
+        options = ChangesOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        projection = DynamicRowsFilter(cache_entry.model_class).get_projection(request.query_params)
+        with DynamicInstrumentation.phase('query'):
+            changes = DynamicChangeService.get_changes(
+                cache_entry.model_class,
+                cache_entry.row_encoder,
+                projection,
+                options.validated_data.get('since'),
+                options.validated_data['page_size'],
+                DynamicDatabaseService.get_read_database(cache_entry.model_instance),
+            )
+        DynamicInstrumentation.add_rows(len(changes['rows']))
+        return Response(changes)
+
+    @action(detail=True, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request, pk=None):
+        cache_entry = self.get_cache_entry()
+        rows_filter = DynamicRowsFilter(cache_entry.model_class)
+        projection = rows_filter.get_projection(request.query_params)
+        objects = rows_filter.get_queryset(request.query_params, named=False)
+        return DynamicRowsExport.create_response(
+            cache_entry.row_encoder,
+            objects,
+            projection,
+            request.accepted_renderer.format,
+            DynamicModelService.prepare_table_name(cache_entry.model_instance),
+        )
+
+    @action(detail=True, methods=['get'])
+    def aggregate(self, request, pk=None):
+        cache_entry = self.get_cache_entry()
+        aggregation = DynamicRowsAggregation(DynamicRowsFilter(cache_entry.model_class))
+        return Response(aggregation.aggregate(request.query_params))
+
+    @action(detail=True, methods=['post'], url_path='rows/bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request, pk=None):
+        cache_entry = self.get_cache_entry()
+        options = BulkRowsOptionsSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+
+        records = request.data
+        if not isinstance(records, (list, Iterator)):
+            raise ValidationError({'non_field_errors': ['Expected a JSON array or newline-delimited JSON records.']})
+
+        result = DynamicRowsBulkService.ingest(cache_entry, records, **options.validated_data)
+        if not result['error_count']:
+            response_status = status.HTTP_201_CREATED
+        elif result['created']:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)
+
+
+@require_GET
+def metrics(request):
+    """Metrics of the instrumented requests in the Prometheus text format."""
+    if not DynamicInstrumentation.is_enabled():
+        raise Http404
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -86,6 +86,27 @@ DATABASES = {
     }
 }
 
+# Additional databases, e.g. databases holding dynamic tables or their read
+# replicas, are listed by alias in DATABASE_ALIASES and configured with the
+# variables of the default database suffixed by the upper-case alias, like
+# POSTGRES_HOST_SHARD1. Unset variables fall back to the default database.
+for alias in filter(None, os.getenv('DATABASE_ALIASES', '').split(',')):
+    suffix = alias.upper()
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'HOST': os.getenv(f'POSTGRES_HOST_{suffix}', os.getenv('POSTGRES_HOST')),
+        'PORT': os.getenv(f'POSTGRES_PORT_{suffix}', os.getenv('POSTGRES_PORT')),
+        'NAME': os.getenv(f'POSTGRES_DB_{suffix}', f'{os.getenv("POSTGRES_DB")}_{alias}'),
+        'USER': os.getenv(f'POSTGRES_USER_{suffix}', os.getenv('POSTGRES_USER')),
+        'PASSWORD': os.getenv(f'POSTGRES_PASSWORD_{suffix}', os.getenv('POSTGRES_PASSWORD')),
+    }
+    # Tests read from replicas through the connection of their primary
+    if os.getenv(f'POSTGRES_MIRROR_{suffix}'):
+        DATABASES[alias]['TEST'] = {'MIRROR': os.getenv(f'POSTGRES_MIRROR_{suffix}')}
+
+# Queries of dynamic tables are sent to the database their table is placed on
+DATABASE_ROUTERS = ['core.routing.DynamicModelRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -126,3 +147,100 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Dynamic models
+
+# Maximum number of dynamic models whose generated classes are kept in the
+# in-process cache
+DYNAMIC_MODELS_CACHE_SIZE = int(os.getenv('DYNAMIC_MODELS_CACHE_SIZE', 128))
+
+# Maximum number of generated model classes kept in the registry of
+# generated models, separate from the app registry of the project
+DYNAMIC_MODELS_REGISTRY_SIZE = int(os.getenv('DYNAMIC_MODELS_REGISTRY_SIZE', 1024))
+
+# PostgreSQL text search configuration of the search columns of searchable
+# tables. Tables created before changing it keep their configuration until
+# their searchable fields change
+DYNAMIC_MODELS_SEARCH_CONFIG = os.getenv('DYNAMIC_MODELS_SEARCH_CONFIG', 'english')
+
+# Comma separated names of the dynamic models whose classes are prepared on
+# start, all other classes are created on first access
+DYNAMIC_MODELS_PRELOAD = [name for name in os.getenv('DYNAMIC_MODELS_PRELOAD', '').split(',') if name]
+
+# How processes learn about schema changes made by other processes:
+# 'notify' (PostgreSQL LISTEN/NOTIFY), 'poll' (periodic version check) or 'off'
+# (metadata is queried on every request)
+DYNAMIC_MODELS_SCHEMA_SYNC = os.getenv('DYNAMIC_MODELS_SCHEMA_SYNC', 'notify')
+
+# Interval in seconds of the schema version poll
+DYNAMIC_MODELS_SCHEMA_POLL_INTERVAL = float(os.getenv('DYNAMIC_MODELS_SCHEMA_POLL_INTERVAL', 5))
+
+# Default and maximum number of rows per page of the rows endpoint
+DYNAMIC_MODELS_ROWS_PAGE_SIZE = int(os.getenv('DYNAMIC_MODELS_ROWS_PAGE_SIZE', 100))
+DYNAMIC_MODELS_ROWS_MAX_PAGE_SIZE = int(os.getenv('DYNAMIC_MODELS_ROWS_MAX_PAGE_SIZE', 1000))
+
+# Number of rows fetched at once from the database when streaming rows
+DYNAMIC_MODELS_ROWS_CHUNK_SIZE = int(os.getenv('DYNAMIC_MODELS_ROWS_CHUNK_SIZE', 2000))
+
+# Alias of the Django cache (see CACHES) storing rendered JSON responses of the
+# rows endpoint, responses are not cached when empty
+DYNAMIC_MODELS_ROWS_CACHE = os.getenv('DYNAMIC_MODELS_ROWS_CACHE', '')
+
+# Timeout in seconds and maximum size in bytes of cached rows responses
+DYNAMIC_MODELS_ROWS_CACHE_TIMEOUT = int(os.getenv('DYNAMIC_MODELS_ROWS_CACHE_TIMEOUT', 300))
+DYNAMIC_MODELS_ROWS_CACHE_MAX_SIZE = int(os.getenv('DYNAMIC_MODELS_ROWS_CACHE_MAX_SIZE', 1024 * 1024))
+
+# Maximum number of groups returned by the aggregate endpoint
+DYNAMIC_MODELS_AGGREGATE_MAX_GROUPS = int(os.getenv('DYNAMIC_MODELS_AGGREGATE_MAX_GROUPS', 10000))
+
+# Number of future partitions kept ahead of time for tables partitioned by
+# their creation timestamp
+DYNAMIC_MODELS_PARTITION_PREMAKE = int(os.getenv('DYNAMIC_MODELS_PARTITION_PREMAKE', 4))
+
+# Comma separated aliases of the databases holding dynamic tables, new tables
+# are placed on one of them by a hash of their name unless given explicitly
+DYNAMIC_MODELS_DATABASES = [alias for alias in os.getenv('DYNAMIC_MODELS_DATABASES', 'default').split(',') if alias]
+
+# Read replicas of the databases holding dynamic tables, the rows endpoint
+# reads from them: 'database=replica,replica;database=replica'
+DYNAMIC_MODELS_READ_REPLICAS = {
+    database: [replica for replica in replicas.split(',') if replica]
+    for database, _, replicas in (
+        item.partition('=') for item in os.getenv('DYNAMIC_MODELS_READ_REPLICAS', '').split(';') if item
+    )
+}
+
+# Seconds after a write to a table during which its rows are still read from
+# the primary database, as replicas may not have received the write yet
+DYNAMIC_MODELS_READ_REPLICA_LAG = float(os.getenv('DYNAMIC_MODELS_READ_REPLICA_LAG', 5))
+
+# Time the phases of requests of the dynamic model endpoints, reported with a
+# Server-Timing header and aggregated by the /api/metrics/ endpoint
+DYNAMIC_MODELS_INSTRUMENTATION = os.getenv('DYNAMIC_MODELS_INSTRUMENTATION', 'false').lower() == 'true'
+
+# JSON encoder of the rows endpoint: 'json' renders exactly like the DRF
+# JSONRenderer, 'orjson' is faster and requires the orjson package
+DYNAMIC_MODELS_JSON_BACKEND = os.getenv('DYNAMIC_MODELS_JSON_BACKEND', 'json')
+
+# Default and maximum number of records validated and inserted at once by the
+# bulk rows endpoint
+DYNAMIC_MODELS_BULK_BATCH_SIZE = int(os.getenv('DYNAMIC_MODELS_BULK_BATCH_SIZE', 1000))
+DYNAMIC_MODELS_BULK_MAX_BATCH_SIZE = int(os.getenv('DYNAMIC_MODELS_BULK_MAX_BATCH_SIZE', 50000))
+
+# Batch size from which bulk rows are loaded with PostgreSQL COPY
+DYNAMIC_MODELS_BULK_COPY_THRESHOLD = int(os.getenv('DYNAMIC_MODELS_BULK_COPY_THRESHOLD', 5000))
+
+# Maximum number of per-record errors reported by the bulk rows endpoint
+DYNAMIC_MODELS_BULK_MAX_ERRORS = int(os.getenv('DYNAMIC_MODELS_BULK_MAX_ERRORS', 1000))
+
+# Default and maximum number of rows written per transaction when rows are
+# updated or deleted by filter
+DYNAMIC_MODELS_WRITE_BATCH_SIZE = int(os.getenv('DYNAMIC_MODELS_WRITE_BATCH_SIZE', 10000))
+DYNAMIC_MODELS_WRITE_MAX_BATCH_SIZE = int(os.getenv('DYNAMIC_MODELS_WRITE_MAX_BATCH_SIZE', 100000))
+
+# Where online field type migrations are run: 'thread' (in the process that
+# accepted the update) or 'command' (by the run_field_migrations command)
+DYNAMIC_MODELS_FIELD_MIGRATION_RUNNER = os.getenv('DYNAMIC_MODELS_FIELD_MIGRATION_RUNNER', 'thread')
+
+# Number of rows converted per transaction by online field type migrations
+DYNAMIC_MODELS_FIELD_MIGRATION_BATCH_SIZE = int(os.getenv('DYNAMIC_MODELS_FIELD_MIGRATION_BATCH_SIZE', 5000))